@@ -1,9 +1,11 @@
+import os
 import sys
 import pkg_resources
 
 from capnpy.compiler.compiler import DynamicCompiler
 from capnpy.compiler.distutils import capnpify
 from capnpy.message import load, loads, load_all, dumps, dump
+from capnpy.delta import diff, patch
 
 
 try:
@@ -11,6 +13,7 @@ try:
 except Exception:
     __version__ = 'unknown'
 
-_compiler = DynamicCompiler(sys.path)
+_compiler = DynamicCompiler(sys.path,
+                            cachedir=os.environ.get('CAPNPY_CACHE_DIR'))
 load_schema = _compiler.load_schema
 parse_schema = _compiler.parse_schema
@@ -1,11 +1,16 @@
 """
 Usage: capnpy compile FILE [options]
        capnpy decode FILE SCHEMA CLASS [options]
+       capnpy request FILE
 
 Options:
   --no-convert-case    Don't convert camelCase to camel_case
   --no-pyx             Always produce a .py file, even if Cython is available
   --no-version-check   Don't check for version discrepancy.
+  --memoize            Cache the objects returned by struct, list and group
+                       fields, as if all structs had the $Py.memoize annotation
+  --lazy               Define the classes only when they are first accessed,
+                       instead of at import time (py mode only)
 """
 from __future__ import print_function
 
@@ -47,7 +52,14 @@ def compile(args):
     comp.compile(filename=args['FILE'],
                  convert_case=args['--convert-case'],
                  pyx=args['--pyx'],
-                 version_check=args['--version-check'])
+                 version_check=args['--version-check'],
+                 memoize=args['--memoize'],
+                 lazy=args['--lazy'])
+
+def request(args):
+    comp = StandaloneCompiler(sys.path)
+    reqfile = comp.save_request(args['FILE'])
+    print('[capnpy] Written', reqfile, file=sys.stderr)
 
 def main(argv=None):
     args = docopt.docopt(__doc__, argv=argv)
@@ -60,6 +72,8 @@ def main(argv=None):
         compile(args)
     elif args['decode']:
         decode(args)
+    elif args['request']:
+        request(args)
 
 if __name__ == '__main__':
     main()
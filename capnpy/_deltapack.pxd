@@ -0,0 +1,2 @@
+cpdef bytes pack_delta(bytes data, object prev)
+cpdef bytes unpack_delta(bytes data, Py_ssize_t size, object prev)
@@ -0,0 +1,108 @@
+"""
+Frame codec used by DeltaWriter and DeltaReader. This is the pure Python
+version, see _deltapack.pyx for the Cython one.
+
+A frame is first XORed with the previous one (if any), so that the bytes
+which did not change become 0. The result is then compressed using the same
+zero-run encoding as Cap'n Proto packing: each word is encoded as a tag byte,
+whose bits tell which bytes of the word are non-zero, followed by the non-zero
+bytes. A tag 0x00 is followed by the number of additional zero words; a tag
+0xff is followed by the number of additional words which are copied verbatim,
+and then by the words themselves.
+"""
+
+def _check_size(size):
+    if size % 8 != 0:
+        raise ValueError("The size of a delta frame must be a multiple of 8, "
+                         "got %d" % size)
+
+def _check_prev(prev, size):
+    if prev is not None and len(prev) != size:
+        raise ValueError("The previous frame must have the same size")
+
+def _corrupted():
+    return ValueError("Corrupted delta frame")
+
+def pack_delta(data, prev):
+    """
+    Encode data against prev, which must be either None or a string of the
+    same size
+    """
+    size = len(data)
+    _check_size(size)
+    _check_prev(prev, size)
+    buf = bytearray(data)
+    if prev is not None:
+        for k, b in enumerate(bytearray(prev)):
+            buf[k] ^= b
+    #
+    out = bytearray()
+    nwords = size // 8
+    i = 0
+    while i < nwords:
+        word = buf[i*8:i*8+8]
+        tag = 0
+        for j in range(8):
+            if word[j]:
+                tag |= 1 << j
+        out.append(tag)
+        out += word.replace(b'\x00', b'')
+        i += 1
+        if tag == 0:
+            run = 0
+            while i < nwords and run < 255 and not any(buf[i*8:i*8+8]):
+                run += 1
+                i += 1
+            out.append(run)
+        elif tag == 0xff:
+            run = 0
+            start = i
+            while i < nwords and run < 255 and buf[i*8:i*8+8].count(0) <= 1:
+                run += 1
+                i += 1
+            out.append(run)
+            out += buf[start*8:i*8]
+    return bytes(out)
+
+def unpack_delta(data, size, prev):
+    """
+    Decode a frame of the given size which has been encoded by pack_delta
+    """
+    _check_size(size)
+    _check_prev(prev, size)
+    src = bytearray(data)
+    n = len(src)
+    out = bytearray(size)
+    pos = 0
+    i = 0
+    while i < size:
+        if pos >= n:
+            raise _corrupted()
+        tag = src[pos]
+        pos += 1
+        for j in range(8):
+            if tag & (1 << j):
+                if pos >= n:
+                    raise _corrupted()
+                out[i+j] = src[pos]
+                pos += 1
+        i += 8
+        if tag == 0 or tag == 0xff:
+            if pos >= n:
+                raise _corrupted()
+            run = src[pos] * 8
+            pos += 1
+            if i + run > size:
+                raise _corrupted()
+            if tag == 0xff:
+                if pos + run > n:
+                    raise _corrupted()
+                out[i:i+run] = src[pos:pos+run]
+                pos += run
+            i += run
+    if pos != n:
+        raise _corrupted()
+    if prev is not None:
+        for k, b in enumerate(bytearray(prev)):
+            out[k] ^= b
+    return bytes(out)
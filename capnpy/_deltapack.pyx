@@ -0,0 +1,144 @@
+"""
+Frame codec used by DeltaWriter and DeltaReader: see _deltapack.py for the
+description of the format. This is the C version, which does the XOR and the
+zero-run encoding in a single pass.
+"""
+
+from libc.stdint cimport uint8_t, uint64_t
+from libc.stdlib cimport malloc, free
+from libc.string cimport memcpy, memset
+
+
+cdef check_size(Py_ssize_t size, object prev):
+    if size % 8 != 0:
+        raise ValueError("The size of a delta frame must be a multiple of 8, "
+                         "got %d" % size)
+    if prev is not None and len(prev) != size:
+        raise ValueError("The previous frame must have the same size")
+
+cdef inline uint64_t load_word(const char* buf, Py_ssize_t i):
+    cdef uint64_t w
+    memcpy(&w, buf + i*8, 8)
+    return w
+
+cdef inline uint64_t xor_word(const char* src, const char* prev, Py_ssize_t i):
+    if prev == NULL:
+        return load_word(src, i)
+    return load_word(src, i) ^ load_word(prev, i)
+
+cdef inline int count_zero_bytes(uint64_t w):
+    cdef const uint8_t* b = <const uint8_t*>&w
+    cdef int j, res = 0
+    for j in range(8):
+        if b[j] == 0:
+            res += 1
+    return res
+
+
+cpdef bytes pack_delta(bytes data, object prev):
+    cdef Py_ssize_t size = len(data)
+    check_size(size, prev)
+    cdef const char* src = data
+    cdef const char* psrc = NULL
+    if prev is not None:
+        psrc = <bytes?>prev
+    #
+    # worst case: a 0xff word followed by an empty run takes 10 bytes
+    cdef Py_ssize_t nwords = size // 8
+    cdef uint8_t* out = <uint8_t*>malloc(nwords*10 + 1)
+    if out == NULL:
+        raise MemoryError()
+    cdef Py_ssize_t i = 0, n = 0, tagpos, runpos
+    cdef uint64_t w
+    cdef const uint8_t* b = <const uint8_t*>&w
+    cdef uint8_t tag
+    cdef int j, run
+    try:
+        while i < nwords:
+            w = xor_word(src, psrc, i)
+            tagpos = n
+            n += 1
+            tag = 0
+            for j in range(8):
+                if b[j] != 0:
+                    tag |= 1 << j
+                    out[n] = b[j]
+                    n += 1
+            out[tagpos] = tag
+            i += 1
+            if tag == 0:
+                run = 0
+                while i < nwords and run < 255 and xor_word(src, psrc, i) == 0:
+                    run += 1
+                    i += 1
+                out[n] = run
+                n += 1
+            elif tag == 0xff:
+                runpos = n
+                n += 1
+                run = 0
+                while i < nwords and run < 255:
+                    w = xor_word(src, psrc, i)
+                    if count_zero_bytes(w) > 1:
+                        break
+                    memcpy(out + n, &w, 8)
+                    n += 8
+                    run += 1
+                    i += 1
+                out[runpos] = run
+        return (<char*>out)[:n]
+    finally:
+        free(out)
+
+
+cpdef bytes unpack_delta(bytes data, Py_ssize_t size, object prev):
+    check_size(size, prev)
+    cdef const uint8_t* src = <const uint8_t*><const char*>data
+    cdef Py_ssize_t n = len(data)
+    cdef const uint8_t* psrc = NULL
+    if prev is not None:
+        psrc = <const uint8_t*><const char*><bytes?>prev
+    cdef uint8_t* out = <uint8_t*>malloc(size + 1)
+    if out == NULL:
+        raise MemoryError()
+    cdef Py_ssize_t i = 0, pos = 0, k, run
+    cdef uint8_t tag
+    cdef int j
+    try:
+        while i < size:
+            if pos >= n:
+                raise ValueError("Corrupted delta frame")
+            tag = src[pos]
+            pos += 1
+            for j in range(8):
+                if tag & (1 << j):
+                    if pos >= n:
+                        raise ValueError("Corrupted delta frame")
+                    out[i+j] = src[pos]
+                    pos += 1
+                else:
+                    out[i+j] = 0
+            i += 8
+            if tag == 0 or tag == 0xff:
+                if pos >= n:
+                    raise ValueError("Corrupted delta frame")
+                run = src[pos] * 8
+                pos += 1
+                if i + run > size:
+                    raise ValueError("Corrupted delta frame")
+                if tag == 0xff:
+                    if pos + run > n:
+                        raise ValueError("Corrupted delta frame")
+                    memcpy(out + i, src + pos, run)
+                    pos += run
+                else:
+                    memset(out + i, 0, run)
+                i += run
+        if pos != n:
+            raise ValueError("Corrupted delta frame")
+        if psrc != NULL:
+            for k in range(size):
+                out[k] ^= psrc[k]
+        return (<char*>out)[:size]
+    finally:
+        free(out)
@@ -1,4 +1,5 @@
 cpdef long inthash(long v)
 cpdef long longhash(unsigned long v)
+cpdef long floathash(double v)
 cdef long tuplehash(long hashes[], long len)
 cpdef long strhash(bytes a, long start, long size)
@@ -1,5 +1,6 @@
 inthash = hash
 longhash = hash
+floathash = hash
 __tuplehash_for_tests = hash
 
 def strhash(s, start, size):
@@ -4,9 +4,14 @@ types. The idea is that if you have C variables, you can compute fast hashes
 *without* having to allocate real Python object
 """
 
+from libc.math cimport frexp, isinf, isnan
+
 cdef extern from "Python.h":
     int PY_MAJOR_VERSION
+    int PY_VERSION_HEX
 cdef int PY3 = PY_MAJOR_VERSION == 3
+# CPython 3.8 switched to an xxHash-based algorithm for tuples
+cdef int XXTUPLEHASH = PY_VERSION_HEX >= 0x03080000
 
 cdef extern from "_hash.h":
     ctypedef struct _Py_HashSecret_t:
@@ -44,6 +49,11 @@ cpdef long longhash(unsigned long v):
         return _longhash_3(v)
     return _longhash_2(v)
 
+cpdef long floathash(double v):
+    if PY3:
+        return _floathash_3(v)
+    return hash(v)
+
 
 ### Python 2 ##################################################
 # string hashing algorithm. Copied from CPython's 2.7 stringobject.c. Note
@@ -109,6 +119,46 @@ cdef inline long _longhash_3(unsigned long v):
     if v >= HASH_MASK:
         v -= HASH_MASK
     return v
+
+# Copied from CPython's pyhash.c:_Py_HashDouble. Since 3.10 CPython hashes
+# NaNs by identity: we cannot do that without an object, so we use the old
+# value of 0 (it does not matter much, since NaN != NaN anyway)
+cdef inline long _floathash_3(double v):
+    cdef int e, sign
+    cdef double m
+    cdef unsigned long x, y
+    if isinf(v):
+        return 314159 if v > 0 else -314159
+    if isnan(v):
+        return 0
+    #
+    m = frexp(v, &e)
+    sign = 1
+    if m < 0:
+        sign = -1
+        m = -m
+    # process 28 bits at a time; this should work well both for binary and
+    # hexadecimal floating point
+    x = 0
+    while m:
+        x = ((x << 28) & HASH_MASK) | x >> (61 - 28)
+        m *= 268435456.0 # 2**28
+        e -= 28
+        y = <unsigned long>m # pull out integer part
+        m -= y
+        x += y
+        if x >= <unsigned long>HASH_MASK:
+            x -= HASH_MASK
+    # adjust for the exponent; first reduce it modulo 61
+    if e >= 0:
+        e = e % 61
+    else:
+        e = 61-1-((-1-e) % 61)
+    x = ((x << e) & HASH_MASK) | x >> (61 - e)
+    x = x * sign
+    if <long>x == -1:
+        x = <unsigned long>-2
+    return <long>x
 ### END Python 3 ###############################################
 
 
@@ -117,6 +167,27 @@ cdef inline long _longhash_3(unsigned long v):
 
 # Cython-only interface
 cdef long tuplehash(long hashes[], long len):
+    if XXTUPLEHASH:
+        return _xxtuplehash(hashes, len)
+    return _tuplehash_old(hashes, len)
+
+# CPython >= 3.8, 64bit version
+cdef inline long _xxtuplehash(long hashes[], long len):
+    cdef unsigned long acc = 2870177450012600261UL # XXPRIME_5
+    cdef unsigned long lane
+    cdef long i
+    for i in range(len):
+        lane = <unsigned long>hashes[i]
+        acc += lane * 14029467366897019727UL # XXPRIME_2
+        acc = (acc << 31) | (acc >> 33)      # XXROTATE
+        acc *= 11400714785074694791UL        # XXPRIME_1
+    acc += (<unsigned long>len) ^ (2870177450012600261UL ^ 3527539UL)
+    if <long>acc == -1:
+        return 1546275796
+    return <long>acc
+
+# CPython < 3.8
+cdef inline long _tuplehash_old(long hashes[], long len):
     cdef long mult = 1000003
     cdef long x = 0x345678
     cdef long y
@@ -70,6 +70,34 @@ class key(object):
     targets_method = False
     targets_param = False
     targets_annotation = False
+class memoize(object):
+    __id__ = 10823359572276314619
+    targets_file = False
+    targets_const = False
+    targets_enum = False
+    targets_enumerant = False
+    targets_struct = True
+    targets_field = False
+    targets_union = False
+    targets_group = False
+    targets_interface = False
+    targets_method = False
+    targets_param = False
+    targets_annotation = False
+class text(object):
+    __id__ = 14460932341462520389
+    targets_file = False
+    targets_const = False
+    targets_enum = False
+    targets_enumerant = False
+    targets_struct = False
+    targets_field = True
+    targets_union = False
+    targets_group = False
+    targets_interface = False
+    targets_method = False
+    targets_param = False
+    targets_annotation = False
 
 #### DEFINITIONS ####
 
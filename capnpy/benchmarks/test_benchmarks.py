@@ -1,4 +1,5 @@
 import py
+import sys
 import pytest
 import pypytools
 from pypytools.codegen import Code
@@ -281,3 +282,161 @@ class TestList(object):
         obj = get_obj(schema)
         res = benchmark(mybench, obj)
         assert res == (4+3+2+1)*self.N
+
+
+def allocated_blocks(fn, n=1000):
+    """
+    Return the average number of memory blocks which are allocated by fn()
+    and still in use while its result is alive. Objects which are taken from
+    a freelist do not count, because their block is never released.
+    """
+    if not hasattr(sys, 'getallocatedblocks'):
+        return None # PyPy
+    fn() # warmup, e.g. to fill the freelists
+    total = 0
+    for i in range(n):
+        before = sys.getallocatedblocks()
+        res = fn()
+        total += sys.getallocatedblocks() - before
+        del res
+    return float(total) / n
+
+
+class TestAlloc(object):
+    """
+    Measure the allocation rate of short-lived objects: each item of a list
+    of structs and each loaded message is a new wrapper object, which is
+    thrown away immediately. Besides the time, each benchmark records in
+    extra_info['blocks'] how many memory blocks are allocated per wrapper.
+    """
+
+    N = 2000
+
+    @pytest.mark.benchmark(group="alloc")
+    def test_list_of_structs(self, schema, benchmark):
+        def mybench(container):
+            res = 0
+            for i in range(self.N):
+                for item in container.items:
+                    res += item.int64
+            return res
+        #
+        items = [get_obj(schema) for i in range(10)]
+        container = schema.MyStructContainer(items)
+        benchmark.extra_info['blocks'] = allocated_blocks(
+            lambda: container.items[3])
+        res = benchmark(mybench, container)
+        assert res == 100*10*self.N
+
+    @pytest.mark.benchmark(group="alloc")
+    def test_list_of_structs_cursor(self, schema, benchmark):
+        if schema.__name__ != 'Capnpy':
+            py.test.skip('N/A')
+        def mybench(container):
+            res = 0
+            for i in range(self.N):
+                for item in container.items.cursor():
+                    res += item.int64
+            return res
+        #
+        items = [get_obj(schema) for i in range(10)]
+        container = schema.MyStructContainer(items)
+        res = benchmark(mybench, container)
+        assert res == 100*10*self.N
+
+    @pytest.mark.benchmark(group="alloc")
+    def test_nested_struct(self, schema, benchmark):
+        def mybench(obj):
+            res = 0
+            for i in range(self.N):
+                res += obj.a.x
+            return res
+        #
+        p = schema.Point(1, 2, 3)
+        obj = schema.Rectangle(p, p)
+        benchmark.extra_info['blocks'] = allocated_blocks(lambda: obj.a)
+        res = benchmark(mybench, obj)
+        assert res == self.N
+
+    @pytest.mark.benchmark(group="alloc")
+    def test_loads(self, schema, benchmark):
+        if schema.__name__ != 'Capnpy':
+            py.test.skip('N/A')
+        #
+        def mybench(buf):
+            res = 0
+            for i in range(self.N):
+                p = schema.Point.loads(buf)
+                res += p.x
+            return res
+        #
+        buf = schema.Point(1, 2, 3).dumps()
+        benchmark.extra_info['blocks'] = allocated_blocks(
+            lambda: schema.Point.loads(buf))
+        res = benchmark(mybench, buf)
+        assert res == self.N
+
+
+class TestView(object):
+    """
+    Compare reading large Data blobs by copying them into bytes objects and
+    by taking zero-copy memoryviews over the buffer
+    """
+
+    N = 100
+    SIZE = 4*1024*1024
+
+    def get_obj(self, schema):
+        blob = b'x' * self.SIZE
+        return schema.BigData(data=blob, items=[blob[:1024*1024]]*4)
+
+    @pytest.mark.benchmark(group="view")
+    def test_data_copy(self, schema, benchmark):
+        if schema.__name__ != 'Capnpy':
+            py.test.skip('N/A')
+        def mybench(obj):
+            res = 0
+            for i in range(self.N):
+                res += len(obj.data)
+            return res
+        res = benchmark(mybench, self.get_obj(schema))
+        assert res == self.SIZE*self.N
+
+    @pytest.mark.benchmark(group="view")
+    def test_data_view(self, schema, benchmark):
+        if schema.__name__ != 'Capnpy':
+            py.test.skip('N/A')
+        def mybench(obj):
+            res = 0
+            for i in range(self.N):
+                res += len(obj.get_data_view())
+            return res
+        res = benchmark(mybench, self.get_obj(schema))
+        assert res == self.SIZE*self.N
+
+    @pytest.mark.benchmark(group="view")
+    def test_list_copy(self, schema, benchmark):
+        if schema.__name__ != 'Capnpy':
+            py.test.skip('N/A')
+        def mybench(obj):
+            res = 0
+            for i in range(self.N):
+                for item in obj.items:
+                    res += len(item)
+            return res
+        res = benchmark(mybench, self.get_obj(schema))
+        assert res == self.SIZE*self.N
+
+    @pytest.mark.benchmark(group="view")
+    def test_list_view(self, schema, benchmark):
+        if schema.__name__ != 'Capnpy':
+            py.test.skip('N/A')
+        def mybench(obj):
+            res = 0
+            for i in range(self.N):
+                items = obj.items
+                for j in range(len(items)):
+                    res += len(items.get_view(j))
+            return res
+        res = benchmark(mybench, self.get_obj(schema))
+        assert res == self.SIZE*self.N
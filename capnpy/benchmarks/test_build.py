@@ -0,0 +1,111 @@
+import py
+import pytest
+import textwrap
+import multiprocessing
+import capnpy
+from capnpy.compiler.compiler import BaseCompiler
+from capnpy.compiler.module import ModuleGenerator
+from capnpy.compiler.distutils import capnpify
+
+
+class TestBuild(object):
+
+    # number of schemas to compile: each of them contains a handful of
+    # structs, to make the code generation non trivial
+    N = 32
+
+    @pytest.fixture
+    def schemas(self, tmpdir, monkeypatch):
+        files = []
+        for i in range(self.N):
+            structs = []
+            for j in range(10):
+                structs.append("""
+                struct Struct{j} {{
+                    a @0 :Int64;
+                    b @1 :Float64;
+                    c @2 :Text;
+                    d @3 :List(Int32);
+                    e @4 :Struct{j};
+                }}
+                """.format(j=j))
+            src = '@0x%x;\n' % (0xbf5147cbbecf4000 + i)
+            src += ''.join(map(textwrap.dedent, structs))
+            f = tmpdir.join('schema%d.capnp' % i)
+            f.write(src)
+            files.append(str(f))
+        monkeypatch.chdir(tmpdir)
+        return files
+
+    def build(self, benchmark, schemas, pyx, nthreads):
+        benchmark.extra_info['nthreads'] = nthreads
+        ext = '.pyx' if pyx else '.py'
+        def cleanup():
+            # DistutilsCompiler skips the schemas which are already compiled
+            for f in schemas:
+                outfile = py.path.local(f).new(ext=ext)
+                if outfile.check():
+                    outfile.remove()
+        def build():
+            return capnpify(schemas, pyx=pyx, nthreads=nthreads)
+        benchmark.pedantic(build, setup=cleanup, rounds=3)
+
+    @pytest.mark.benchmark(group="build")
+    @pytest.mark.parametrize('nthreads', [1, 'cpu_count'])
+    def test_capnpify_py(self, benchmark, schemas, nthreads):
+        if nthreads == 'cpu_count':
+            nthreads = multiprocessing.cpu_count()
+        self.build(benchmark, schemas, False, nthreads)
+
+
+class TestCodegen(object):
+
+    @pytest.fixture(params=[1000, 10000])
+    def request_(self, request, tmpdir):
+        # a synthetic schema which exercises the code generator: each struct
+        # has a $Py.key, a union, a group, a $Py.group and a nested enum
+        structs = []
+        for j in range(request.param):
+            structs.append("""
+            struct Struct{j} $Py.key("a, b") {{
+                a @0 :Int64;
+                b @1 :Float64;
+                c @2 :Text;
+                d @3 :List(Int32);
+                e @4 :Struct{j};
+                f @5 :Kind;
+                pos :group {{
+                    x @6 :Int32;
+                    y @7 :Int32;
+                }}
+                pg @8 :Void $Py.group("g1, g2");
+                g1 @9 :Int32;
+                g2 @10 :Int32;
+                union {{
+                    u1 @11 :Int64;
+                    u2 @12 :Text;
+                }}
+                enum Kind {{
+                    k1 @0;
+                    k2 @1;
+                }}
+            }}
+            """.format(j=j))
+        src = '@0xbf5147cbbecf4000;\n'
+        src += 'using Py = import "/capnpy/annotate.capnp";\n'
+        src += ''.join(map(textwrap.dedent, structs))
+        f = tmpdir.join('schema.capnp')
+        f.write(src)
+        root = py.path.local(capnpy.__file__).dirpath('..')
+        comp = BaseCompiler([root, tmpdir])
+        return comp._parse_schema_file(f)
+
+    @pytest.mark.benchmark(group="codegen")
+    @pytest.mark.parametrize('pyx', [False, True])
+    def test_generate(self, benchmark, request_, pyx):
+        benchmark.extra_info['nodes'] = len(request_.nodes)
+        def generate():
+            m = ModuleGenerator(request_, convert_case=True, pyx=pyx,
+                                version_check=True, standalone=True)
+            return m.generate()
+        benchmark.pedantic(generate, rounds=1)
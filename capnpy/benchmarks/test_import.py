@@ -0,0 +1,43 @@
+import sys
+import pytest
+import textwrap
+from capnpy.compiler.compiler import StandaloneCompiler
+
+
+class TestImport(object):
+
+    def compile(self, tmpdir, n, lazy):
+        structs = []
+        for j in range(n):
+            structs.append("""
+            struct Struct{j} {{
+                a @0 :Int64;
+                b @1 :Float64;
+                c @2 :Text;
+                d @3 :List(Int32);
+                e @4 :Struct{j};
+            }}
+            """.format(j=j))
+        src = '@0xbf5147cbbecf4000;\n'
+        src += ''.join(map(textwrap.dedent, structs))
+        schema = tmpdir.join('bigschema.capnp')
+        schema.write(src)
+        comp = StandaloneCompiler(sys.path)
+        comp.compile(schema, pyx=False, lazy=lazy)
+
+    @pytest.mark.benchmark(group="import")
+    @pytest.mark.parametrize('n', [100, 1000, 3000])
+    @pytest.mark.parametrize('lazy', [False, True])
+    def test_import_py(self, benchmark, tmpdir, monkeypatch, n, lazy):
+        self.compile(tmpdir, n, lazy)
+        monkeypatch.syspath_prepend(tmpdir)
+        benchmark.extra_info['n'] = n
+        def cleanup():
+            sys.modules.pop('bigschema', None)
+        def load():
+            # include the first access to a class, which is what triggers the
+            # definition in lazy mode
+            mod = __import__('bigschema')
+            return mod.Struct0
+        benchmark.pedantic(load, setup=cleanup, rounds=3)
+        cleanup()
@@ -1,10 +1,12 @@
 import pytest
 import socket
+from io import BytesIO
 import contextlib
 import six
 from six.moves import range
 
-from capnpy.buffered import BufferedSocket
+from capnpy.buffered import BufferedSocket, DeltaWriter, DeltaReader
+from capnpy.message import load_all
 from capnpy.benchmarks import support
 from capnpy.benchmarks.test_benchmarks import get_obj, schema
 from capnpy.benchmarks.test_buffered import TcpServer
@@ -138,3 +140,54 @@ class TestDump(object):
         assert not obj0._is_compact()
         res = benchmark(dumps_N, obj0)
         assert type(res) is six.binary_type
+
+
+class TestDeltaStream(object):
+
+    # a stream of nearly identical messages, as in the typical telemetry use
+    # case: only one field changes between one message and the next
+    N = 2000
+
+    def get_messages(self):
+        M = support.Capnpy
+        inner = M.MyInner(field=200)
+        return [M.MyStruct(padding=0, bool=100, int8=100, int16=100, int32=100,
+                           int64=i, uint8=100, uint16=100, uint32=100,
+                           uint64=100, float32=100, float64=100,
+                           text=b'hello world', group=(100,), inner=inner,
+                           intlist=[1, 2, 3, 4], color=2)
+                for i in range(self.N)]
+
+    def dump_N(self, messages):
+        f = BytesIO()
+        writer = DeltaWriter(f)
+        for obj in messages:
+            obj.dump(writer)
+        return writer
+
+    def report(self, benchmark, writer):
+        # the throughput is computed on the uncompressed size
+        benchmark.extra_info['compression_ratio'] = (
+            float(writer.bytes_in) / writer.bytes_out)
+        benchmark.extra_info['MB/s'] = (
+            writer.bytes_in / benchmark.stats.stats.mean / 1e6)
+
+    @pytest.mark.benchmark(group="delta_stream")
+    def test_dump(self, benchmark):
+        messages = self.get_messages()
+        writer = benchmark(self.dump_N, messages)
+        assert writer.bytes_out * 5 < writer.bytes_in
+        self.report(benchmark, writer)
+
+    @pytest.mark.benchmark(group="delta_stream")
+    def test_load_all(self, benchmark):
+        writer = self.dump_N(self.get_messages())
+        buf = writer.f.getvalue()
+        def load_N():
+            res = 0
+            for obj in load_all(DeltaReader(BytesIO(buf)), support.Capnpy.MyStruct):
+                res += obj.int64
+            return res
+        res = benchmark(load_N)
+        assert res == sum(range(self.N))
+        self.report(benchmark, writer)
@@ -89,6 +89,22 @@ class Blob(object):
     def _cmp_ne(self, other):
         return not self._equals(other)
 
+    def _cmp_order(self, other, op):
+        # op is one of the Py_LT, Py_LE, Py_GT, Py_GE constants
+        return self._cmp_error(other)
+
+    def _cmp_lt(self, other):
+        return self._cmp_order(other, 0)
+
+    def _cmp_le(self, other):
+        return self._cmp_order(other, 1)
+
+    def _cmp_gt(self, other):
+        return self._cmp_order(other, 4)
+
+    def _cmp_ge(self, other):
+        return self._cmp_order(other, 5)
+
     def _cmp_error(self, other):
         raise TypeError('capnpy structs can be compared only for equality')
 
@@ -98,7 +114,7 @@ class Blob(object):
         elif op == 3:
             return self._cmp_ne(other)
         else:
-            return self._cmp_error(other)
+            return self._cmp_order(other, op)
 
     def __richcmp__(self, other, op):
         return self._richcmp(other, op)
@@ -108,9 +124,9 @@ class Blob(object):
 try:
     Blob.__eq__ = Blob.__dict__['_cmp_eq']
     Blob.__ne__ = Blob.__dict__['_cmp_ne']
-    Blob.__lt__ = Blob.__dict__['_cmp_error']
-    Blob.__le__ = Blob.__dict__['_cmp_error']
-    Blob.__gt__ = Blob.__dict__['_cmp_error']
-    Blob.__ge__ = Blob.__dict__['_cmp_error']
+    Blob.__lt__ = Blob.__dict__['_cmp_lt']
+    Blob.__le__ = Blob.__dict__['_cmp_le']
+    Blob.__gt__ = Blob.__dict__['_cmp_gt']
+    Blob.__ge__ = Blob.__dict__['_cmp_ge']
 except TypeError:
     pass
@@ -1,5 +1,6 @@
 import cython
 from capnpy.filelike cimport FileLike
+from capnpy._deltapack cimport pack_delta, unpack_delta
 
 cdef class BufferedStream(FileLike):
     cdef readonly bytes buf
@@ -34,3 +35,22 @@ cdef class StringBuffer(FileLike):
     cpdef bytes readline(self)
 
     cpdef int tell(self)
+
+
+cdef class DeltaWriter:
+    cdef readonly object f
+    cdef readonly bytes prev
+    cdef readonly long bytes_in
+    cdef readonly long bytes_out
+
+    @cython.locals(prev=bytes, encoded=bytes, header=bytes)
+    cpdef write(self, object data)
+
+
+cdef class DeltaReader(BufferedStream):
+    cdef readonly object f
+    cdef readonly bytes prev
+
+    @cython.locals(header=bytes, encoded=bytes, prev=bytes, frame=bytes,
+                   size=long, length=long)
+    cpdef bytes _readchunk(self)
@@ -1,4 +1,6 @@
+import struct
 from capnpy.filelike import FileLike
+from capnpy._deltapack import pack_delta, unpack_delta
 
 class BufferedStream(FileLike):
     """
@@ -156,3 +158,76 @@ class StringBuffer(FileLike):
 
     def tell(self):
         return self.i
+
+
+class DeltaWriter(object):
+    """
+    file-like wrapper which delta-encodes the frames written to f; each call
+    to write() is a frame, so it can be passed directly to dump().
+
+    Each frame is XORed against the previous one if they have the same size,
+    then compressed with a zero-run encoding: if consecutive messages are
+    nearly identical, most of the bytes become 0 and the encoded frame is very
+    small. Use DeltaReader to read them back.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.prev = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def write(self, data):
+        data = bytes(data)
+        if not data:
+            # an empty frame would be read back as EOF
+            return
+        prev = self.prev
+        if prev is not None and len(prev) != len(data):
+            prev = None
+        encoded = pack_delta(data, prev)
+        header = struct.pack('<II', len(data), len(encoded))
+        self.f.write(header)
+        self.f.write(encoded)
+        self.prev = data
+        self.bytes_in += len(data)
+        self.bytes_out += len(header) + len(encoded)
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class DeltaReader(BufferedStream):
+    """
+    file-like interface to read the frames written by DeltaWriter; it can be
+    passed to load() and load_all().
+    """
+
+    def __init__(self, f):
+        super(DeltaReader, self).__init__()
+        self.f = f
+        self.prev = None
+
+    def _readchunk(self):
+        header = self.f.read(8)
+        if len(header) == 0:
+            return b''
+        if len(header) < 8:
+            raise ValueError("Unexpected EOF when reading the frame header")
+        size, length = struct.unpack('<II', header)
+        encoded = self.f.read(length)
+        if len(encoded) < length:
+            raise ValueError("Unexpected EOF: expected %d bytes, got only %d"
+                             % (length, len(encoded)))
+        prev = self.prev
+        if prev is not None and len(prev) != size:
+            prev = None
+        frame = unpack_delta(encoded, size, prev)
+        self.prev = frame
+        return frame
+
+    def close(self):
+        self.f.close()
@@ -2,7 +2,12 @@ from __future__ import absolute_import, print_function
 import py
 import sys
 import os
+import re
 import types
+import json
+import hashlib
+import warnings
+import sysconfig
 import subprocess
 from six import PY3
 from distutils.version import LooseVersion
@@ -17,6 +22,27 @@ from capnpy.util import ensure_unicode
 
 PKGDIR = py.path.local(capnpy.__file__).dirpath()
 
+_compiler_version = None
+
+def compiler_version():
+    """
+    Return a string which identifies the code generator: the version of
+    capnpy plus a hash of the sources of capnpy.compiler and of the .pxd files
+    of capnpy (which are cimported by the pyx modules). The hash is needed
+    because the version is 'unknown' when running from a development tree.
+    """
+    global _compiler_version
+    if _compiler_version is None:
+        h = hashlib.sha256()
+        files = PKGDIR.join('compiler').listdir('*.py') + PKGDIR.listdir('*.pxd')
+        for f in sorted(files):
+            h.update(f.basename.encode('utf-8'))
+            h.update(b'\0')
+            h.update(f.read_binary())
+        _compiler_version = '%s-%s' % (getattr(capnpy, '__version__', 'unknown'),
+                                       h.hexdigest()[:16])
+    return _compiler_version
+
 class CompilerError(Exception):
     pass
 
@@ -25,11 +51,13 @@ class BaseCompiler(object):
     standalone = None
     annotate = False
     include_dirs = [str(PKGDIR)] # include "ptr.h"
+    cachedir = None
 
     def __init__(self, path):
         self.path = [py.path.local(dirname) for dirname in path]
         self.modules = {}
         self._tmpdir = None
+        self._capnp_version_checked = False
 
     @property
     def tmpdir(self):
@@ -47,22 +75,109 @@ class BaseCompiler(object):
         return pyx
 
     def _parse_schema_file(self, filename):
-        data = self._capnp_compile(filename)
+        data = self._load_request(filename)
+        if data is None:
+            data = self._capnp_compile(filename)
+            self._store_request(filename, data)
         request = loads(data, schema.CodeGeneratorRequest)
         return request
 
-    def generate_py_source(self, filename, convert_case, pyx, version_check=True):
+    # the first line of a .req file
+    _REQ_HEADER = b'capnpy request, inputs sha256: '
+
+    def save_request(self, filename):
+        """
+        Run capnp on the given schema and save the resulting
+        CodeGeneratorRequest alongside it, in ``<filename>.req``: if it is
+        up to date, it is used instead of running capnp again. This way you
+        can ship the schemas together with their .req files, and load them on
+        machines where capnp is not installed.
+
+        The file starts with a hash of the content of the schema and of all
+        the files which it imports, which is used to check whether it is up
+        to date.
+        """
+        filename = py.path.local(filename)
+        data = self._capnp_compile(filename)
+        reqfile = self._request_file(filename)
+        reqfile.write_binary(self._request_header(filename) + data)
+        return reqfile
+
+    def _request_file(self, filename):
+        return filename.new(basename=filename.basename + '.req')
+
+    def _request_header(self, filename):
+        h = hashlib.sha256()
+        for f in self._find_imports(filename):
+            data = f.read_binary()
+            h.update(str(len(data)).encode('ascii'))
+            h.update(b'\0')
+            h.update(data)
+        return self._REQ_HEADER + h.hexdigest().encode('ascii') + b'\n'
+
+    def _load_request(self, filename):
+        """
+        Look for an already computed CodeGeneratorRequest for filename: first
+        alongside the schema, then in the cachedir. Return None if there is
+        none.
+        """
+        filename = py.path.local(filename)
+        reqfile = self._request_file(filename)
+        if reqfile.check(file=True):
+            # check the content of the inputs, not their mtime: pip and
+            # wheel don't preserve the order of the mtimes of the files
+            # which they install
+            data = reqfile.read_binary()
+            header = self._request_header(filename)
+            if data.startswith(header):
+                return data[len(header):]
+            warnings.warn('%s is out of date, running capnp' % reqfile)
+        if self.cachedir is not None:
+            reqfile = self._request_cache_file(filename)
+            if reqfile.check(file=True):
+                return reqfile.read_binary()
+        return None
+
+    def _store_request(self, filename, data):
+        if self.cachedir is None:
+            return
+        reqfile = self._request_cache_file(filename)
+        reqfile.dirpath().ensure(dir=True)
+        tmpfile = reqfile.new(basename='%s.%d.tmp' % (reqfile.basename, os.getpid()))
+        tmpfile.write_binary(data)
+        tmpfile.rename(reqfile)
+
+    def _request_cache_file(self, filename):
+        """
+        The CodeGeneratorRequest depends only on the content of the schemas
+        and on the search path used to resolve the imports
+        """
+        h = hashlib.sha256()
+        for dirname in self.path:
+            h.update(str(dirname).encode('utf-8'))
+            h.update(b'\0')
+        for f in self._find_imports(filename):
+            h.update(str(f).encode('utf-8'))
+            h.update(b'\0')
+            h.update(f.read_binary())
+        return self.cachedir.join('requests', h.hexdigest() + '.req')
+
+    def generate_py_source(self, filename, convert_case, pyx, version_check=True,
+                           memoize=False, lazy=False):
         pyx = self.getpyx(pyx)
         request = self._parse_schema_file(filename)
-        m = ModuleGenerator(request, convert_case, pyx, version_check, self.standalone)
+        m = ModuleGenerator(request, convert_case, pyx, version_check,
+                            self.standalone, memoize, lazy)
         src = m.generate()
         return m, py.code.Source(src)
 
-    def _pyx_to_dll(self, filename, m, src):
+    def _pyx_to_dll(self, filename, m, src, pxd=None):
         from pyximport.pyxbuild import pyx_to_dll
         pyxname = filename.new(ext='pyx')
         pyxfile = self.tmpdir.join(pyxname).ensure(file=True)
         pyxfile.write(src)
+        if pxd is not None:
+            pyxfile.new(ext='pxd').write(pxd)
         if self.annotate:
             import Cython.Compiler.Options
             Cython.Compiler.Options.annotate = True
@@ -76,12 +191,59 @@ class BaseCompiler(object):
             os.system('xdg-open %s' % htmlfile)
         return dll
 
+    _IMPORT = re.compile(br'\b(import|embed)\s+"([^"]+)"')
+
+    def _find_imports(self, filename):
+        """
+        Return filename and all the schemas which it imports, transitively,
+        plus all the files which they embed. Imports are found by scanning the
+        source: this might find too many of them (e.g. inside comments), which
+        is harmless since they are used only to compute cache keys and to
+        check whether .req files are up to date.
+        """
+        result = []
+        seen = set()
+        embedded = set()
+        todo = [py.path.local(filename)]
+        while todo:
+            f = todo.pop()
+            if f in seen:
+                continue
+            seen.add(f)
+            result.append(f)
+            if f in embedded:
+                continue # not a schema, don't scan it
+            for kind, importname in self._IMPORT.findall(f.read_binary()):
+                importname = ensure_unicode(importname)
+                if importname.startswith('/'):
+                    try:
+                        dep = self._find_file(importname)
+                    except ValueError:
+                        continue # capnp will complain when compiling
+                else:
+                    dep = f.dirpath().join(importname)
+                    if not dep.check(file=True):
+                        continue
+                if kind == b'embed':
+                    embedded.add(dep)
+                todo.append(dep)
+        return result
+
+    def _find_file(self, importname):
+        for dirpath in self.path:
+            f = dirpath.join(importname)
+            if f.check(file=True):
+                return f
+        raise ValueError("Cannot find %s in the given path" % importname)
+
     def _capnp_compile(self, filename):
         capnp = py.path.local.sysfind('capnp')
         if capnp is None:
             raise CompilerError("Cannot find the capnp executable. Make sure it is "
                                 "installed and in $PATH")
-        self._capnp_check_version()
+        if not self._capnp_version_checked:
+            self._capnp_check_version()
+            self._capnp_version_checked = True
         # If <lang> is '-', the capnp compiler dumps the CodeGeneratorRequest bytes to standard output.
         cmd = ['capnp', 'compile', '-o-']
         for dirname in self.path:
@@ -118,12 +280,18 @@ class DynamicCompiler(BaseCompiler):
 
     standalone = False
 
+    def __init__(self, path, cachedir=None):
+        super(DynamicCompiler, self).__init__(path)
+        if cachedir is not None:
+            cachedir = py.path.local(cachedir)
+        self.cachedir = cachedir
+
     def parse_schema(self, modname=None, importname=None, filename=None):
         filename = self._get_filename(modname, importname, filename)
         return self._parse_schema_file(filename)
 
     def load_schema(self, modname=None, importname=None, filename=None,
-                    convert_case=True, pyx='auto'):
+                    convert_case=True, pyx='auto', memoize=False, lazy=False):
         """
         Compile and load a capnp schema, which can be specified by setting one
         (and only one) of the following params:
@@ -149,29 +317,102 @@ class DynamicCompiler(BaseCompiler):
 
           - *pyx*: specify whether to use **pyx mode** or **py mode**.
             Default is 'auto'
+
+          - *memoize*: whether to cache the objects returned by struct, list
+            and group fields in all the structs, as if they were annotated
+            with ``$Py.memoize``. Default is False.
+
+          - *lazy*: whether to define the classes of the module only when
+            they are first accessed, instead of at import time. It has no
+            effect in **pyx mode**. Default is False.
+
+        If the compiler has a ``cachedir``, the compiled modules are also
+        stored there, so that other processes can load them without running
+        ``capnp``, nor Cython.
         """
         pyx = self.getpyx(pyx)
         filename = self._get_filename(modname, importname, filename)
         try:
             return self.modules[filename]
         except KeyError:
-            mod = self._compile_file(filename, convert_case, pyx)
+            mod = self._compile_file(filename, convert_case, pyx, memoize, lazy)
             self.modules[filename] = mod
             return mod
 
-    def _compile_file(self, filename, convert_case, pyx):
+    def _compile_file(self, filename, convert_case, pyx, memoize=False,
+                      lazy=False):
+        if self.cachedir is not None:
+            return self._compile_file_cached(filename, convert_case, pyx,
+                                             memoize, lazy)
         m, src = self.generate_py_source(filename, convert_case=convert_case,
-                                         pyx=pyx)
+                                         pyx=pyx, memoize=memoize, lazy=lazy)
         if pyx:
             return self._compile_pyx(filename, m, src)
         else:
             return self._compile_py(filename, m, src)
 
+    def _compile_file_cached(self, filename, convert_case, pyx, memoize, lazy):
+        """
+        Look for the compiled module in the cachedir. The cache is
+        content-addressed: see _cache_key for what is part of the key.
+        """
+        modname = py.path.local(filename).purebasename
+        key = self._cache_key(filename, convert_case, pyx, memoize, lazy)
+        ext = '.so' if pyx else '.py'
+        cached = self.cachedir.join(key, modname + ext)
+        if cached.check(file=True):
+            if pyx:
+                return self._load_dll(filename, modname, cached)
+            src = py.code.Source(cached.read())
+            return self._load_py(filename, modname, src)
+        #
+        # cache miss: compile it as usual, then store the result. We write to
+        # a temp file and rename it, so that concurrent processes never see
+        # a partially written module
+        m, src = self.generate_py_source(filename, convert_case=convert_case,
+                                         pyx=pyx, memoize=memoize, lazy=lazy)
+        cached.dirpath().ensure(dir=True)
+        tmpfile = cached.new(basename='%s.%d.tmp' % (cached.basename, os.getpid()))
+        if pyx:
+            dll = py.path.local(self._pyx_to_dll(filename, m, src))
+            dll.copy(tmpfile, mode=True)
+            tmpfile.rename(cached)
+            return self._load_dll(filename, m.modname, dll)
+        tmpfile.write(str(src))
+        tmpfile.rename(cached)
+        return self._load_py(filename, m.modname, src)
+
+    def _cache_key(self, filename, convert_case, pyx, memoize, lazy=False):
+        """
+        Return a key which identifies the compiled module: it depends on the
+        content of the schema and of all the files it imports or embeds, the
+        version of the compiler, the compilation options and the Python ABI.
+        """
+        h = hashlib.sha256()
+        parts = [compiler_version(),
+                 sys.version,
+                 sysconfig.get_config_var('EXT_SUFFIX') or
+                 sysconfig.get_config_var('SO') or '',
+                 repr((bool(convert_case), bool(pyx), bool(memoize),
+                       bool(lazy))),
+                 str(filename)]
+        for part in parts:
+            h.update(part.encode('utf-8'))
+            h.update(b'\0')
+        for f in self._find_imports(filename):
+            h.update(str(f).encode('utf-8'))
+            h.update(b'\0')
+            h.update(f.read_binary())
+        return h.hexdigest()
+
     def _compile_py(self, filename, m, src):
         """
         Compile and load the schema as pure python
         """
-        mod = types.ModuleType(m.modname)
+        return self._load_py(filename, m.modname, src)
+
+    def _load_py(self, filename, modname, src):
+        mod = types.ModuleType(modname)
         mod.__file__ = str(filename)
         mod.__schema__ = str(filename)
         mod.__source__ = str(src)
@@ -183,6 +424,10 @@ class DynamicCompiler(BaseCompiler):
         """
         Use Cython to compile the schema
         """
+        dll = self._pyx_to_dll(filename, m, src)
+        return self._load_dll(filename, m.modname, dll)
+
+    def _load_dll(self, filename, modname, dll):
         import capnpy.ext # the package which we will load the .so in
         import imp
         #
@@ -198,12 +443,12 @@ class DynamicCompiler(BaseCompiler):
         # contains __compiler. Then, in foo.pyx, we import it:
         #     from foo_tmp import __compiler
         #
-        dll = self._pyx_to_dll(filename, m, src)
-        tmpmod = types.ModuleType(m.tmpname)
+        tmpname = '%s_tmp' % modname
+        tmpmod = types.ModuleType(tmpname)
         tmpmod.__dict__['__compiler'] = self
         tmpmod.__dict__['__schema__'] = str(filename)
-        sys.modules[m.tmpname] = tmpmod
-        modname = 'capnpy.ext.%s' % m.modname
+        sys.modules[tmpname] = tmpmod
+        modname = 'capnpy.ext.%s' % modname
         mod = imp.load_dynamic(modname, str(dll))
         #
         # clean-up the cluttered sys.modules
@@ -226,13 +471,6 @@ class DynamicCompiler(BaseCompiler):
         else:
             return py.path.local(filename)
 
-    def _find_file(self, importname):
-        for dirpath in self.path:
-            f = dirpath.join(importname)
-            if f.check(file=True):
-                return f
-        raise ValueError("Cannot find %s in the given path" % importname)
-
 
 class StandaloneCompiler(BaseCompiler):
     """
@@ -242,10 +480,12 @@ class StandaloneCompiler(BaseCompiler):
 
     standalone = True
 
-    def compile(self, filename, convert_case=True, pyx='auto', version_check=True):
+    def compile(self, filename, convert_case=True, pyx='auto', version_check=True,
+                memoize=False, lazy=False):
         pyx = self.getpyx(pyx)
         infile = py.path.local(filename)
-        m, src = self.generate_py_source(infile, convert_case, pyx, version_check)
+        m, src = self.generate_py_source(infile, convert_case, pyx, version_check,
+                                         memoize, lazy)
         if pyx:
             self._compile_pyx(infile, m, src)
         else:
@@ -256,33 +496,124 @@ class StandaloneCompiler(BaseCompiler):
         outfile.write(src)
 
     def _compile_pyx(self, infile, m, src):
-        dll = self._pyx_to_dll(infile, m, src)
+        # the .pxd is needed to compile the module, and it is copied next to
+        # it so that other Cython modules can cimport it
+        pxd = m.generate_pxd()
+        dll = self._pyx_to_dll(infile, m, src, pxd)
         dll = py.path.local(dll)
         outdir = infile.dirpath()
         dll.copy(outdir, mode=True)
+        infile.new(ext='pxd').write(pxd)
 
 
 class DistutilsCompiler(BaseCompiler):
     """
     Compiler for integration with distutils: it generates .py/.pyx files,
-    which (in case of pyx files) are then handled by cythonize
+    which (in case of pyx files) are then handled by cythonize.
+
+    If ``manifest`` is given, it is the name of a JSON file which records,
+    for each compiled schema, the content hash of all its transitive inputs:
+    a schema is compiled again only if one of them changed. Without a
+    manifest, it compares the mtime of the output with the ones of the
+    inputs.
     """
     standalone = True
 
-    def compile(self, filename, convert_case=True, pyx='auto', version_check=True):
+    def __init__(self, path, manifest=None):
+        super(DistutilsCompiler, self).__init__(path)
+        if manifest is not None:
+            manifest = py.path.local(manifest)
+        self.manifest = manifest
+        self._manifest_data = None
+        self._hashes = {}
+
+    def compile(self, filename, convert_case=True, pyx='auto', version_check=True,
+                memoize=False, lazy=False, force=False):
         pyx = self.getpyx(pyx)
         infile = py.path.local(filename)
-        if pyx:
-            outfile = infile.new(ext='pyx')
-        else:
-            outfile = infile.new(ext='py')
-        #
-        if outfile.exists() and outfile.mtime() > infile.mtime():
+        outfile = self.get_outfile(infile, pyx)
+        options = self.options_key(convert_case, pyx, version_check, memoize,
+                                   lazy)
+        if not force and self.is_up_to_date(infile, outfile, options):
             # already compiled
             return outfile
         cwd = py.path.local('.')
         print('[capnpy] Compiling', infile.relto(cwd))
         m, src = self.generate_py_source(infile, convert_case=convert_case,
-                                         pyx=pyx, version_check=version_check)
+                                         pyx=pyx, version_check=version_check,
+                                         memoize=memoize, lazy=lazy)
         outfile.write(src)
+        if pyx:
+            outfile.new(ext='pxd').write(m.generate_pxd())
+        self.record(infile, options)
         return outfile
+
+    def get_outfile(self, infile, pyx):
+        if pyx:
+            return infile.new(ext='pyx')
+        else:
+            return infile.new(ext='py')
+
+    def options_key(self, convert_case, pyx, version_check, memoize,
+                    lazy=False):
+        return [compiler_version(), bool(convert_case), bool(pyx),
+                bool(version_check), bool(memoize), bool(lazy)]
+
+    def is_up_to_date(self, infile, outfile, options):
+        if not outfile.exists():
+            return False
+        if outfile.ext == '.pyx' and not outfile.new(ext='pxd').exists():
+            return False
+        if self.manifest is None:
+            mtime = outfile.mtime()
+            return all(f.mtime() < mtime for f in self._find_imports(infile))
+        entry = self._load_manifest().get(str(infile))
+        if entry is None or entry['options'] != options:
+            return False
+        # the set of imports can change only if one of the recorded inputs
+        # changes, so we don't need to scan the schemas again
+        for fname, h in entry['inputs'].items():
+            f = py.path.local(fname)
+            if not f.check(file=True) or self._hash(f) != h:
+                return False
+        return True
+
+    def record(self, infile, options):
+        """
+        Record the inputs of infile in the manifest. The manifest is written
+        to disk only by save_manifest().
+        """
+        if self.manifest is None:
+            return
+        inputs = dict((str(f), self._hash(f))
+                      for f in self._find_imports(infile))
+        self._load_manifest()[str(infile)] = {'options': options,
+                                              'inputs': inputs}
+
+    def save_manifest(self):
+        if self.manifest is None or self._manifest_data is None:
+            return
+        self.manifest.dirpath().ensure(dir=True)
+        tmpfile = self.manifest.new(basename=self.manifest.basename + '.tmp')
+        tmpfile.write(json.dumps(self._manifest_data, indent=1, sort_keys=True))
+        tmpfile.rename(self.manifest)
+
+    def _load_manifest(self):
+        if self._manifest_data is None:
+            self._manifest_data = {}
+            if self.manifest.check(file=True):
+                try:
+                    self._manifest_data = json.loads(self.manifest.read())
+                except ValueError:
+                    pass # corrupted manifest, rebuild everything
+        return self._manifest_data
+
+    def _hash(self, f):
+        # each file is hashed at most once, even if it is imported by many
+        # schemas
+        try:
+            return self._hashes[f]
+        except KeyError:
+            h = hashlib.sha256(f.read_binary()).hexdigest()
+            self._hashes[f] = h
+            return h
@@ -3,6 +3,7 @@ import py
 import sys
 import glob
 import warnings
+import multiprocessing
 from distutils.core import Extension
 from capnpy.compiler.compiler import DistutilsCompiler
 try:
@@ -10,9 +11,14 @@ try:
 except ImportError:
     cythonize = None
 
+# the manifest records the inputs of each compiled schema, to decide which
+# ones need to be compiled again
+DEFAULT_MANIFEST = 'build/capnpy-manifest.json'
+
 # setuptools entry-points
 def capnpy_options(dist, attr, value):
-    my_options = set(['pyx', 'convert_case', 'version_check'])
+    my_options = set(['pyx', 'convert_case', 'version_check', 'memoize',
+                      'lazy', 'nthreads'])
     for opt in value:
         if opt not in my_options:
             warnings.warn('Unknown capnpy option: %s' % opt)
@@ -23,28 +29,97 @@ def capnpy_schemas(dist, attr, schemas):
     pyx = options.get('pyx', 'auto')
     convert_case = options.get('convert_case', True)
     version_check = options.get('version_check', True)
+    memoize = options.get('memoize', False)
+    lazy = options.get('lazy', False)
+    nthreads = options.get('nthreads', None)
     if dist.ext_modules is None:
         dist.ext_modules = []
     dist.ext_modules += capnpify(schemas, pyx=pyx, convert_case=convert_case,
-                                 version_check=version_check)
+                                 version_check=version_check, memoize=memoize,
+                                 lazy=lazy, nthreads=nthreads)
+    #
+    # compile the C extensions in parallel as well, unless the user
+    # explicitly passed --parallel/-j to build_ext
+    nthreads = _get_nthreads(nthreads)
+    if nthreads > 1:
+        build_ext_options = dist.command_options.setdefault('build_ext', {})
+        build_ext_options.setdefault('parallel', ('capnpy_options', nthreads))
+
+def capnpify(files, pyx='auto', convert_case=True, version_check=True,
+             memoize=False, lazy=False, nthreads=None,
+             manifest=DEFAULT_MANIFEST):
+    """
+    Compile the given schemas, and return the list of Extensions to build (in
+    pyx mode) or an empty list (in py mode).
+
+    The schemas are compiled by a pool of ``nthreads`` processes, which are
+    also used by cythonize. By default, ``nthreads`` is the number of CPUs.
 
-def capnpify(files, pyx='auto', convert_case=True, version_check=True):
+    Only the schemas whose inputs changed since the last build are compiled
+    again: see DistutilsCompiler for the details about the ``manifest``.
+    """
     cwd = py.path.local('.')
     if isinstance(files, str):
         files = glob.glob(files)
         if files == []:
             raise ValueError("'%s' did not match any files" % files)
-    compiler = DistutilsCompiler(sys.path)
-    outfiles = [compiler.compile(f, convert_case, pyx, version_check) for f in files]
+    nthreads = _get_nthreads(nthreads)
+    compiler = DistutilsCompiler(sys.path, manifest=manifest)
+    pyx = compiler.getpyx(pyx)
+    options = compiler.options_key(convert_case, pyx, version_check, memoize,
+                                   lazy)
+    outfiles = []
+    todo = []
+    for f in files:
+        infile = py.path.local(f)
+        outfile = compiler.get_outfile(infile, pyx)
+        if not compiler.is_up_to_date(infile, outfile, options):
+            todo.append(infile)
+        outfiles.append(outfile)
+    #
+    args = [(sys.path, str(f), convert_case, pyx, version_check, memoize, lazy)
+            for f in todo]
+    if nthreads > 1 and len(args) > 1:
+        pool = multiprocessing.Pool(min(nthreads, len(args)))
+        try:
+            pool.map(_compile_schema, args)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for arg in args:
+            _compile_schema(arg)
+    for infile in todo:
+        compiler.record(infile, options)
+    compiler.save_manifest()
     outfiles = [outf.relto(cwd) for outf in outfiles]
     #
-    if compiler.getpyx(pyx):
+    if pyx:
         exts = []
         for f in outfiles:
             ext = Extension('*', [str(f)],
                             include_dirs=compiler.include_dirs)
             exts.append(ext)
-        exts = cythonize(exts)
+        exts = cythonize(exts, nthreads=nthreads if nthreads > 1 else 0)
         return exts
     else:
         return []
+
+def _get_nthreads(nthreads):
+    if nthreads is None:
+        try:
+            nthreads = multiprocessing.cpu_count()
+        except NotImplementedError:
+            nthreads = 1
+    return max(nthreads, 1)
+
+def _compile_schema(args):
+    # this runs in the worker processes, so it must be a module-level
+    # function. Each schema is compiled independently: capnp resolves the
+    # imports by itself, so there is no need to wait for the imported
+    # schemas to be compiled first
+    path, filename, convert_case, pyx, version_check, memoize, lazy = args
+    compiler = DistutilsCompiler(path)
+    outfile = compiler.compile(filename, convert_case, pyx, version_check,
+                               memoize, lazy, force=True)
+    return str(outfile)
@@ -2,6 +2,37 @@ from capnpy import schema
 from capnpy.type import Types
 from capnpy.compiler.fieldtree import FieldTree
 from capnpy import annotate
+from capnpy.util import ensure_unicode
+
+# C types used by the inline reads in pyx mode: the stdint types are cimported
+# by the generated module with an underscore prefix
+CTYPES = {
+    'int8': '_int8_t',
+    'uint8': '_uint8_t',
+    'int16': '_int16_t',
+    'uint16': '_uint16_t',
+    'int32': '_int32_t',
+    'uint32': '_uint32_t',
+    'int64': '_int64_t',
+    'uint64': '_uint64_t',
+    'float32': 'float',
+    'float64': 'double',
+}
+
+# the values which signal an exception in the typed getters: like in
+# segment/base.pxd, we use values which are unlikely to be in the buffer
+CEXCEPT = {
+    'int8': '0x7f',
+    'uint8': '0xff',
+    'int16': '0x7fff',
+    'uint16': '0xffff',
+    'int32': '0x7fffffff',
+    'uint32': '0xffffffff',
+    'int64': '0x7fffffffffffffff',
+    'uint64': '0xffffffffffffffff',
+    'float32': '-1',
+    'float64': '-1',
+}
 
 @schema.Field.__extend__
 class Field:
@@ -13,7 +44,18 @@ class Field:
             ns.ensure_union = 'self._ensure_union(%s)' % self.discriminantValue
         else:
             ns.ensure_union = '# no union check'
-        self._emit(m, ns, name)
+        ns.memoize = node.is_memoized(m)
+        # the void fields annotated with $Py.group are emitted as the group
+        # which replaces them: see request.fake_py_group
+        field = m.get_field_override(node, self)
+        field._emit(m, ns, name)
+
+    def _def_pointer_property(self, m, ns, name, src):
+        # used for the fields which need to allocate a new object
+        if ns.memoize:
+            m.def_memoized_property(ns, name, src)
+        else:
+            m.def_property(ns, name, src)
 
 
 @schema.Field__Slot.__extend__
@@ -51,39 +93,62 @@ class Field__Slot:
                                       self.slot.type.runtime_name(m))
 
     def _emit_void(self, m, ns, name):
-        field = m.field_override.get(self, None)
-        if field:
-            field._emit(m, ns, name)
-        else:
-            m.def_property(ns, name, """
-                {ensure_union}
-                return None
-            """)
+        m.def_property(ns, name, """
+            {ensure_union}
+            return None
+        """)
 
     def _emit_primitive(self, m, ns, name):
+        ns.name = name
         ns.typename = '_Types.%s' % self.slot.type.which()
         ns.default_ = self.slot.defaultValue.as_pyobj()
         ns.ifmt = "ord(%r)" % self.slot.get_fmt()
-        m.def_property(ns, name, """
+        which = str(self.slot.type.which())
+        ns.ctype = CTYPES[which]
+        if m.pyx:
+            ns.read = self._inline_read(ns)
+        else:
+            ns.read = ns.format('self._read_data({offset}, {ifmt})')
+        src = """
             {ensure_union}
-            value = self._read_data({offset}, {ifmt})
+            value = {read}
             if {default_} != 0:
                 value = value ^ {default_}
             return value
-        """)
+        """
+        m.def_property(ns, name, src)
+        # the typed version of the property, which Cython modules can call
+        # without going through the attribute lookup
+        m.def_cpdef(ns, 'get_{name}(self)', src, ns.ctype, CEXCEPT[which])
+
+    def _inline_read(self, ns):
+        # in pyx mode, read the value directly from the buffer: the offset and
+        # the type are known at compile time, and _init_from_buffer already
+        # checked that the data section is inside the buffer, so the only
+        # check we need is the one against _data_size
+        return ns.format('((<const {ctype}*>(self._seg.cbuf + self._data_offset + {offset}))[0] '
+                         'if {offset} < self._data_size*8 else 0)')
 
     def _emit_bool(self, m, ns, name):
+        ns.name = name
         byteoffset, bitoffset = divmod(self.slot.offset, 8)
         ns.offset = byteoffset
         ns.bitmask = 1 << bitoffset
         ns.default_ = self.slot.defaultValue.as_pyobj()
-        m.def_property(ns, name, """
+        if m.pyx:
+            ns.ctype = '_uint8_t'
+            ns.read = '(%s & %d) != 0' % (self._inline_read(ns), ns.bitmask)
+        else:
+            ns.read = ns.format('self._read_bit({offset}, {bitmask})')
+        src = """
             {ensure_union}
-            value = self._read_bit({offset}, {bitmask})
+            value = {read}
             if {default_} != 0:
                 value = value ^ {default_}
             return value
-        """)
+        """
+        m.def_property(ns, name, src)
+        m.def_cpdef(ns, 'get_{name}(self)', src, 'bint', '-1')
 
     def _emit_enum(self, m, ns, name):
         ns.enumcls = self.slot.type.compile_name(m)
@@ -91,9 +156,14 @@ class Field__Slot:
 
         node = self.slot.type.get_node(m)
         ns.newf = '_new_hack' if m.pyx and node.is_imported(m) else '_new'
+        if m.pyx:
+            ns.ctype = '_int16_t'
+            ns.read = self._inline_read(ns)
+        else:
+            ns.read = ns.format('self._read_data_int16({offset})')
         m.def_property(ns, name, """
             {ensure_union}
-            value = self._read_data_int16({offset})
+            value = {read}
             if {default_} != 0:
                 value = (value ^ {default_})
             return {enumcls}.{newf}(value)
@@ -105,12 +175,38 @@ class Field__Slot:
             {ensure_union}
             return self._read_str_text({offset})
         """)
-        ns.ww("""
-            {cpdef} get_{name}(self):
-                return self._read_str_text({offset}, default_=b"")
+        m.def_cpdef(ns, 'get_{name}(self)', """
+            return self._read_str_text({offset}, default_=b"")
         """)
-        ns.w()
-        self._emit_has_method(ns)
+        m.def_cpdef(ns, 'get_{name}_view(self)', """
+            return self._read_str_view({offset}, -1)
+        """)
+        self._emit_has_method(m, ns)
+        self._emit_text_str_maybe(m, ns, name)
+
+    def _emit_text_str_maybe(self, m, ns, name):
+        ann = m.has_annotation(self, annotate.text)
+        if ann is None:
+            return
+        assert ann.annotation.value.is_text()
+        how = ensure_unicode(ann.annotation.value.text.strip())
+        if how == 'intern':
+            src = """
+                {ensure_union}
+                return self._read_str_interned({offset})
+            """
+        else:
+            src = """
+                {ensure_union}
+                return self._read_str_unicode({offset})
+            """
+        if how == 'decode' or how == 'intern':
+            m.def_property(ns, name + '_str', src)
+        elif how == 'cache':
+            m.def_memoized_property(ns, name + '_str', src)
+        else:
+            raise ValueError('Error in $Py.text: expected "decode", "cache" or '
+                             '"intern", got "%s"' % how)
 
     def _emit_data(self, m, ns, name):
         ns.name = name
@@ -118,12 +214,13 @@ class Field__Slot:
             {ensure_union}
             return self._read_str_data({offset})
         """)
-        ns.ww("""
-            {cpdef} get_{name}(self):
-                return self._read_str_data({offset}, default_=b"")
+        m.def_cpdef(ns, 'get_{name}(self)', """
+            return self._read_str_data({offset}, default_=b"")
         """)
-        ns.w()
-        self._emit_has_method(ns)
+        m.def_cpdef(ns, 'get_{name}_view(self)', """
+            return self._read_str_view({offset}, 0)
+        """)
+        self._emit_has_method(m, ns)
 
     def _emit_struct(self, m, ns, name):
         ns.name = name
@@ -139,7 +236,7 @@ class Field__Slot:
             ns.cdef_offset = 'offset'
             ns.cdef_p = 'p'
             ns.cdef_obj = 'obj'
-        m.def_property(ns, name, """
+        self._def_pointer_property(m, ns, name, """
             {ensure_union}
             {cdef_offset} = {offset}
             {cdef_p} = self._read_fast_ptr(offset)
@@ -153,33 +250,29 @@ class Field__Slot:
             obj._init_from_pointer(self._seg, offset, p)
             return obj
         """)
-        ns.ww("""
-            {cpdef} get_{name}(self):
-                res = self.{name}
-                if res is None:
-                    return {structcls}.from_buffer(b'', 0, data_size=0, ptrs_size=0)
-                return res
+        m.def_cpdef(ns, 'get_{name}(self)', """
+            res = self.{name}
+            if res is None:
+                return {structcls}.from_buffer(b'', 0, data_size=0, ptrs_size=0)
+            return res
         """)
-        ns.w()
-        self._emit_has_method(ns)
+        self._emit_has_method(m, ns)
 
     def _emit_list(self, m, ns, name):
         ns.name = name
         t = self.slot.type.list.elementType
         ns.list_item_type = t.list_item_type(m)
-        m.def_property(ns, name, """
+        self._def_pointer_property(m, ns, name, """
             {ensure_union}
             return self._read_list({offset}, {list_item_type})
         """)
-        ns.ww("""
-            {cpdef} get_{name}(self):
-                res = self.{name}
-                if res is None:
-                    return _List.from_buffer(b'', 0, 0, 0, {list_item_type})
-                return res
+        m.def_cpdef(ns, 'get_{name}(self)', """
+            res = self.{name}
+            if res is None:
+                return _List.from_buffer(b'', 0, 0, 0, {list_item_type})
+            return res
         """)
-        ns.w()
-        self._emit_has_method(ns)
+        self._emit_has_method(m, ns)
 
     def _emit_anyPointer(self, m, ns, name):
         ns.name = name
@@ -189,15 +282,13 @@ class Field__Slot:
                 return None
             raise ValueError("Cannot get fields of type AnyPointer")
         """)
-        self._emit_has_method(ns)
+        self._emit_has_method(m, ns)
 
-    def _emit_has_method(self, ns):
-        ns.ww("""
-            {cpdef} has_{name}(self):
-                ptr = self._read_fast_ptr({offset})
-                return ptr != 0
+    def _emit_has_method(self, m, ns):
+        m.def_cpdef(ns, 'has_{name}(self)', """
+            ptr = self._read_fast_ptr({offset})
+            return ptr != 0
         """)
-        ns.w()
 
 
 @schema.Field__Group.__extend__
@@ -219,7 +310,7 @@ class Field__Group:
             """)
             name = ns.privname
         #
-        m.def_property(ns, name, """
+        self._def_pointer_property(m, ns, name, """
             {ensure_union}
             obj = {groupcls}.__new__({groupcls})
             _Struct._init_from_buffer(obj, self._seg, self._data_offset,
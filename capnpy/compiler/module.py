@@ -2,9 +2,11 @@ from __future__ import print_function
 import py
 import keyword
 from collections import defaultdict
+from contextlib import contextmanager
 from pypytools.codegen import Code
 from six import PY3
 
+from capnpy import schema
 from capnpy.util import ensure_unicode
 from capnpy.convert_case import from_camel_case
 
@@ -18,38 +20,69 @@ import capnpy.compiler.misc
 
 class ModuleGenerator(object):
 
-    def __init__(self, request, convert_case, pyx, version_check, standalone):
+    def __init__(self, request, convert_case, pyx, version_check, standalone,
+                 memoize=False, lazy=False):
         self.code = Code(pyx=pyx)
         self.request = request
         self.convert_case = convert_case
         self.pyx = pyx
         self.version_check = version_check
         self.standalone = standalone
+        self.memoize = memoize
+        # lazy definitions are supported only in py mode: in pyx mode the
+        # classes are compiled to C anyway
+        self.lazy = lazy and not pyx
         self.allnodes = {} # id -> node
         self.children = defaultdict(list) # nodeId -> nested nodes
         self.importnames = {} # filename -> import name
-        self.extra_annotations = defaultdict(list) # obj -> [ann]
-        self.field_override = {} # obj -> obj
+        self.used_importnames = set()
+        self.node_annotations = {} # node id -> {annotation id: annotation}
+        self.field_override = {} # (struct id, field) -> field
+        self.memo_slots = [] # memo slots of the struct being emitted
+        #
+        # the declarations which go in the .pxd in pyx mode: they are
+        # recorded while emitting the code, see generate_pxd
+        self.cdef_classes = [] # [(class name, base class name)]
+        self.cdef_attrs = {} # class name -> [C attributes]
+        self.cdef_methods = defaultdict(list) # class name -> [C methods]
+        self.cdef_globals = [] # [C global variables]
+        self.current_class = None # the class being emitted
 
-    def register_extra_annotation(self, obj, ann):
-        self.extra_annotations[obj].append(ann.annotation)
+    def register_extra_annotation(self, node, ann):
+        # the extra annotations take precedence over the ones in the schema
+        self._get_annotations(node)[ann.annotation.id] = ann.annotation
 
-    def register_field_override(self, origin, target):
-        self.field_override[origin] = target
+    def register_field_override(self, node_id, origin, target):
+        # fields are identified by (name, codeOrder), which is unique only
+        # inside their struct: hence, we also need the id of the struct
+        self.field_override[node_id, origin] = target
+
+    def get_field_override(self, node, field):
+        return self.field_override.get((node.id, field), field)
 
     def has_annotation(self, obj, anncls):
-        annotations = self.extra_annotations.get(obj, [])
-        if obj.annotations is not None:
-            annotations += obj.annotations
-        for ann in annotations:
-            if ann.id == anncls.__id__:
-                # XXX: probably "annotation" should be taken by the
-                # constructor
-                res = anncls()
-                res.annotation = ann
-                res.target = obj
-                return res
-        return None
+        ann = self._get_annotations(obj).get(anncls.__id__)
+        if ann is None:
+            return None
+        # XXX: probably "annotation" should be taken by the constructor
+        res = anncls()
+        res.annotation = ann
+        res.target = obj
+        return res
+
+    def _get_annotations(self, obj):
+        """
+        Return a dict {annotation id: annotation} for the given node or field.
+        The dicts of the nodes are computed only once and stored in
+        self.node_annotations, which also contains the extra annotations.
+        """
+        if not isinstance(obj, schema.Node):
+            return _index_annotations(obj)
+        try:
+            return self.node_annotations[obj.id]
+        except KeyError:
+            res = self.node_annotations[obj.id] = _index_annotations(obj)
+            return res
 
     def w(self, *args, **kwargs):
         self.code.w(*args, **kwargs)
@@ -57,20 +90,108 @@ class ModuleGenerator(object):
     def block(self, *args, **kwargs):
         return self.code.block(*args, **kwargs)
 
+    @contextmanager
+    def capture(self):
+        """
+        Redirect the emitted code to a new Code object, which is returned by
+        the context manager: this is used to emit the lazy definitions.
+        """
+        code = Code(pyx=self.pyx)
+        code.global_scope.__dict__.update(self.code.global_scope.__dict__)
+        saved = self.code
+        self.code = code
+        try:
+            yield code
+        finally:
+            self.code = saved
+
     def register_import(self, fname):
         name = py.path.local(fname).purebasename
         name = name.replace('+', 'PLUS')
         name = '_%s_capnp' % name
-        if name in self.importnames.values():
+        if name in self.used_importnames:
             # avoid name clashes
-            name = '%s_%s' % (name, len(self.filenames))
+            name = '%s_%s' % (name, len(self.importnames))
         self.importnames[fname] = name
+        self.used_importnames.add(name)
         return name
 
     def generate(self):
         self.request.emit(self)
         return self.code.build()
 
+    def generate_pxd(self):
+        """
+        Return the source of a .pxd which declares the cdef classes of the
+        module together with their C attributes and cdef/cpdef methods, and
+        the list item types: other Cython modules can cimport them to call the
+        methods directly.
+
+        It must be called after generate(): the declarations are recorded by
+        declare_class, declare_method and declare_global while emitting the
+        corresponding definitions.
+        """
+        assert self.pyx and self.standalone
+        out = Code()
+        out.w("# THIS FILE HAS BEEN GENERATED AUTOMATICALLY BY capnpy")
+        out.w("# do not edit by hand")
+        out.w()
+        out.w("from capnpy.struct_ cimport Struct as _Struct")
+        out.w("from capnpy.enum cimport BaseEnum as _BaseEnum")
+        out.w("from capnpy.segment.builder cimport SegmentBuilder as _SegmentBuilder")
+        out.w("from capnpy.list cimport StructItemType as _StructItemType")
+        out.w("from libc.stdint cimport (int8_t as _int8_t, uint8_t as _uint8_t,")
+        out.w("                          int16_t as _int16_t, uint16_t as _uint16_t,")
+        out.w("                          int32_t as _int32_t, uint32_t as _uint32_t,")
+        out.w("                          int64_t as _int64_t, uint64_t as _uint64_t)")
+        for classname, base in self.cdef_classes:
+            out.w()
+            with out.block('cdef class {classname}({base}):',
+                           classname=classname, base=base):
+                for attr in self.cdef_attrs.get(classname, []):
+                    out.w(attr)
+                for decl in self.cdef_methods[classname]:
+                    out.w(decl)
+        out.w()
+        for decl in self.cdef_globals:
+            out.w(decl)
+        return out.build()
+
+    def declare_class(self, name, base):
+        """
+        Record a cdef class for the .pxd: the methods declared by
+        declare_method belong to it, until the next call
+        """
+        if self.pyx:
+            self.cdef_classes.append((name, base))
+        self.current_class = name
+
+    def declare_method(self, decl, static=False):
+        """
+        Record the declaration of a cdef/cpdef method of the current class
+        for the .pxd. The default values of the parameters must be written as
+        ``*``.
+        """
+        if not self.pyx:
+            return
+        methods = self.cdef_methods[self.current_class]
+        if static:
+            methods.append('@staticmethod')
+        methods.append(decl)
+
+    def declare_global(self, decl):
+        if self.pyx:
+            self.cdef_globals.append(decl)
+
+    def pxd_params(self, varnames):
+        """
+        Like code.params, but the default values are replaced by ``*``, as
+        required by the declarations in a .pxd
+        """
+        varnames = [(v[0], '*') if isinstance(v, tuple) else v
+                    for v in varnames]
+        return self.code.params(varnames)
+
     def _dump_node(self, node):
         def visit(node, deep=0):
             print('%s%s: %s' % (' ' * deep, node.which(), node.displayName))
@@ -106,6 +227,7 @@ class ModuleGenerator(object):
                        for i in range(len(items))]
         ns.prebuilt = ', '.join(ns.prebuilt)
         ns.prebuilt = ns.format('({prebuilt},)')
+        self.declare_class(compile_name, '_BaseEnum')
         with ns.block("{cdef class} {name}(_BaseEnum):"):
             ns.w("__members__ = {members}")
             #
@@ -113,6 +235,7 @@ class ModuleGenerator(object):
             if self.pyx:
                 # on CPython, make a tuple of prebuilt instances for the
                 # statically known values
+                self.declare_method('cdef _new(long x, __prebuilt=*)', static=True)
                 ns.w("@staticmethod")
                 with ns.block('cdef _new(long x, __prebuilt={prebuilt}):') as ns:
                     ns.ww("""
@@ -149,3 +272,54 @@ class ModuleGenerator(object):
             with ns.block('def {name}(self):', name=name):
                 ns.ww(src)
         ns.w()
+
+    def def_cpdef(self, ns, sig, src, ctype=None, except_=None):
+        """
+        Emit a method which is cpdef in pyx mode and def in py mode, and
+        declare it in the .pxd. In pyx mode, ``ctype`` is the C type of the
+        result and ``except_`` the value which signals an exception.
+        """
+        sig = ns.format(sig)
+        if self.pyx:
+            ns.decl = 'cpdef %s' % sig
+            if ctype is not None:
+                ns.decl = 'cpdef %s %s' % (ctype, sig)
+            if except_ is not None:
+                ns.decl += ' except? %s' % except_
+            self.declare_method(ns.decl)
+        else:
+            ns.decl = 'def %s' % sig
+        with ns.block('{decl}:'):
+            ns.ww(src)
+        ns.w()
+
+    def def_memoized_property(self, ns, name, src):
+        """
+        Like def_property, but the result is computed by _uncached_{name} and
+        stored in the _memo_{name} slot: the next accesses return it
+        directly. None results (i.e., null pointers) are not cached, because
+        None is also the initial value of the slot.
+        """
+        ns.memo = '_memo_' + name
+        ns.read = '_uncached_' + name
+        self.memo_slots.append(ns.memo)
+        if self.pyx and self.standalone:
+            pass # C attributes go in the .pxd, see generate_pxd
+        elif self.pyx:
+            ns.w('cdef object {memo}')
+        else:
+            ns.w('{memo} = None')
+        self.def_cpdef(ns, '{read}(self)', src)
+        self.def_property(ns, name, """
+            obj = self.{memo}
+            if obj is None:
+                obj = self.{read}()
+                self.{memo} = obj
+            return obj
+        """)
+
+
+def _index_annotations(obj):
+    if obj.annotations is None:
+        return {}
+    return dict((ann.id, ann) for ann in obj.annotations)
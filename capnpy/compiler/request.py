@@ -1,4 +1,5 @@
 import py
+import re
 from datetime import datetime
 from six import PY3
 import capnpy
@@ -36,7 +37,7 @@ def fake_py_group(m, parent_id, ann):
 
     # Fake field
     field_group = schema.Field__Group.from_group_annotation(node_id, field_void)
-    m.register_field_override(field_void, field_group)
+    m.register_field_override(parent_id, field_void, field_group)
     return field_group
 
 @schema.CodeGeneratorRequest.__extend__
@@ -106,9 +107,19 @@ class RequestedFile:
         m.w("from capnpy.util import float64_repr as _float64_repr")
         m.w("from capnpy.util import extend_module_maybe as _extend_module_maybe")
         m.w("from capnpy.util import check_version as _check_version")
+        if m.lazy:
+            m.w("from capnpy.util import LazyDefinitions as _LazyDefinitions")
+        m.w("from capnpy import sortkey as _sortkey")
+        m.w("import struct as _struct")
         #
         if m.pyx:
+            m.w("from libc.stdint cimport (int8_t as _int8_t, uint8_t as _uint8_t,")
+            m.w("                          int16_t as _int16_t, uint16_t as _uint16_t,")
+            m.w("                          int32_t as _int32_t, uint32_t as _uint32_t,")
+            m.w("                          int64_t as _int64_t, uint64_t as _uint64_t)")
+            m.w("from libc.string cimport memset as _memset")
             m.w("from capnpy cimport _hash")
+            m.w("from cpython.object cimport PyObject_RichCompare as _PyObject_RichCompare")
             for t in Types.__all__:
                 name = '%s_list_item_type' % t.name
                 m.w("from capnpy.list {cimport} {name} as _{name}", name=name)
@@ -128,24 +139,73 @@ class RequestedFile:
         # visit the children in two passes: first the declaration, then the
         # definition
         children = m.children[filenode.id]
-        m.w("#### FORWARD DECLARATIONS ####")
-        m.w()
-        for child in children:
-            child.emit_declaration(m)
-        m.w()
-        m.w("#### DEFINITIONS ####")
-        m.w()
-        for child in children:
-            child.emit_definition(m)
+        if m.lazy:
+            self._emit_lazy_definitions(m, children)
+        else:
+            m.w("#### FORWARD DECLARATIONS ####")
+            m.w()
+            for child in children:
+                child.emit_declaration(m)
+            m.w()
+            m.w("#### DEFINITIONS ####")
+            m.w()
+            for child in children:
+                child.emit_definition(m)
         #
         for child in children:
             child.emit_reference_as_child(m)
         #
         m.w()
+        lazy = ', lazy=_lazy' if m.lazy else ''
         if m.standalone:
-            m.w('_extend_module_maybe(globals(), modname=__name__)')
+            m.w('_extend_module_maybe(globals(), modname=__name__{lazy})', lazy=lazy)
         else:
-            m.w('_extend_module_maybe(globals(), filename=__schema__)')
+            m.w('_extend_module_maybe(globals(), filename=__schema__{lazy})', lazy=lazy)
+
+    def _emit_lazy_definitions(self, m, children):
+        # in lazy mode, the forward declaration and the definition of each
+        # top-level node are not executed at import time: their source is
+        # stored in a LazyDefinitions, which executes it the first time one
+        # of the names it defines is looked up. Each entry also records the
+        # other entries it references, which must be executed before it
+        decls = []
+        for child in children:
+            with m.capture() as code:
+                child.emit_declaration(m)
+            decls.append(code.build())
+        entries = []
+        for child, decl in zip(children, decls):
+            with m.capture() as code:
+                child.emit_definition(m)
+            src = '%s\n%s' % (decl, code.build())
+            names = []
+            for match in _GLOBAL_NAME.finditer(src):
+                name = match.group(1) or match.group(2)
+                if name not in names:
+                    names.append(name)
+            if names:
+                entries.append((names, src.strip() + '\n'))
+        index = {}
+        for i, (names, src) in enumerate(entries):
+            for name in names:
+                index[name] = i
+        #
+        m.w("#### LAZY DEFINITIONS ####")
+        m.w()
+        m.w("_lazy = _LazyDefinitions(globals(), [")
+        for i, (names, src) in enumerate(entries):
+            deps = set(index[name] for name in _IDENTIFIER.findall(src)
+                       if name in index)
+            deps.discard(i)
+            m.w("    ({names!r}, {deps!r},", names=tuple(names),
+                deps=tuple(sorted(deps)))
+            for line in src.splitlines(True):
+                m.w("     {line!r}", line=line)
+            m.w("    ),")
+        m.w("])")
+        m.w("__getattr__ = _lazy.getattr")
+        m.w("__dir__ = _lazy.dir")
+        m.w()
 
     def _declare_imports(self, m):
         for imp in self.imports:
@@ -170,3 +230,9 @@ class RequestedFile:
             else:
                 ns.pyx = m.pyx
                 ns.w('{importname} = __compiler.load_schema(importname="{fullpath}", pyx={pyx})')
+
+
+# the global names defined by the source of a lazy definition, and all the
+# identifiers it uses
+_GLOBAL_NAME = re.compile(r'^(?:class\s+(\w+)|(\w+)\s*=)', re.MULTILINE)
+_IDENTIFIER = re.compile(r'\b[A-Za-z_]\w*\b')
@@ -26,7 +26,7 @@ class Node__Struct:
             if ann:
                 if field.is_void():
                     # Register the fake node_group.
-                    field = m.field_override[field]
+                    field = m.get_field_override(self, field)
                 assert field.is_group()
                 group_node = m.allnodes[field.group.typeId]
                 m.register_extra_annotation(group_node, ann)
@@ -59,10 +59,13 @@ class Node__Struct:
             # forward-declared the class, not defined it
             ns.w("@{name}.__extend__")
         #
+        ns.field_layout = self._get_field_layout(m)
+        m.declare_class(ns.name, '_Struct')
         with ns.block("{cdef class} {name}(_Struct):"):
             ns.ww("""
                 __static_data_size__ = {data_size}
                 __static_ptrs_size__ = {ptrs_size}
+                __field_layout__ = {field_layout!r}
 
             """)
             for child in m.children[self.id]:
@@ -70,24 +73,92 @@ class Node__Struct:
             m.w()
             if self.struct.discriminantCount:
                 self._emit_union_tag(m)
+            m.memo_slots = []
+            ctor = None
             if self.struct.fields is not None:
                 for field in self.struct.fields:
                     field.emit(m, self)
-                self._emit_ctors(m)
+                ctor = self._emit_ctors(m)
+            if m.pyx:
+                m.cdef_attrs[ns.name] = ['cdef object %s' % memo
+                                         for memo in m.memo_slots]
+            self._emit_reset_memo(m)
             self._emit_repr(m)
             self._emit_key_maybe(m)
         ns.w()
+        if ctor is not None and ctor.is_flat() and not m.pyx:
+            ns.w("{packer} = _struct.Struct({fmt!r})", packer=ctor.packer,
+                 fmt=ctor.get_pack_fmt())
         if m.pyx:
+            m.declare_global(ns.format("cdef _StructItemType _{name}_list_item_type"))
             ns.w("cdef _StructItemType _{name}_list_item_type = _StructItemType({name})")
         else:
             ns.w("_{name}_list_item_type = _StructItemType({name})")
         ns.w()
 
+    def _emit_reset_memo(self, m):
+        # the memoized values must be discarded whenever the object is
+        # rebound to another buffer, e.g. by List.cursor()
+        if not m.memo_slots:
+            return
+        ns = m.code.new_scope()
+        if m.pyx:
+            ns.sig = ('cpdef _init_from_buffer(self, object buf, long offset, '
+                      'long data_size, long ptrs_size)')
+            m.declare_method(ns.sig)
+        else:
+            ns.sig = 'def _init_from_buffer(self, buf, offset, data_size, ptrs_size)'
+        with ns.block('{sig}:'):
+            for memo in m.memo_slots:
+                ns.w('self.{memo} = None', memo=memo)
+            ns.w('_Struct._init_from_buffer(self, buf, offset, data_size, ptrs_size)')
+        ns.w()
+
+    def is_memoized(self, m):
+        if m.memoize or m.has_annotation(self, annotate.memoize):
+            return True
+        if self.struct.isGroup:
+            # groups inherit the setting of their parent
+            parent = m.allnodes.get(self.scopeId)
+            return parent is not None and parent.is_memoized(m)
+        return False
+
     def emit_reference_as_child(self, m):
         if self.is_nested(m) and not self.struct.isGroup:
             m.w('{shortname} = {name}', shortname=self.shortname(m),
                 name=self.compile_name(m))
 
+    def _get_field_layout(self, m):
+        # (name, kind, offset, arg, union_tag, default) of all the fields: see
+        # Struct.__field_layout__ for the meaning of the columns
+        res = []
+        for f in self.struct.fields or []:
+            if f.is_void():
+                continue
+            name = m._field_name(f)
+            union_tag = f.discriminantValue if f.is_part_of_union() else -1
+            if f.is_group():
+                res.append((name, 'group', 0, None, union_tag, None))
+                continue
+            default_ = None
+            if f.slot.hadExplicitDefault:
+                default_ = f.slot.defaultValue.as_pyobj()
+            if f.is_bool():
+                byteoffset, bitoffset = divmod(f.slot.offset, 8)
+                res.append((name, 'bool', byteoffset, bitoffset, union_tag, default_))
+            elif f.is_pointer():
+                kind = 'ptr'
+                if f.is_text():
+                    kind = 'text'
+                elif f.is_data():
+                    kind = 'data'
+                res.append((name, kind, f.slot.offset * 8, None, union_tag, None))
+            else:
+                offset = f.slot.offset * f.slot.get_size()
+                fmt = ensure_unicode(f.slot.get_fmt())
+                res.append((name, 'primitive', offset, fmt, union_tag, default_))
+        return tuple(res)
+
     def _get_enum_items(self, m):
         if self.struct.discriminantCount == 0:
             return []
@@ -120,6 +191,8 @@ class Node__Struct:
             # do not not need to do a lookup for __tag_offset__. Not needed on
             # PyPy because the default implementations defined in struct_.py
             # are already fast
+            m.declare_method('cpdef long __which__(self) except -1')
+            m.declare_method('cpdef which(self)')
             ns.ww("""
                 cpdef long __which__(self) except -1:
                     return self._read_data_int16({tag_offset})
@@ -143,11 +216,12 @@ class Node__Struct:
         ns = m.code.new_scope()
         ns.data_size = self.struct.dataWordCount
         ns.ptrs_size = self.struct.pointerCount
-        self._emit_init(m, ns)
+        ctor = self._emit_init(m, ns)
         self._emit_ctors_union(m, ns)
+        return ctor
 
     def _emit_init(self, m, ns):
-        ctor = Structor(m, self.struct, self.struct.fields)
+        ctor = Structor(m, self.struct, self.struct.fields, self.compile_name(m))
         ctor.emit()
         ns.w()
         with ns.def_('__init__', ['self'] + ctor.params):
@@ -156,16 +230,25 @@ class Node__Struct:
             ns.w('_buf = {call}', call=call)
             ns.w('self._init_from_buffer(_buf, 0, {data_size}, {ptrs_size})')
         ns.w()
+        return ctor
 
     def _emit_ctors_union(self, m, ns):
-        for f in self.struct.fields:
-            if f.is_part_of_union():
-                tag_field = f
-                fields = [f for f in self.struct.fields
-                          if not f.is_part_of_union() or f == tag_field]
-                self._emit_one_ctor_union(m, ns, fields, tag_field)
-
-    def _emit_one_ctor_union(self, m, ns, fields, tag_field):
+        # each member of the union gets its own ctor: decode the fields only
+        # once, and split them by index instead of comparing them
+        allfields = list(self.struct.fields)
+        in_union = [f.is_part_of_union() for f in allfields]
+        for i, tag_field in enumerate(allfields):
+            if in_union[i]:
+                fields = []
+                others = []
+                for j, f in enumerate(allfields):
+                    if not in_union[j] or j == i:
+                        fields.append(f)
+                    else:
+                        others.append(f)
+                self._emit_one_ctor_union(m, ns, fields, others, tag_field)
+
+    def _emit_one_ctor_union(self, m, ns, fields, others, tag_field):
         ## def new_foo(cls, x=0, y=0):
         ##     buf = MyStruct.__new(x=x, y=y, foo=None)
         ##     return cls.from_buffer(buf, 0, ..., ...)
@@ -180,9 +263,8 @@ class Node__Struct:
         # apparently, Cython complains if I don't pass a value for all the
         # parameters, even if they have a default value; thus, we explicitly
         # pass a value for all fields which are not explicitly listed
-        for f in self.struct.fields:
-            if f not in fields:
-                argnames.append((m._field_name(f), '_undefined'))
+        for f in others:
+            argnames.append((m._field_name(f), '_undefined'))
         #
         ns.w('@classmethod')
         with ns.def_(name, ['cls'] + params):
@@ -199,6 +281,7 @@ class Node__Struct:
         #     parts.append("y = %s" % self.y)
         #     return "(%s)" % ", ".join(parts)
         #
+        m.declare_method('cpdef shortrepr(self)')
         with m.block('{cpdef} shortrepr(self):') as ns:
             fields = self.struct.fields or []
             ns.w('parts = []')
@@ -282,53 +365,252 @@ class Node__Struct:
                 return ({key},)
         """) # the trailing comma is to ensure a tuple even if there is a single field
         #
+        self._emit_sort_key(m, fieldnames)
         if m.pyx:
             self._emit_fash_hash(m, fieldnames)
+            self._emit_fast_equals(m, fieldnames)
+            self._emit_fast_order(m, fieldnames)
+            self._emit_richcmp(m)
 
     def _emit_fash_hash(self, m, fieldnames):
-        # emit a specialized, fast __hash__.
+        # emit a specialized, fast __hash__. _key_hash is a cdef method, so
+        # that it can be called directly by the structs which use this one
+        # as part of their key
         fields = dict([(ensure_unicode(f.name), f) for f in self.struct.fields])
         m.w()
-        with m.code.block('def __hash__(self):') as ns:
+        m.declare_method('cdef long _key_hash(self) except? -1')
+        with m.code.block('cdef long _key_hash(self) except? -1:') as ns:
             ns.n = len(fieldnames)
             ns.w('cdef long h[{n}]')
+            if any(self._nested_key_node(m, fields[fname]) is not None
+                   for fname in fieldnames):
+                ns.w('cdef object obj')
             # compute the hash of each field
             for ns.i, fname in enumerate(fieldnames):
                 f = fields[fname]
                 ns.fname = m._convert_name(fname)
-                if f.is_text():
+                keynode = self._nested_key_node(m, f)
+                if keynode is not None:
                     ns.offset = f.slot.offset * f.slot.get_size()
-                    ns.w('h[{i}] = self._hash_str_text({offset})')
+                    ns.structcls = keynode.compile_name(m)
+                    ns.ww("""
+                        obj = self._read_struct({offset}, {structcls})
+                        h[{i}] = hash(None) if obj is None else (<{structcls}>obj)._key_hash()
+                    """)
                 else:
-                    ns.hash = self._fasthash_for_field(f)
-                    ns.w('h[{i}] = {hash}(self.{fname})')
+                    ns.hash = ns.format(self._fasthash_for_field(f))
+                    ns.w('h[{i}] = {hash}')
             #
             # compute the hash of the whole tuple
             ns.w('return _hash.tuplehash(h, {n})')
-        #
+        ns.w()
+        ns.ww("""
+            def __hash__(self):
+                return self._key_hash()
+        """)
+
+    def _emit_fast_equals(self, m, fieldnames):
+        # emit a specialized equality which compares the key fields one by
+        # one, directly on the buffers: this way we avoid to build the two
+        # _key() tuples, which is what the default _equals does
+        fields = dict([(ensure_unicode(f.name), f) for f in self.struct.fields])
+        m.w()
+        ns = m.code.new_scope()
+        ns.name = self.compile_name(m)
+        ns.sig = ns.format('cdef bint _key_equals(self, {name} other) except -1')
+        m.declare_method(ns.sig)
+        with ns.block('{sig}:'):
+            for fname in fieldnames:
+                f = fields[fname]
+                ns.fname = m._convert_name(fname)
+                cond = self._fastequals_for_field(f)
+                if cond is None:
+                    continue
+                ns.cond = ns.format(cond)
+                ns.w('if not {cond}: return False')
+            ns.w('return True')
+
+    def _emit_fast_order(self, m, fieldnames):
+        # emit a specialized ordering, with the same semantics as comparing
+        # the _key() tuples: the result is decided by the first field which
+        # differs. Integers and strings are compared directly on the
+        # buffers, the other fields through their value
+        fields = dict([(ensure_unicode(f.name), f) for f in self.struct.fields])
+        m.w()
+        ns = m.code.new_scope()
+        ns.name = self.compile_name(m)
+        ns.sig = ns.format('cdef object _key_order(self, {name} other, int op)')
+        m.declare_method(ns.sig)
+        with ns.block('{sig}:'):
+            ns.w('cdef int c')
+            ns.w('cdef object a, b')
+            for fname in fieldnames:
+                f = fields[fname]
+                if f.is_slot() and f.slot.type.is_void():
+                    continue
+                ns.fname = m._convert_name(fname)
+                cmp = self._fastcmp_for_field(f)
+                if cmp is None:
+                    ns.ww("""
+                        a = self.{fname}
+                        b = other.{fname}
+                        if not (a == b): return _PyObject_RichCompare(a, b, op)
+                    """)
+                else:
+                    ns.cmp = cmp
+                    ns.ww("""
+                        c = {cmp}
+                        if c != 0: return (c < 0) == (op <= 1)
+                    """)
+            # all the fields are equal: only <= and >= are true
+            ns.w('return op == 1 or op == 5')
+
+    def _emit_richcmp(self, m):
         # XXX this is a hack/workaround for what it looks like a Cython bug:
         # apparently, we need to redefine __richcmp__ together with __hash__,
         # else the base one is not going to be called.  Moreover, for no good
         # reason "self" is typed as PyObject* instead of being given the
         # precise type, so we cast to Struct_ to force early binding
+        ns = m.code.new_scope()
+        ns.name = self.compile_name(m)
         ns.w()
         ns.ww("""
             def __richcmp__(self, other, op):
+                if type(self) is type(other):
+                    if op == 2 or op == 3:
+                        return (<{name}>self)._key_equals(<{name}>other) == (op == 2)
+                    return (<{name}>self)._key_order(<{name}>other, op)
                 return (<_Struct>self)._richcmp(other, op)
         """)
 
+    def _fastcmp_for_field(self, f):
+        # return the expression which does a three-way comparison of the
+        # field f of self and other, or None if there is no fast way
+        if not f.is_slot() or f.is_part_of_union():
+            return None
+        if f.slot.hadExplicitDefault:
+            # the raw bytes are XORed with the default value, so comparing
+            # them does not give the ordering of the actual values
+            return None
+        t = f.slot.type
+        offset = f.slot.offset * f.slot.get_size()
+        if (t.is_primitive() and not t.is_float32() and not t.is_float64()
+            or t.is_enum()):
+            return 'self._data_cmp(other, %d, %d)' % (offset,
+                                                      ord(f.slot.get_fmt()))
+        elif t.is_text():
+            return 'self._str_cmp(other, %d, -1)' % offset
+        elif t.is_data():
+            return 'self._str_cmp(other, %d, 0)' % offset
+        return None
+
+    def _emit_sort_key(self, m, fieldnames):
+        # sort_key is emitted only if we know how to encode all the fields,
+        # else we inherit the one which raises from Struct
+        fields = dict([(ensure_unicode(f.name), f) for f in self.struct.fields])
+        parts = []
+        for fname in fieldnames:
+            f = fields[fname]
+            if f.is_slot() and f.slot.type.is_void():
+                continue
+            part = self._sortkey_for_field(f)
+            if part is None:
+                return
+            parts.append(part % m._convert_name(fname))
+        #
+        ns = m.code.new_scope()
+        ns.parts = ', '.join(parts)
+        ns.w()
+        ns.ww("""
+            def sort_key(self):
+                return b''.join([{parts}])
+        """)
+
+    def _sortkey_for_field(self, f):
+        if not f.is_slot():
+            return None
+        t = f.slot.type
+        if t.is_bool():
+            return '_sortkey.encode_bool(self.%s)'
+        elif t.is_float32() or t.is_float64():
+            return "_sortkey.encode_float(self.%%s, '%s')" % ensure_unicode(f.slot.get_fmt())
+        elif t.is_primitive() or t.is_enum():
+            return "_sortkey.encode_int(self.%%s, '%s')" % ensure_unicode(f.slot.get_fmt())
+        elif t.is_text() or t.is_data():
+            return '_sortkey.encode_bytes(self.%s)'
+        elif t.is_struct():
+            return '_sortkey.encode_struct(self.%s)'
+        return None
+
+    def _fastequals_for_field(self, f):
+        # return the expression which compares the field f of self and
+        # other, or None if the field is always equal
+        if not f.is_slot() or f.is_part_of_union():
+            # union fields might raise if they are not set: compare them
+            # through the normal attribute, to preserve the semantics
+            return '(self.{fname} == other.{fname})'
+        t = f.slot.type
+        if t.is_void():
+            return None
+        offset = f.slot.offset * f.slot.get_size()
+        if t.is_primitive() or t.is_enum():
+            return 'self._data_equals(other, %d, %d)' % (offset,
+                                                         ord(f.slot.get_fmt()))
+        elif t.is_bool():
+            byteoffset, bitoffset = divmod(f.slot.offset, 8)
+            return 'self._bit_equals(other, %d, %d)' % (byteoffset,
+                                                        1 << bitoffset)
+        elif t.is_text():
+            return 'self._str_equals(other, %d, -1)' % offset
+        elif t.is_data():
+            return 'self._str_equals(other, %d, 0)' % offset
+        else:
+            return '(self.{fname} == other.{fname})'
+
     def _fasthash_for_field(self, f):
+        # return an expression which computes the hash of the field without
+        # allocating the corresponding Python object, when possible
         if not f.is_slot():
-            return 'hash'
+            return 'hash(self.{fname})'
         t = f.slot.type
         w = t.which()
+        offset = f.slot.offset * f.slot.get_size()
         if schema.Type.__tag__.int8 <= w <= schema.Type.__tag__.uint32:
             # this can be assimilated to a Python <int>
-            return '_hash.inthash'
+            return '_hash.inthash(self.{fname})'
         elif t.is_uint64():
             # this can be assimilated to a Python <long>
-            return '_hash.longhash'
+            return '_hash.longhash(self.{fname})'
+        elif t.is_bool():
+            # hash(True) == 1, hash(False) == 0
+            return '_hash.inthash(self.{fname})'
+        elif t.is_text():
+            return 'self._hash_str_text(%d)' % offset
+        elif f.is_part_of_union():
+            # the fields below are read directly from the buffer, so we
+            # would skip the union check
+            return 'hash(self.{fname})'
+        elif t.is_float64() and not f.slot.hadExplicitDefault:
+            return '_hash.floathash(self._read_data_float64(%d))' % offset
+        elif t.is_float32() and not f.slot.hadExplicitDefault:
+            return '_hash.floathash(self._read_data_float32(%d))' % offset
+        elif t.is_enum():
+            # enums are ints, so we can hash the raw value
+            default_ = f.slot.defaultValue.as_pyobj()
+            return '_hash.inthash(self._read_data_int16(%d) ^ %d)' % (offset,
+                                                                      default_)
+        elif t.is_data():
+            return 'self._hash_str_data(%d)' % offset
         else:
             # no fast hash, use the "slow" one
-            return 'hash'
+            return 'hash(self.{fname})'
 
+    def _nested_key_node(self, m, f):
+        # if f is a struct field whose type has a fast _key_hash, return the
+        # node of the type
+        if not f.is_slot() or f.is_part_of_union() or not f.slot.type.is_struct():
+            return None
+        node = f.slot.type.get_node(m)
+        if node.is_imported(m) or m.has_annotation(node, annotate.key) is None:
+            return None
+        return node
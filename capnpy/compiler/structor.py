@@ -6,6 +6,8 @@ import struct
 from capnpy.type import Types
 from capnpy.schema import Field, Type, Value
 from capnpy.compiler.fieldtree import FieldTree, Node
+from capnpy.compiler.field import CTYPES
+from capnpy.util import ensure_unicode
 
 class Structor(object):
     """
@@ -16,13 +18,74 @@ class Structor(object):
       - params: [(argname, default)], for each argname in argnames
     """
 
-    def __init__(self, m, struct, fields):
+    def __init__(self, m, struct, fields, clsname):
         self.m = m
         self.struct = struct
+        self.clsname = clsname
         self.data_size = struct.dataWordCount
         self.ptrs_size = struct.pointerCount
         self.fieldtree = FieldTree(m, self.struct)
         self.argnames, self.params = self.fieldtree.get_args_and_params()
+        # name of the global struct.Struct used by the flat ctor in py mode
+        self.packer = '_%s_struct' % clsname
+
+    def is_flat(self):
+        """
+        Return True if the struct contains only primitive, enum and bool
+        fields: in this case, the whole data section can be written in one
+        shot, without going through a SegmentBuilder
+        """
+        if self.ptrs_size != 0 or self.data_size == 0:
+            return False
+        if list(self.fieldtree.all_unions()):
+            return False
+        for node in self.fieldtree.children:
+            f = node.f
+            if f.is_group() or f.is_part_of_union():
+                return False
+            if not (f.is_primitive() or f.is_enum() or f.is_bool()):
+                return False
+        return True
+
+    def get_flat_layout(self):
+        """
+        Return a list of (offset, fmt, expr) describing how to fill the data
+        section of a flat struct, sorted by offset. Bools which share the same
+        byte are combined into a single uint8 expression.
+        """
+        items = []
+        bits = {}
+        for node in self.fieldtree.children:
+            f = node.f
+            if f.is_bool():
+                byteoffset, bitoffset = divmod(f.slot.offset, 8)
+                expr = '({arg} << {bitoffset})'.format(arg=node.varname,
+                                                       bitoffset=bitoffset)
+                bits.setdefault(byteoffset, []).append(expr)
+            else:
+                fmt = ensure_unicode(f.slot.get_fmt())
+                items.append((self.slot_offset(f), fmt, node.varname))
+        for byteoffset, exprs in bits.items():
+            items.append((byteoffset, u'B', ' | '.join(exprs)))
+        items.sort()
+        return items
+
+    def get_pack_fmt(self):
+        """
+        Return the struct format which packs the data section of a flat
+        struct, filling the holes with padding bytes
+        """
+        parts = ['<']
+        pos = 0
+        for offset, fmt, expr in self.get_flat_layout():
+            if offset > pos:
+                parts.append('%dx' % (offset - pos))
+            parts.append(fmt)
+            pos = offset + struct.calcsize('<' + fmt)
+        length = self.data_size*8
+        if length > pos:
+            parts.append('%dx' % (length - pos))
+        return ''.join(parts)
 
     def slot_offset(self, f):
         offset = f.slot.offset * f.slot.get_size()
@@ -36,10 +99,23 @@ class Structor(object):
         ## def __new(x=0, y=0, z=None):
         ##     builder = _SegmentBuilder()
         ##     pos = builder.allocate(24)
+        ##     Point.__write(builder, pos, x, y, z)
+        ##     return builder.as_string()
+        ##
+        ## @staticmethod
+        ## def __write(builder, pos, x, y, z):
         ##     builder.write_int64(pos + 0, x)
         ##     builder.write_int64(pos + 8, y)
         ##     builder.alloc_text(pos + 16, z)
-        ##     return builder.as_string()
+        ##
+        ## @staticmethod
+        ## def _write_fields(builder, pos, x=0, y=0, z=None):
+        ##     Point.__write(builder, pos, x, y, z)
+        ##
+        ## __write fills a struct which has already been allocated at pos:
+        ## _write_fields is its Python-level entry point, which is used by
+        ## SegmentBuilder.copy_from_struct and StructItemType.write_item to
+        ## write tuples and dicts directly into the parent message
         #
         # the parameters have the same order as fields
         code = self.m.code
@@ -47,18 +123,91 @@ class Structor(object):
         if len(argnames) != len(set(argnames)):
             raise ValueError("Duplicate field name(s): %s" % argnames)
         #
+        ns = code.new_scope()
+        ns.clsname = self.clsname
+        ns.args = code.args(self.argnames)
+        ns.paramlist = code.params(self.argnames)
+        if ns.paramlist:
+            ns.paramlist = ', ' + ns.paramlist
+        #
+        self.m.declare_method('cdef __new(%s)' % self.m.pxd_params(self.params),
+                              static=True)
         code.w('@staticmethod')
-        with code.cdef_('__new', self.params) as ns:
-            ns.length = (self.data_size + self.ptrs_size)*8
-            ns.cdef_var('_SegmentBuilder', 'builder')
-            ns.cdef_var('long', 'pos')
-            ns.w('builder = _SegmentBuilder()')
-            ns.w('pos = builder.allocate({length})')
+        if self.is_flat():
+            self.emit_flat()
+        else:
+            with code.cdef_('__new', self.params):
+                ns.length = (self.data_size + self.ptrs_size)*8
+                ns.cdef_var('_SegmentBuilder', 'builder')
+                ns.cdef_var('long', 'pos')
+                ns.w('builder = _SegmentBuilder()')
+                ns.w('pos = builder.allocate({length})')
+                ns.w('{clsname}.__write(builder, pos, {args})')
+                ns.w('return builder.as_string()')
+        code.w()
+        #
+        code.w('@staticmethod')
+        if self.m.pyx:
+            ns.sig = ns.format('cdef __write(_SegmentBuilder builder, long pos{paramlist})')
+            self.m.declare_method(ns.sig, static=True)
+        else:
+            ns.sig = ns.format('def __write(builder, pos{paramlist})')
+        with ns.block('{sig}:'):
             for union in self.fieldtree.all_unions():
                 ns.w('{union}__curtag = None', union=union.varname)
             for node in self.fieldtree.children:
                 self.handle_node(node)
-            ns.w('return builder.as_string()')
+        code.w()
+        #
+        code.w('@staticmethod')
+        with code.def_('_write_fields', ['builder', 'pos'] + self.params):
+            ns.w('{clsname}.__write(builder, pos, {args})')
+
+    def emit_flat(self):
+        ## for structs which contain only data fields, pack the whole data
+        ## section at once. In py mode:
+        ##
+        ## def __new(x=0, y=0, z=0):
+        ##     return _Point_struct.pack(x, y, z)
+        ##
+        ## In pyx mode, we fill a zeroed buffer on the stack and turn it
+        ## into a bytes object at the end:
+        ##
+        ## cdef __new(object x=0, object y=0, object z=0):
+        ##     cdef char buf[24]
+        ##     _memset(buf, 0, 24)
+        ##     (<_int64_t*>(buf + 0))[0] = x
+        ##     ...
+        ##     return buf[:24]
+        code = self.m.code
+        with code.cdef_('__new', self.params) as ns:
+            ns.length = self.data_size*8
+            if self.m.pyx:
+                ns.w('cdef char buf[{length}]')
+                ns.w('_memset(buf, 0, {length})')
+            for node in self.fieldtree.children:
+                if node.f.slot.hadExplicitDefault:
+                    ns.w('{arg} ^= {default_}', arg=node.varname,
+                         default_=node.f.slot.defaultValue.as_pyobj())
+            if not self.m.pyx:
+                assert self.packer is not None
+                layout = self.get_flat_layout()
+                ns.args = ', '.join([expr for _, _, expr in layout])
+                ns.w('return {packer}.pack({args})', packer=self.packer)
+                return
+            for node in self.fieldtree.children:
+                ns.arg = node.varname
+                f = node.f
+                if f.is_bool():
+                    ns.byteoffset, bitoffset = divmod(f.slot.offset, 8)
+                    ns.bitmask = 1 << bitoffset
+                    with ns.block('if {arg}:'):
+                        ns.w('buf[{byteoffset}] |= {bitmask}')
+                else:
+                    ns.ctype = CTYPES[f.slot.get_typename()]
+                    ns.offset = self.slot_offset(f)
+                    ns.w('(<{ctype}*>(buf + {offset}))[0] = {arg}')
+            ns.w('return buf[:{length}]')
 
     def handle_node(self, node):
         if node.f.is_part_of_union():
@@ -71,7 +220,7 @@ class Structor(object):
             ns.ifmt  = 'ord(%r)' % Types.int16.fmt
             with ns.block('if {varname} is not _undefined:'):
                 ns.w('{union}__curtag = _check_tag({union}__curtag, {tagname!r})')
-                ns.w('builder.write_int16({offset}, {tagval})')
+                ns.w('builder.write_int16(pos + {offset}, {tagval})')
                 self._handle_node(node)
         else:
             self._handle_node(node)
@@ -190,4 +339,4 @@ class Structor(object):
         if node.f.slot.hadExplicitDefault:
             ns.default_ = node.f.slot.defaultValue.as_pyobj()
             ns.w('{arg} ^= {default_}')
-        ns.w('builder.write_bool({byteoffset}, {bitoffset}, {arg})')
+        ns.w('builder.write_bool(pos + {byteoffset}, {bitoffset}, {arg})')
@@ -0,0 +1,264 @@
+# THIS FILE HAS BEEN GENERATED AUTOMATICALLY BY capnpy
+# do not edit by hand
+# generated on 2026-10-19 10:32
+
+from capnpy import ptr as _ptr
+from capnpy.struct_ import Struct as _Struct
+from capnpy.struct_ import check_tag as _check_tag
+from capnpy.struct_ import undefined as _undefined
+from capnpy.enum import enum as _enum, fill_enum as _fill_enum
+from capnpy.enum import BaseEnum as _BaseEnum
+from capnpy.type import Types as _Types
+from capnpy.segment.builder import SegmentBuilder as _SegmentBuilder
+from capnpy.list import List as _List
+from capnpy.list import PrimitiveItemType as _PrimitiveItemType
+from capnpy.list import BoolItemType as _BoolItemType
+from capnpy.list import TextItemType as _TextItemType
+from capnpy.list import StructItemType as _StructItemType
+from capnpy.list import EnumItemType as _EnumItemType
+from capnpy.list import VoidItemType as _VoidItemType
+from capnpy.list import ListItemType as _ListItemType
+from capnpy.util import text_repr as _text_repr
+from capnpy.util import float32_repr as _float32_repr
+from capnpy.util import float64_repr as _float64_repr
+from capnpy.util import extend_module_maybe as _extend_module_maybe
+from capnpy.util import check_version as _check_version
+from capnpy import sortkey as _sortkey
+__capnpy_version__ = 'unknown'
+# schema compiled with --no-version-check, skipping the call to _check_version
+
+#### FORWARD DECLARATIONS ####
+
+class PointerPatch(_Struct): pass
+PointerPatch.__name__ = 'PointerPatch'
+class PointerPatch__tag__(_BaseEnum):
+    __members__ = ('null', 'subtree', 'patch',)
+    @staticmethod
+    def _new(x):
+        return PointerPatch__tag__(x)
+_fill_enum(PointerPatch__tag__)
+
+class Patch(_Struct): pass
+Patch.__name__ = 'Patch'
+
+
+#### DEFINITIONS ####
+
+@PointerPatch.__extend__
+class PointerPatch(_Struct):
+    __static_data_size__ = 1
+    __static_ptrs_size__ = 1
+    __field_layout__ = (('index', 'primitive', 0, 'H', -1, None), ('subtree', 'data', 0, None, 1, None), ('patch', 'ptr', 0, None, 2, None))
+    
+    
+    __tag__ = PointerPatch__tag__
+    __tag_offset__ = 2
+    
+    def is_null(self):
+        return self._read_data_int16(2) == 0
+    def is_subtree(self):
+        return self._read_data_int16(2) == 1
+    def is_patch(self):
+        return self._read_data_int16(2) == 2
+    
+    @property
+    def index(self):
+        # no union check
+        value = self._read_data(0, ord(b'H'))
+        if 0 != 0:
+            value = value ^ 0
+        return value
+    
+    @property
+    def null(self):
+        self._ensure_union(0)
+        return None
+    
+    @property
+    def subtree(self):
+        self._ensure_union(1)
+        return self._read_str_data(0)
+    
+    def get_subtree(self):
+        return self._read_str_data(0, default_=b"")
+    
+    def get_subtree_view(self):
+        return self._read_str_view(0, 0)
+    
+    def has_subtree(self):
+        ptr = self._read_fast_ptr(0)
+        return ptr != 0
+    
+    @property
+    def patch(self):
+        self._ensure_union(2)
+        offset = 0
+        p = self._read_fast_ptr(offset)
+        if _ptr.kind(p) == _ptr.FAR:
+            offset, p = self._read_far_ptr(offset)
+        else:
+            offset += self._ptrs_offset
+        if p == 0:
+            return None
+        obj = Patch.__new__(Patch)
+        obj._init_from_pointer(self._seg, offset, p)
+        return obj
+    
+    def get_patch(self):
+        res = self.patch
+        if res is None:
+            return Patch.from_buffer(b'', 0, data_size=0, ptrs_size=0)
+        return res
+    
+    def has_patch(self):
+        ptr = self._read_fast_ptr(0)
+        return ptr != 0
+    
+    @staticmethod
+    def __new(index=0, null=_undefined, subtree=_undefined, patch=_undefined):
+        builder = _SegmentBuilder()
+        pos = builder.allocate(16)
+        anonymous__curtag = None
+        builder.write_uint16(pos + 0, index)
+        if null is not _undefined:
+            anonymous__curtag = _check_tag(anonymous__curtag, 'null')
+            builder.write_int16(2, 0)
+        if subtree is not _undefined:
+            anonymous__curtag = _check_tag(anonymous__curtag, 'subtree')
+            builder.write_int16(2, 1)
+            builder.alloc_data(pos + 8, subtree)
+        if patch is not _undefined:
+            anonymous__curtag = _check_tag(anonymous__curtag, 'patch')
+            builder.write_int16(2, 2)
+            builder.copy_from_struct(pos + 8, Patch, patch)
+        return builder.as_string()
+    
+    def __init__(self, index=0, null=_undefined, subtree=_undefined, patch=_undefined):
+        _buf = PointerPatch.__new(index, null, subtree, patch)
+        self._init_from_buffer(_buf, 0, 1, 1)
+    
+    @classmethod
+    def new_null(cls, index=0, null=None):
+        buf = PointerPatch.__new(index=index, null=null, subtree=_undefined, patch=_undefined)
+        return cls.from_buffer(buf, 0, 1, 1)
+    
+    @classmethod
+    def new_subtree(cls, index=0, subtree=None):
+        buf = PointerPatch.__new(index=index, subtree=subtree, null=_undefined, patch=_undefined)
+        return cls.from_buffer(buf, 0, 1, 1)
+    
+    @classmethod
+    def new_patch(cls, index=0, patch=None):
+        buf = PointerPatch.__new(index=index, patch=patch, null=_undefined, subtree=_undefined)
+        return cls.from_buffer(buf, 0, 1, 1)
+    
+    def shortrepr(self):
+        parts = []
+        parts.append("index = %s" % self.index)
+        if self.is_null(): parts.append("null = %s" % "void")
+        if self.is_subtree() and (self.has_subtree() or
+                                  not False):
+            parts.append("subtree = %s" % _text_repr(self.get_subtree()))
+        if self.is_patch() and (self.has_patch() or
+                                  not False):
+            parts.append("patch = %s" % self.get_patch().shortrepr())
+        return "(%s)" % ", ".join(parts)
+
+_PointerPatch_list_item_type = _StructItemType(PointerPatch)
+
+@Patch.__extend__
+class Patch(_Struct):
+    __static_data_size__ = 1
+    __static_ptrs_size__ = 3
+    __field_layout__ = (('data_size', 'primitive', 0, 'H', -1, None), ('ptrs_size', 'primitive', 2, 'H', -1, None), ('word_indexes', 'ptr', 0, None, -1, None), ('words', 'ptr', 8, None, -1, None), ('pointers', 'ptr', 16, None, -1, None))
+    
+    
+    @property
+    def data_size(self):
+        # no union check
+        value = self._read_data(0, ord(b'H'))
+        if 0 != 0:
+            value = value ^ 0
+        return value
+    
+    @property
+    def ptrs_size(self):
+        # no union check
+        value = self._read_data(2, ord(b'H'))
+        if 0 != 0:
+            value = value ^ 0
+        return value
+    
+    @property
+    def word_indexes(self):
+        # no union check
+        return self._read_list(0, _PrimitiveItemType(_Types.uint16))
+    
+    def get_word_indexes(self):
+        res = self.word_indexes
+        if res is None:
+            return _List.from_buffer(b'', 0, 0, 0, _PrimitiveItemType(_Types.uint16))
+        return res
+    
+    def has_word_indexes(self):
+        ptr = self._read_fast_ptr(0)
+        return ptr != 0
+    
+    @property
+    def words(self):
+        # no union check
+        return self._read_list(8, _PrimitiveItemType(_Types.uint64))
+    
+    def get_words(self):
+        res = self.words
+        if res is None:
+            return _List.from_buffer(b'', 0, 0, 0, _PrimitiveItemType(_Types.uint64))
+        return res
+    
+    def has_words(self):
+        ptr = self._read_fast_ptr(8)
+        return ptr != 0
+    
+    @property
+    def pointers(self):
+        # no union check
+        return self._read_list(16, _PointerPatch_list_item_type)
+    
+    def get_pointers(self):
+        res = self.pointers
+        if res is None:
+            return _List.from_buffer(b'', 0, 0, 0, _PointerPatch_list_item_type)
+        return res
+    
+    def has_pointers(self):
+        ptr = self._read_fast_ptr(16)
+        return ptr != 0
+    
+    @staticmethod
+    def __new(data_size=0, ptrs_size=0, word_indexes=None, words=None, pointers=None):
+        builder = _SegmentBuilder()
+        pos = builder.allocate(32)
+        builder.write_uint16(pos + 0, data_size)
+        builder.write_uint16(pos + 2, ptrs_size)
+        builder.copy_from_list(pos + 8, _PrimitiveItemType(_Types.uint16), word_indexes)
+        builder.copy_from_list(pos + 16, _PrimitiveItemType(_Types.uint64), words)
+        builder.copy_from_list(pos + 24, _PointerPatch_list_item_type, pointers)
+        return builder.as_string()
+    
+    def __init__(self, data_size=0, ptrs_size=0, word_indexes=None, words=None, pointers=None):
+        _buf = Patch.__new(data_size, ptrs_size, word_indexes, words, pointers)
+        self._init_from_buffer(_buf, 0, 1, 3)
+    
+    def shortrepr(self):
+        parts = []
+        parts.append("data_size = %s" % self.data_size)
+        parts.append("ptrs_size = %s" % self.ptrs_size)
+        if self.has_word_indexes(): parts.append("word_indexes = %s" % self.get_word_indexes().shortrepr())
+        if self.has_words(): parts.append("words = %s" % self.get_words().shortrepr())
+        if self.has_pointers(): parts.append("pointers = %s" % self.get_pointers().shortrepr())
+        return "(%s)" % ", ".join(parts)
+
+_Patch_list_item_type = _StructItemType(Patch)
+
+
+_extend_module_maybe(globals(), modname=__name__)
\ No newline at end of file
@@ -0,0 +1,146 @@
+from capnpy import ptr
+from capnpy.struct_ import Struct as _RawStruct
+from capnpy.segment.endof import endof
+
+_UINT64 = ord('Q')
+# all the bits of a pointer except the offset: i.e., the kind and the size
+_SHAPE_MASK = 0xffffffff00000003
+
+def diff(old, new):
+    """
+    Compute the difference between two structs of the same type, as a Patch
+    object which can be sent over the wire: ``patch(old, delta)`` rebuilds
+    ``new``. Only the data words which changed are stored; pointers which
+    changed are either patched recursively (if both are structs) or replaced
+    by a copy of the new subtree.
+    """
+    if type(old) is not type(new):
+        raise TypeError("Cannot diff %s and %s" %
+                        (type(old).__name__, type(new).__name__))
+    delta = _diff_struct(old, new)
+    if delta is None:
+        # no differences
+        delta = Patch(data_size=new._data_size, ptrs_size=new._ptrs_size,
+                      word_indexes=[], words=[], pointers=[])
+    return delta
+
+def patch(old, delta):
+    """
+    Apply a Patch produced by ``diff(old, new)`` and return a new struct
+    equal to ``new``
+    """
+    builder = _SegmentBuilder()
+    pos = builder.allocate(8)
+    _patch_struct(builder, pos, old, delta)
+    buf = builder.as_string()
+    t = type(old)
+    res = t.__new__(t)
+    res._init_from_buffer(buf, 8, delta.data_size, delta.ptrs_size)
+    return res
+
+
+def _diff_struct(old, new):
+    data_size = new._data_size
+    ptrs_size = new._ptrs_size
+    word_indexes = []
+    words = []
+    for i in range(data_size):
+        word = new._read_data(i*8, _UINT64)
+        if old is None or old._read_data(i*8, _UINT64) != word:
+            word_indexes.append(i)
+            words.append(word)
+    pointers = []
+    for i in range(ptrs_size):
+        item = _diff_pointer(old, new, i)
+        if item is not None:
+            pointers.append(item)
+    if (old is not None and
+        old._data_size == data_size and old._ptrs_size == ptrs_size and
+        not word_indexes and not pointers):
+        return None
+    return Patch(data_size=data_size, ptrs_size=ptrs_size,
+                 word_indexes=word_indexes, words=words, pointers=pointers)
+
+def _diff_pointer(old, new, i):
+    old_pos, old_p = _read_ptr(old, i)
+    new_pos, new_p = _read_ptr(new, i)
+    if new_p == 0:
+        if old_p == 0:
+            return None
+        return PointerPatch.new_null(index=i)
+    if (old_p != 0 and
+        ptr.kind(old_p) == ptr.STRUCT and ptr.kind(new_p) == ptr.STRUCT):
+        # note that a null pointer looks like a STRUCT: null -> struct is
+        # handled below by copying the whole subtree
+        delta = _diff_struct(old._read_struct(i*8, _RawStruct),
+                             new._read_struct(i*8, _RawStruct))
+        if delta is None:
+            return None
+        return PointerPatch.new_patch(index=i, patch=delta)
+    if old_p != 0 and _same_compact_subtree(old._seg, old_p, old_pos,
+                                            new._seg, new_p, new_pos):
+        return None
+    subtree = _copy_subtree(new._seg, new_p, new_pos)
+    if old_p != 0 and _copy_subtree(old._seg, old_p, old_pos) == subtree:
+        return None
+    return PointerPatch.new_subtree(index=i, subtree=subtree)
+
+def _read_ptr(obj, i):
+    # return (pos, p) such that p is the non-far pointer to the i-th child
+    # of obj, and pos is the position where it has been read
+    if obj is None or i >= obj._ptrs_size:
+        return 0, 0
+    p = obj._read_fast_ptr(i*8)
+    if ptr.kind(p) == ptr.FAR:
+        return obj._read_far_ptr(i*8)
+    return obj._ptrs_offset + i*8, p
+
+def _same_compact_subtree(seg1, p1, pos1, seg2, p2, pos2):
+    # fast path: if both subtrees are compact, they are equal iff they have
+    # the same shape and the same bytes
+    if (p1 & _SHAPE_MASK) != (p2 & _SHAPE_MASK):
+        return False
+    end1 = endof(seg1, p1, pos1)
+    end2 = endof(seg2, p2, pos2)
+    if end1 == -1 or end2 == -1:
+        return False
+    start1 = ptr.deref(p1, pos1)
+    start2 = ptr.deref(p2, pos2)
+    return seg1.buf[start1:end1] == seg2.buf[start2:end2]
+
+def _copy_subtree(seg, p, pos):
+    # return a message whose root pointer is a copy of the given subtree: if
+    # two subtrees are equal, their copies are equal byte by byte
+    builder = _SegmentBuilder()
+    builder.allocate(8)
+    builder.copy_from_pointer(0, seg, p, pos)
+    return builder.as_string()
+
+def _patch_struct(builder, pos, old, delta):
+    data_size = delta.data_size
+    ptrs_size = delta.ptrs_size
+    pos = builder.alloc_struct(pos, data_size, ptrs_size)
+    if old is not None:
+        n = min(data_size, old._data_size)
+        builder.write_slice(pos, old._seg, old._data_offset, n*8)
+    for i, word in zip(delta.get_word_indexes(), delta.get_words()):
+        builder.write_uint64(pos + i*8, word)
+    #
+    pointers = {}
+    for item in delta.get_pointers():
+        pointers[item.index] = item
+    for i in range(ptrs_size):
+        dst_pos = pos + data_size*8 + i*8
+        item = pointers.get(i)
+        if item is None:
+            old_pos, old_p = _read_ptr(old, i)
+            if old_p != 0:
+                builder.copy_from_pointer(dst_pos, old._seg, old_p, old_pos)
+        elif item.is_subtree():
+            root = _RawStruct.from_buffer(item.subtree, 0, 0, 1)
+            builder.copy_from_pointer(dst_pos, root._seg, root._read_fast_ptr(0), 0)
+        elif item.is_patch():
+            old_child = None
+            if old is not None:
+                old_child = old._read_struct(i*8, _RawStruct)
+            _patch_struct(builder, dst_pos, old_child, item.patch)
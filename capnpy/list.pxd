@@ -22,6 +22,17 @@ cdef class List(Blob):
                             long item_count, ItemType item_type)
     cpdef _set_list_tag(self, long size_tag, long item_count)
     cpdef _getitem_fast(self, long i)
+    cpdef long _as_pointer(self, long offset)
+
+    @cython.locals(item_type=PrimitiveItemType, start=long, end=long)
+    cpdef as_view(self)
+
+cdef class ListCursor(object):
+    cdef readonly List lst
+    cdef readonly long i
+    cdef long data_size
+    cdef long ptrs_size
+    cdef Struct obj
 
 cdef class ItemType(object):
     cdef readonly long item_length
@@ -52,8 +63,11 @@ cdef class StructItemType(ItemType):
     cdef readonly long static_ptrs_size
 
 cdef class TextItemType(ItemType):
+    cdef readonly BuiltinType t
     cdef readonly int additional_size
 
+    cpdef read_item_view(self, List lst, long i)
+
 cdef class ListItemType(ItemType):
     cdef readonly ItemType inner_item_type
 
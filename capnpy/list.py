@@ -1,4 +1,7 @@
+import sys
+import array
 import struct
+from six import PY3
 from six.moves import range
 
 import capnpy
@@ -71,6 +74,20 @@ class List(Blob):
         """
         return self._item_type.read_item(self, i)
 
+    def _as_pointer(self, offset):
+        """
+        Return a pointer p which points to this list, assuming that p will be
+        read at ``offset``
+        """
+        p_offset = (self._offset - offset - 8) // 8
+        if self._size_tag == ptr.LIST_SIZE_COMPOSITE:
+            # for composite lists, the pointer contains the number of words
+            # of the body, NOT including the tag
+            item_count = self._item_count * self._item_length // 8
+        else:
+            item_count = self._item_count
+        return ptr.new_list(p_offset, self._size_tag, item_count)
+
     def _get_end(self):
         p = ptr.new_list(0, self._size_tag, self._item_count)
         return endof(self._seg, p, self._offset-8)
@@ -93,11 +110,133 @@ class List(Blob):
                 self._item_type.get_type() == other._item_type.get_type() and
                 self._get_slice() == other._get_slice())
 
+    def cursor(self):
+        """
+        Return an iterator over a list of structs which yields always the same
+        object, rebinding it to each item in turn instead of allocating a new
+        one. The object is valid only until the next iteration step, so you
+        must not keep references to it.
+        """
+        if not isinstance(self._item_type, StructItemType):
+            raise TypeError("cursor() is supported only by lists of structs")
+        return ListCursor(self)
+
+    def get_view(self, i):
+        """
+        Return the i-th item of a List(Text) or List(Data) as a read-only
+        memoryview over the segment, without copying it. NULL items are
+        returned as None.
+        """
+        if not isinstance(self._item_type, TextItemType):
+            raise TypeError("get_view() is supported only by lists of Text or Data")
+        if i < 0:
+            i += self._item_count
+        if 0 <= i < self._item_count:
+            return self._item_type.read_item_view(self, i)
+        raise IndexError
+
+    def as_view(self):
+        """
+        Return a read-only memoryview over the items of a list of primitives,
+        without copying them. The memoryview has the same format as the
+        items, e.g. 'q' for List(Int64), and keeps the segment alive.
+
+        memoryview formats are always in native byte order, while capnproto
+        is little-endian: on big-endian hosts the items are copied and
+        byte-swapped. It requires Python 3, because memoryview.cast() does
+        not exist on Python 2.
+        """
+        if not isinstance(self._item_type, PrimitiveItemType):
+            raise TypeError("as_view() is supported only by lists of primitives")
+        if not PY3:
+            raise NotImplementedError("as_view() requires Python 3")
+        fmt = chr(self._item_type.ifmt)
+        start = self._offset
+        end = start + self._item_count * self._item_length
+        view = memoryview(self._seg.buf)[start:end]
+        if sys.byteorder != 'little':
+            items = array.array(fmt, view.tobytes())
+            items.byteswap()
+            view = memoryview(items.tobytes())
+        return view.cast(fmt)
+
+    def as_records(self):
+        """
+        Return a numpy structured array which is a zero-copy view over the
+        items of a List(Struct).
+
+        The dtype contains all the primitive and enum fields of the struct
+        which are stored at a fixed position of the data section; the items
+        are NOT copied, so the array is read-only and keeps the whole segment
+        alive.
+        """
+        import numpy
+        if not isinstance(self._item_type, StructItemType):
+            raise TypeError("as_records() is supported only by lists of structs")
+        structcls = self._item_type.get_type()
+        if self._size_tag == ptr.LIST_SIZE_COMPOSITE:
+            data_length = ptr.struct_data_size(self._tag) * 8
+            itemsize = self._item_length
+        else:
+            # this happens only for the empty lists returned by get_*()
+            data_length = structcls.__static_data_size__ * 8
+            itemsize = self._item_type.item_length
+        names = []
+        formats = []
+        offsets = []
+        for name, offset, fmt in structcls._data_fields():
+            if offset + struct.calcsize(fmt) > data_length:
+                raise ValueError("Cannot create a view including the field '%s': "
+                                 "the list items are smaller than expected, "
+                                 "probably because they were created with an "
+                                 "older schema" % name)
+            names.append(name)
+            formats.append('<' + fmt)
+            offsets.append(offset)
+        dtype = numpy.dtype({'names': names,
+                             'formats': formats,
+                             'offsets': offsets,
+                             'itemsize': itemsize})
+        if self._item_count == 0 or itemsize == 0:
+            # numpy.frombuffer does not support zero-sized items
+            return numpy.zeros(self._item_count, dtype=dtype)
+        return numpy.frombuffer(self._seg.buf, dtype=dtype,
+                                count=self._item_count,
+                                offset=self._offset + self._item_offset)
+
     def shortrepr(self):
         parts = [self._item_type.item_repr(item) for item in self]
         return '[%s]' % (', '.join(parts))
 
 
+class ListCursor(object):
+    """
+    Flyweight iterator returned by List.cursor()
+    """
+
+    def __init__(self, lst):
+        structcls = lst._item_type.get_type()
+        self.lst = lst
+        self.i = 0
+        self.data_size = ptr.struct_data_size(lst._tag)
+        self.ptrs_size = ptr.struct_ptrs_size(lst._tag)
+        self.obj = structcls.__new__(structcls)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.i >= self.lst._item_count:
+            raise StopIteration
+        offset = self.lst._item_type.offset_for_item(self.lst, self.i)
+        self.obj._init_from_buffer(self.lst._seg, offset,
+                                   self.data_size, self.ptrs_size)
+        self.i += 1
+        return self.obj
+
+    next = __next__ # Python 2
+
+
 class ItemType(object):
 
     def get_type(self):
@@ -240,6 +379,10 @@ class StructItemType(ItemType):
 
     def write_item(self, builder, pos, item):
         structcls = self.structcls
+        if isinstance(item, (tuple, dict)):
+            # write the fields directly into the list item
+            builder.write_struct_args(pos, structcls, item)
+            return
         if not isinstance(item, structcls):
             raise TypeError("Expected an object of type %s, got %s instead" %
                             (self.structcls.__name__, item.__class__.__name__))
@@ -251,6 +394,7 @@ class TextItemType(ItemType):
 
     def __init__(self, t):
         assert t in (Types.text, Types.data)
+        self.t = t
         self.additional_size = 0
         if t == Types.text:
             self.additional_size = -1
@@ -267,6 +411,13 @@ class TextItemType(ItemType):
             offset, p = lst._seg.read_far_ptr(offset)
         return lst._seg.read_str(p, offset, None, self.additional_size)
 
+    def read_item_view(self, lst, i):
+        offset = self.offset_for_item(lst, i)
+        p = lst._seg.read_ptr(offset)
+        if ptr.kind(p) == ptr.FAR:
+            offset, p = lst._seg.read_far_ptr(offset)
+        return lst._seg.read_str_view(p, offset, None, self.additional_size)
+
     def item_repr(self, item):
         return text_repr(item)
 
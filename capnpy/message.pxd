@@ -14,9 +14,11 @@ cpdef loads(bytes buf, object payload_type)
 #cpdef load_all(FileLike f, object payload_type)
 
 
-@cython.locals(buf = bytes, n=int)
 cpdef Struct _load_message(FileLike f)
 
+@cython.locals(buf = bytes, n=int)
+cpdef _load_buffer(FileLike f)
+
 @cython.locals(buf=bytes, message_size=int, message_lenght=int)
 cpdef _load_buffer_single_segment(FileLike f)
 
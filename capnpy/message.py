@@ -40,26 +40,65 @@ def loads(buf, payload_type):
         raise ValueError("Not all bytes were consumed: %d bytes left" % remaining)
     return obj
 
-def load_all(f, payload_type):
+def load_all(f, payload_type, reuse=False, where=None):
     """
-    Load and yield all the messages in the given file-like object
+    Load and yield all the messages in the given file-like object.
+
+    If ``reuse`` is True, yield always the same instance of ``payload_type``,
+    rebinding it to each message in turn: the object is valid only until the
+    next iteration step, so you must not keep references to it.
+
+    If ``where`` is given, it must be a capnpy.predicate.Predicate: it is
+    evaluated on the raw buffer of each message, and only the matching
+    messages are yielded.
     """
+    if reuse or where is not None:
+        return _load_all_reuse(f, payload_type, reuse, where)
+    return _load_all(f, payload_type)
+
+def _load_all(f, payload_type):
     try:
         while True:
             yield load(f, payload_type)
     except EOFError:
         pass
 
+def _load_all_reuse(f, payload_type, reuse, where):
+    # the root and the payload are rebound to each message: if reuse is
+    # False, we allocate a new payload only for the messages which match
+    f2 = as_filelike(f)
+    msg = Struct.__new__(Struct)
+    obj = payload_type.__new__(payload_type)
+    try:
+        while True:
+            seg = _load_buffer(f2)
+            if where is None:
+                msg._init_from_buffer(seg, 0, 0, 1)
+                yield msg._read_struct_into(0, obj)
+                continue
+            #
+            # evaluate the predicate directly on the segment, before binding
+            # or allocating any object
+            offset = 0
+            p = seg.read_ptr(0)
+            if ptr.kind(p) == ptr.FAR:
+                offset, p = seg.read_far_ptr(0)
+            if p == 0:
+                continue
+            assert ptr.kind(p) == ptr.STRUCT
+            if not where.match_at(seg, ptr.deref(p, offset),
+                                  ptr.struct_data_size(p),
+                                  ptr.struct_ptrs_size(p)):
+                continue
+            if not reuse:
+                obj = payload_type.__new__(payload_type)
+            obj._init_from_pointer(seg, offset, p)
+            yield obj
+    except EOFError:
+        pass
+
 def _load_message(f):
-    # read the total number of segments
-    buf = f.read(4)
-    if len(buf) < 4:
-        raise EOFError("No message to load")
-    n = unpack_uint32(buf, 0) + 1
-    if n == 1:
-        capnp_buf = _load_buffer_single_segment(f) # fast path
-    else:
-        capnp_buf = _load_buffer_multiple_segments(f, n) # slow path
+    capnp_buf = _load_buffer(f)
     #
     # from the capnproto docs:
     #
@@ -71,6 +110,17 @@ def _load_message(f):
     return struct_from_buffer(Struct, capnp_buf, 0, data_size=0, ptrs_size=1)
 
 
+def _load_buffer(f):
+    # read the total number of segments
+    buf = f.read(4)
+    if len(buf) < 4:
+        raise EOFError("No message to load")
+    n = unpack_uint32(buf, 0) + 1
+    if n == 1:
+        return _load_buffer_single_segment(f) # fast path
+    else:
+        return _load_buffer_multiple_segments(f, n) # slow path
+
 def _load_buffer_single_segment(f):
     # fast path for the single-segment case. In this scenario, we don't
     # even need to compute the padding as we know that we read exactly 4+4
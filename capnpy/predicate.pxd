@@ -0,0 +1,60 @@
+import cython
+from capnpy cimport ptr
+from capnpy.segment.segment cimport Segment
+
+cdef long PRIMITIVE, BOOL, TEXT, DATA
+cdef long LT, LE, EQ, NE, GT, GE
+cdef Segment _ZERO
+
+cpdef bint check_cmp(int c, int opcode)
+
+cdef class FieldRef(object):
+    cdef readonly object name
+    cdef readonly long kind
+    cdef readonly long offset
+    cdef readonly object default_
+    cdef readonly char ifmt
+    cdef readonly long size
+    cdef readonly long bitmask
+    cdef readonly int additional_size
+
+    @cython.locals(p=long, p_offset=long)
+    cpdef read(self, Segment seg, long offset, long data_size, long ptrs_size)
+    cpdef long ptr_offset(self, long offset, long data_size, long ptrs_size)
+    cpdef Segment encode(self, object value)
+
+cdef class Predicate(object):
+    cpdef bint match_at(self, Segment seg, long offset, long data_size,
+                        long ptrs_size) except -1
+
+cdef class Compare(Predicate):
+    cdef readonly FieldRef field
+    cdef readonly object op
+    cdef readonly object opname
+    cdef readonly int opcode
+    cdef readonly object value
+    cdef readonly Segment valueseg
+
+    @cython.locals(f=FieldRef, p=long, p_offset=long, value_p=long, c=int)
+    cpdef bint match_at(self, Segment seg, long offset, long data_size,
+                        long ptrs_size) except -1
+
+cdef class StartsWith(Predicate):
+    cdef readonly FieldRef field
+    cdef readonly bytes prefix
+    cdef readonly Segment prefixseg
+
+    @cython.locals(p=long, p_offset=long, size=long, start=long)
+    cpdef bint match_at(self, Segment seg, long offset, long data_size,
+                        long ptrs_size) except -1
+
+cdef class And(Predicate):
+    cdef readonly Predicate a
+    cdef readonly Predicate b
+
+cdef class Or(Predicate):
+    cdef readonly Predicate a
+    cdef readonly Predicate b
+
+cdef class Not(Predicate):
+    cdef readonly Predicate a
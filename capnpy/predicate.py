@@ -0,0 +1,355 @@
+"""
+Predicates on the fields of a struct, evaluated directly on the buffer.
+
+``fields(cls)`` returns a namespace containing a ``FieldRef`` for each field
+which can be used in a predicate; comparing a FieldRef with a value returns a
+``Predicate``, which can be combined with ``&``, ``|`` and ``~`` and passed
+to ``load_all(..., where=...)``::
+
+    F = fields(Foo)
+    for foo in load_all(f, Foo, where=(F.status == 3) & F.name.startswith(b'x')):
+        ...
+
+The layout of the fields comes from ``Struct._predicate_fields()``, which is
+derived from the ``__field_layout__`` generated by the compiler.
+
+Predicates are evaluated on the segment of the message, given the offset and
+the size of the struct: whenever possible, the value of a Compare is encoded
+in a small segment of its own, so that the field can be compared with the
+typed comparisons of the segment (memcmp for Text and Data), without reading
+it into a Python object.
+"""
+
+import operator
+import struct
+import six
+from capnpy import ptr
+from capnpy.segment.segment import Segment
+
+PRIMITIVE = 0
+BOOL = 1
+TEXT = 2
+DATA = 3
+_KINDS = {'primitive': PRIMITIVE, 'bool': BOOL, 'text': TEXT, 'data': DATA}
+
+# same values as Py_LT & co.
+LT = 0
+LE = 1
+EQ = 2
+NE = 3
+GT = 4
+GE = 5
+_OPCODES = {'<': LT, '<=': LE, '==': EQ, '!=': NE, '>': GT, '>=': GE}
+
+# the fields which are outside the data section of a struct read as 0: we
+# read them from here
+_ZERO = Segment(b'\x00' * 8)
+
+def check_cmp(c, opcode):
+    """
+    Turn the result of a three-way comparison into the result of opcode
+    """
+    if opcode == EQ:
+        return c == 0
+    elif opcode == NE:
+        return c != 0
+    elif opcode == LT:
+        return c < 0
+    elif opcode == LE:
+        return c <= 0
+    elif opcode == GT:
+        return c > 0
+    else:
+        return c >= 0
+
+class FieldRef(object):
+    """
+    The location of a field inside the struct, as described by an entry of
+    ``Struct._predicate_fields()``: kind is one of 'primitive', 'bool',
+    'text' and 'data'.
+    """
+
+    def __init__(self, name, kind, offset, arg, default_):
+        if kind not in _KINDS:
+            raise ValueError('Unknown field kind: %s' % kind)
+        self.name = name
+        self.kind = _KINDS[kind]
+        self.offset = offset
+        self.default_ = default_
+        self.ifmt = 0
+        self.size = 0
+        self.bitmask = 0
+        self.additional_size = 0
+        if self.kind == PRIMITIVE:
+            self.ifmt = ord(arg)
+            self.size = struct.calcsize('<' + arg)
+        elif self.kind == BOOL:
+            self.bitmask = arg
+        elif self.kind == TEXT:
+            self.additional_size = -1 # the trailing '\0'
+
+    def __repr__(self):
+        return '<FieldRef %s>' % self.name
+
+    def read(self, seg, offset, data_size, ptrs_size):
+        """
+        Read the value of the field of the struct at the given offset
+        """
+        if self.kind == PRIMITIVE:
+            if self.offset + self.size > data_size*8:
+                value = 0
+            else:
+                value = seg.read_primitive(offset + self.offset, self.ifmt)
+            if self.default_ != 0:
+                value = value ^ self.default_
+            return value
+        elif self.kind == BOOL:
+            value = False
+            if self.offset < data_size*8:
+                value = bool(seg.read_uint8(offset + self.offset) & self.bitmask)
+            if self.default_:
+                value = not value
+            return value
+        else:
+            p_offset = self.ptr_offset(offset, data_size, ptrs_size)
+            p = 0
+            if p_offset >= 0:
+                p = seg.read_ptr(p_offset)
+                if ptr.kind(p) == ptr.FAR:
+                    p_offset, p = seg.read_far_ptr(p_offset)
+            return seg.read_str(p, p_offset, None, self.additional_size)
+
+    def ptr_offset(self, offset, data_size, ptrs_size):
+        """
+        Return the offset of the pointer of a Text or Data field, or -1 if it
+        is outside the pointer section
+        """
+        if self.offset >= ptrs_size*8:
+            return -1
+        return offset + data_size*8 + self.offset
+
+    def encode(self, value):
+        """
+        Encode value in the same way as the field, so that they can be
+        compared on the buffer: return a Segment containing the value at
+        offset 0 (for primitives) or a pointer at offset 0 to the value (for
+        Text and Data). Return None if value cannot be encoded.
+        """
+        if self.kind == PRIMITIVE:
+            if self.ifmt == ord('d') or self.ifmt == ord('f'):
+                return None
+            if not isinstance(value, six.integer_types):
+                return None
+            try:
+                buf = struct.pack('<' + chr(self.ifmt), value ^ self.default_)
+            except struct.error:
+                return None # out of range
+            return Segment(buf + b'\x00' * (8 - len(buf)))
+        elif self.kind == TEXT or self.kind == DATA:
+            if value is None:
+                return _ZERO # a NULL pointer
+            if not isinstance(value, bytes):
+                return None
+            if self.kind == TEXT:
+                value += b'\x00'
+            p = ptr.new_list(0, ptr.LIST_SIZE_8, len(value))
+            padding = b'\x00' * (ptr.round_up_to_word(len(value)) - len(value))
+            return Segment(struct.pack('<q', p) + value + padding)
+        return None
+
+    def __eq__(self, value):
+        return Compare(self, operator.eq, '==', value)
+
+    def __ne__(self, value):
+        return Compare(self, operator.ne, '!=', value)
+
+    def __lt__(self, value):
+        return Compare(self, operator.lt, '<', value)
+
+    def __le__(self, value):
+        return Compare(self, operator.le, '<=', value)
+
+    def __gt__(self, value):
+        return Compare(self, operator.gt, '>', value)
+
+    def __ge__(self, value):
+        return Compare(self, operator.ge, '>=', value)
+
+    def startswith(self, prefix):
+        if self.kind != TEXT and self.kind != DATA:
+            raise TypeError('startswith() is supported only by Text and Data '
+                            'fields, not by %s' % self.name)
+        return StartsWith(self, prefix)
+
+
+class Predicate(object):
+
+    def match(self, obj):
+        """
+        Evaluate the predicate on the given Struct
+        """
+        return self.match_at(obj._seg, obj._data_offset, obj._data_size,
+                             obj._ptrs_size)
+
+    def match_at(self, seg, offset, data_size, ptrs_size):
+        """
+        Evaluate the predicate on the struct which is stored in seg at the
+        given offset, without binding any Struct to it
+        """
+        raise NotImplementedError
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+class Compare(Predicate):
+
+    def __init__(self, field, op, opname, value):
+        self.field = field
+        self.op = op
+        self.opname = opname
+        self.opcode = _OPCODES[opname]
+        self.value = value
+        # the encoded value, if the comparison can be done on the buffer.
+        # Values XORed with a non-zero default cannot be ordered, and NULL
+        # Text/Data cannot be ordered at all
+        self.valueseg = None
+        if self.opcode == EQ or self.opcode == NE:
+            self.valueseg = field.encode(value)
+        elif field.default_ == 0 and value is not None:
+            self.valueseg = field.encode(value)
+
+    def __repr__(self):
+        return '(%s %s %r)' % (self.field.name, self.opname, self.value)
+
+    def match_at(self, seg, offset, data_size, ptrs_size):
+        f = self.field
+        if self.valueseg is None:
+            value = f.read(seg, offset, data_size, ptrs_size)
+            return bool(self.op(value, self.value))
+        if f.kind == PRIMITIVE:
+            if f.offset + f.size > data_size*8:
+                seg = _ZERO
+                offset = 0
+            else:
+                offset += f.offset
+            if self.opcode == EQ:
+                return seg.eq_bytes(offset, self.valueseg, 0, f.size)
+            elif self.opcode == NE:
+                return not seg.eq_bytes(offset, self.valueseg, 0, f.size)
+            c = seg.cmp_primitive(offset, self.valueseg, 0, f.ifmt)
+            return check_cmp(c, self.opcode)
+        else:
+            p_offset = f.ptr_offset(offset, data_size, ptrs_size)
+            p = 0
+            if p_offset >= 0:
+                p = seg.read_ptr(p_offset)
+                if ptr.kind(p) == ptr.FAR:
+                    p_offset, p = seg.read_far_ptr(p_offset)
+            value_p = self.valueseg.read_ptr(0)
+            if self.opcode == EQ:
+                return seg.eq_str(p, p_offset, self.valueseg, value_p, 0,
+                                  f.additional_size)
+            elif self.opcode == NE:
+                return not seg.eq_str(p, p_offset, self.valueseg, value_p, 0,
+                                      f.additional_size)
+            c = seg.cmp_str(p, p_offset, self.valueseg, value_p, 0,
+                            f.additional_size)
+            return check_cmp(c, self.opcode)
+
+
+class StartsWith(Predicate):
+
+    def __init__(self, field, prefix):
+        self.field = field
+        self.prefix = prefix
+        self.prefixseg = Segment(prefix + b'\x00' * 8) # avoid empty buffers
+
+    def __repr__(self):
+        return '%s.startswith(%r)' % (self.field.name, self.prefix)
+
+    def match_at(self, seg, offset, data_size, ptrs_size):
+        p_offset = self.field.ptr_offset(offset, data_size, ptrs_size)
+        if p_offset < 0:
+            return False
+        p = seg.read_ptr(p_offset)
+        if ptr.kind(p) == ptr.FAR:
+            p_offset, p = seg.read_far_ptr(p_offset)
+        if p == 0:
+            return False
+        assert ptr.kind(p) == ptr.LIST
+        assert ptr.list_size_tag(p) == ptr.LIST_SIZE_8
+        size = ptr.list_item_count(p) + self.field.additional_size
+        if size < len(self.prefix):
+            return False
+        start = ptr.deref(p, p_offset)
+        return seg.eq_bytes(start, self.prefixseg, 0, len(self.prefix))
+
+
+class And(Predicate):
+
+    def __init__(self, a, b):
+        self.a = a
+        self.b = b
+
+    def __repr__(self):
+        return '(%r & %r)' % (self.a, self.b)
+
+    def match_at(self, seg, offset, data_size, ptrs_size):
+        return (self.a.match_at(seg, offset, data_size, ptrs_size) and
+                self.b.match_at(seg, offset, data_size, ptrs_size))
+
+
+class Or(Predicate):
+
+    def __init__(self, a, b):
+        self.a = a
+        self.b = b
+
+    def __repr__(self):
+        return '(%r | %r)' % (self.a, self.b)
+
+    def match_at(self, seg, offset, data_size, ptrs_size):
+        return (self.a.match_at(seg, offset, data_size, ptrs_size) or
+                self.b.match_at(seg, offset, data_size, ptrs_size))
+
+
+class Not(Predicate):
+
+    def __init__(self, a):
+        self.a = a
+
+    def __repr__(self):
+        return '~%r' % (self.a,)
+
+    def match_at(self, seg, offset, data_size, ptrs_size):
+        return not self.a.match_at(seg, offset, data_size, ptrs_size)
+
+
+class Fields(object):
+    """
+    Namespace of the FieldRefs of a struct, returned by fields()
+    """
+
+    def __init__(self, structcls):
+        self.__structcls__ = structcls
+        for name, kind, offset, arg, default_ in structcls._predicate_fields():
+            setattr(self, name, FieldRef(name, kind, offset, arg, default_))
+
+    def __repr__(self):
+        return '<fields of %s>' % self.__structcls__.__name__
+
+
+def fields(structcls):
+    """
+    Return a namespace containing a FieldRef for each field of ``structcls``
+    which can be used in a predicate. Union members, groups and pointers
+    other than Text and Data are not supported.
+    """
+    return Fields(structcls)
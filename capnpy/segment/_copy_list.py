@@ -2,6 +2,8 @@
 Look at the docstring of _copy_pointer.py for an explanation of why we
 need fakecython/cython.compiled/etc.
 """
+import sys
+import struct
 from pypytools import fakecython
 from six import PY3
 
@@ -11,34 +13,46 @@ with fakecython:
 if not cython.compiled:
     from capnpy import ptr
     from capnpy.segment.builder import SegmentBuilder
-    from capnpy.list import ItemType, StructItemType
+    from capnpy.list import (List, ItemType, StructItemType, PrimitiveItemType,
+                             TextItemType)
     if PY3: long = int
 
 @cython.ccall
 @cython.locals(builder=SegmentBuilder, pos=long, item_type=ItemType,
                item_length=long, size_tag=long, item_count=long, body_length=long,
-               struct_item_type=StructItemType,
-               data_size=long, ptrs_size=long, total_words=long, tag=long)
+               text_item_type=TextItemType)
 def copy_from_list(builder, pos, item_type, lst):
     if lst is None:
         builder.write_int64(pos, 0)
         return
     #
+    if (isinstance(lst, List) and
+        lst._size_tag == item_type.size_tag and
+        lst._item_type.get_type() == item_type.get_type()):
+        # fast path: lst is already a capnproto list of the right type, so we
+        # can copy it in one go instead of item by item
+        builder.copy_from_pointer(pos, lst._seg, lst._as_pointer(0), 0)
+        return
+    #
     item_length = item_type.item_length
     size_tag = item_type.size_tag
     item_count = len(lst)
+    if size_tag == ptr.LIST_SIZE_BIT:
+        pos = builder.alloc_list(pos, size_tag, item_count, (item_count+7)//8)
+        builder.write_bits(pos, lst)
+        return
+    elif isinstance(item_type, PrimitiveItemType):
+        copy_primitive_list(builder, pos, item_type, lst)
+        return
+    elif isinstance(item_type, TextItemType):
+        text_item_type = item_type
+        builder.alloc_text_list(pos, lst, -text_item_type.additional_size)
+        return
+    #
     body_length = item_length * item_count
     if size_tag == ptr.LIST_SIZE_COMPOSITE:
         # alloc the list and write the tag
-        struct_item_type = item_type
-        data_size = struct_item_type.static_data_size
-        ptrs_size = struct_item_type.static_ptrs_size
-        total_words = (data_size+ptrs_size) * item_count
-        pos = builder.alloc_list(pos, size_tag, total_words,
-                                 body_length + 8) # +8 is for the tag
-        tag = ptr.new_struct(item_count, data_size, ptrs_size)
-        builder.write_int64(pos, tag)
-        pos += 8
+        pos = alloc_struct_list(builder, pos, item_type, item_count)
     else:
         # alloc the list, no tag
         pos = builder.alloc_list(pos, size_tag, item_count, body_length)
@@ -46,3 +60,143 @@ def copy_from_list(builder, pos, item_type, lst):
     for item in lst:
         item_type.write_item(builder, pos, item)
         pos += item_length
+
+
+@cython.ccall
+@cython.locals(builder=SegmentBuilder, pos=long, item_type=PrimitiveItemType,
+               item_count=long)
+def copy_primitive_list(builder, pos, item_type, lst):
+    """
+    Write a list of primitives: lst is memcpy()ed if it supports the buffer
+    protocol with the right layout, else its items are written in a tight loop.
+    """
+    item_count = len(lst)
+    pos = builder.alloc_list(pos, item_type.size_tag, item_count,
+                             item_type.item_length * item_count)
+    raw = as_raw_column(lst, chr(item_type.ifmt))
+    if raw is not None:
+        builder.write_strided(pos, item_type.item_length, raw)
+    else:
+        builder.write_array(pos, item_type.ifmt, lst)
+
+
+@cython.ccall
+@cython.locals(builder=SegmentBuilder, pos=long, item_type=StructItemType,
+               item_count=long, data_size=long, ptrs_size=long, total_words=long,
+               tag=long)
+def alloc_struct_list(builder, pos, item_type, item_count):
+    """
+    Allocate a composite list of ``item_count`` structs and write its
+    tag. Return the position of the first item.
+    """
+    data_size = item_type.static_data_size
+    ptrs_size = item_type.static_ptrs_size
+    total_words = (data_size+ptrs_size) * item_count
+    pos = builder.alloc_list(pos, ptr.LIST_SIZE_COMPOSITE, total_words,
+                             total_words*8 + 8) # +8 is for the tag
+    tag = ptr.new_struct(item_count, data_size, ptrs_size)
+    builder.write_int64(pos, tag)
+    return pos + 8
+
+
+@cython.ccall
+@cython.locals(builder=SegmentBuilder, pos=long, item_type=StructItemType,
+               item_count=long, item_length=long, offset=long)
+def copy_from_columns(builder, pos, item_type, columns):
+    """
+    Write a composite list of structs whose fields are taken from
+    ``columns``, a dict {fieldname: sequence}. Only the fields listed in
+    ``Struct._data_fields()`` are supported; the missing ones are left to 0.
+
+    Columns which support the buffer protocol and whose items have the same
+    binary layout as the field are memcpy()ed.
+    """
+    fields = {}
+    for name, offset, fmt in item_type.structcls._data_fields():
+        fields[name] = (offset, fmt)
+    #
+    item_count = -1
+    for name, col in columns.items():
+        if name not in fields:
+            raise TypeError("Cannot build a list of %s from the column '%s': "
+                            "only primitive and enum fields are supported" %
+                            (item_type.structcls.__name__, name))
+        if item_count == -1:
+            item_count = len(col)
+        elif len(col) != item_count:
+            raise ValueError("All the columns must have the same length")
+    if item_count == -1:
+        raise TypeError("You need to specify at least one column")
+    #
+    pos = alloc_struct_list(builder, pos, item_type, item_count)
+    item_length = item_type.item_length
+    for name, col in columns.items():
+        offset, fmt = fields[name]
+        raw = as_raw_column(col, fmt)
+        if raw is not None:
+            builder.write_strided(pos + offset, item_length, raw)
+        else:
+            write_column(builder, pos + offset, item_length, ord(fmt), col)
+
+
+@cython.ccall
+@cython.locals(builder=SegmentBuilder, pos=long, item_type=StructItemType,
+               item_count=long, item_length=long, n=long, i=long, row=tuple)
+def copy_from_rows(builder, pos, item_type, rows):
+    """
+    Write a composite list of structs, one for each of the given rows. Each
+    row is a tuple containing the values of the fields listed in
+    ``Struct._data_fields()``, in the same order.
+    """
+    fields = item_type.structcls._data_fields()
+    offsets = [offset for _, offset, _ in fields]
+    ifmts = [ord(fmt) for _, _, fmt in fields]
+    n = len(fields)
+    rows = [tuple(row) for row in rows]
+    item_count = len(rows)
+    item_length = item_type.item_length
+    pos = alloc_struct_list(builder, pos, item_type, item_count)
+    for row in rows:
+        if len(row) != n:
+            names = ', '.join([name for name, _, _ in fields])
+            raise ValueError("Expected rows of %d items (%s), got %d" %
+                             (n, names, len(row)))
+        for i in range(n):
+            builder.write_generic(ifmts[i], pos + offsets[i], row[i])
+        pos += item_length
+
+
+@cython.cfunc
+@cython.locals(builder=SegmentBuilder, pos=long, stride=long, ifmt=long)
+def write_column(builder, pos, stride, ifmt, col):
+    for value in col:
+        builder.write_generic(ifmt, pos, value)
+        pos += stride
+
+
+# map each struct format char to its kind: signed, unsigned or float
+_FMT_KIND = {'b': 'i', 'h': 'i', 'i': 'i', 'l': 'i', 'q': 'i',
+             'B': 'u', 'H': 'u', 'I': 'u', 'L': 'u', 'Q': 'u',
+             'f': 'f', 'd': 'f'}
+
+def as_raw_column(col, fmt):
+    """
+    If ``col`` supports the buffer protocol and its items have exactly the
+    same binary representation of the capnproto field described by ``fmt``,
+    return a memoryview over it. Else, return None.
+    """
+    if sys.byteorder != 'little':
+        return None
+    try:
+        view = memoryview(col)
+    except TypeError:
+        return None
+    colfmt = view.format
+    if colfmt[:1] in ('@', '=', '<'):
+        colfmt = colfmt[1:]
+    if (view.ndim != 1 or
+        view.strides[0] != view.itemsize or
+        view.itemsize != struct.calcsize('<' + fmt) or
+        _FMT_KIND.get(colfmt) != _FMT_KIND[fmt]):
+        return None
+    return view
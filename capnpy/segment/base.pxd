@@ -21,4 +21,14 @@ cdef class BaseSegment(object):
     cdef uint8_t read_uint8(self, Py_ssize_t offset) except? 0xff
     cdef double read_double(self, Py_ssize_t offset) except? -1
     cdef float read_float(self, Py_ssize_t offset) except? -1
+    cdef bint eq_primitive(self, Py_ssize_t offset, BaseSegment other,
+                           Py_ssize_t other_offset, char ifmt) except -1
+    cdef bint eq_bytes(self, Py_ssize_t offset, BaseSegment other,
+                       Py_ssize_t other_offset, Py_ssize_t size) except -1
+    cdef int cmp_primitive(self, Py_ssize_t offset, BaseSegment other,
+                           Py_ssize_t other_offset, char ifmt) except -2
+    cdef int cmp_bytes(self, Py_ssize_t offset, BaseSegment other,
+                       Py_ssize_t other_offset, Py_ssize_t size) except -2
+    cdef object decode_utf8(self, Py_ssize_t offset, Py_ssize_t size)
+    cdef object decode_utf8_interned(self, Py_ssize_t offset, Py_ssize_t size)
     cdef object dump_message(self, long p, Py_ssize_t start, Py_ssize_t end)
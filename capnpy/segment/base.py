@@ -23,6 +23,14 @@ else:
     mychr = int2byte
 
 
+# the table used by decode_utf8_interned, i.e. by the $Py.text("intern")
+# fields: it maps the raw bytes to the decoded strings. It is meant for
+# low-cardinality values, so we stop adding new entries after a while, to
+# avoid using unbounded memory
+_interned_text = {}
+MAX_INTERNED_TEXT = 10000
+
+
 def unpack_uint32(buf, offset):
     if offset < 0 or offset + 4 > len(buf):
         raise IndexError('Offset out of bounds: %d' % offset)
@@ -74,6 +82,50 @@ class BaseSegment(object):
     def read_float(self, offset):
         return self.read_primitive(offset, ord('f'))
 
+    def eq_primitive(self, offset, other, other_offset, ifmt):
+        return (self.read_primitive(offset, ifmt) ==
+                other.read_primitive(other_offset, ifmt))
+
+    def eq_bytes(self, offset, other, other_offset, size):
+        if offset < 0 or offset + size > len(self.buf):
+            raise IndexError('Offset out of bounds: %d' % (offset+size))
+        if other_offset < 0 or other_offset + size > len(other.buf):
+            raise IndexError('Offset out of bounds: %d' % (other_offset+size))
+        return (self.buf[offset:offset+size] ==
+                other.buf[other_offset:other_offset+size])
+
+    def cmp_primitive(self, offset, other, other_offset, ifmt):
+        if mychr(ifmt) in b'df':
+            raise ValueError('unsupported fmt %s' % chr(ifmt))
+        a = self.read_primitive(offset, ifmt)
+        b = other.read_primitive(other_offset, ifmt)
+        return (a > b) - (a < b)
+
+    def cmp_bytes(self, offset, other, other_offset, size):
+        if offset < 0 or offset + size > len(self.buf):
+            raise IndexError('Offset out of bounds: %d' % (offset+size))
+        if other_offset < 0 or other_offset + size > len(other.buf):
+            raise IndexError('Offset out of bounds: %d' % (other_offset+size))
+        a = self.buf[offset:offset+size]
+        b = other.buf[other_offset:other_offset+size]
+        return (a > b) - (a < b)
+
+    def decode_utf8(self, offset, size):
+        if offset < 0 or offset + size > len(self.buf):
+            raise IndexError('Offset out of bounds: %d' % (offset+size))
+        return self.buf[offset:offset+size].decode('utf-8')
+
+    def decode_utf8_interned(self, offset, size):
+        if offset < 0 or offset + size > len(self.buf):
+            raise IndexError('Offset out of bounds: %d' % (offset+size))
+        s = self.buf[offset:offset+size]
+        res = _interned_text.get(s)
+        if res is None:
+            res = s.decode('utf-8')
+            if len(_interned_text) < MAX_INTERNED_TEXT:
+                _interned_text[s] = res
+        return res
+
     def dump_message(self, p, start, end):
         maxlen = len(self.buf)
         if start < 0 or start > end or end > maxlen:
@@ -1,9 +1,12 @@
 cimport cython
-from libc.string cimport memcpy
+from libc.string cimport memcpy, memcmp
 from libc.stdint cimport (int8_t, uint8_t, int16_t, uint16_t,
                           uint32_t, int32_t, int64_t, uint64_t, INT64_MAX)
 
+from cpython.unicode cimport PyUnicode_DecodeUTF8
+from cpython.ref cimport PyObject, Py_INCREF
 from capnpy cimport ptr
+from capnpy cimport _hash
 
 cdef extern from "_util.h":
     cdef Py_ssize_t _PyString_GET_SIZE(object string)
@@ -11,6 +14,24 @@ cdef extern from "_util.h":
     cdef bytes _PyString_FromStringAndSize(char *v, Py_ssize_t len)
 
 
+# the table used by decode_utf8_interned: see base.py. Here it is an
+# open-addressing hash table indexed by the hash of the raw bytes, so that we
+# can look up a string directly in the buffer, without slicing it first. The
+# entries are never removed: the table is bigger than MAX_INTERNED_TEXT, so
+# that there are always free slots
+cdef enum:
+    MAX_INTERNED_TEXT = 10000
+    INTERNED_TABLE_SIZE = 16384 # must be a power of 2
+
+cdef struct InternedText:
+    long h
+    PyObject *raw  # bytes
+    PyObject *text # unicode
+
+cdef InternedText interned_table[INTERNED_TABLE_SIZE]
+cdef long interned_count = 0
+
+
 cpdef uint32_t unpack_uint32(bytes buf, Py_ssize_t offset) except? 0xffffffff:
     cdef const char *cbuf = _PyString_AS_STRING(buf)
     cdef Py_ssize_t buflen = _PyString_GET_SIZE(buf)
@@ -131,6 +152,111 @@ cdef class BaseSegment(object):
         self.check_bounds(4, offset)
         return (<float*>(self.cbuf+offset))[0]
 
+    @cython.final
+    cdef bint eq_primitive(self, Py_ssize_t offset, BaseSegment other,
+                           Py_ssize_t other_offset, char ifmt) except -1:
+        # floats are compared by value, to get the right semantics for NaN
+        # and -0.0; everything else can be compared bit by bit
+        if ifmt == 'd':
+            return self.read_double(offset) == other.read_double(other_offset)
+        elif ifmt == 'f':
+            return self.read_float(offset) == other.read_float(other_offset)
+        elif ifmt == 'q' or ifmt == 'Q':
+            return self.eq_bytes(offset, other, other_offset, 8)
+        elif ifmt == 'i' or ifmt == 'I':
+            return self.eq_bytes(offset, other, other_offset, 4)
+        elif ifmt == 'h' or ifmt == 'H':
+            return self.eq_bytes(offset, other, other_offset, 2)
+        elif ifmt == 'b' or ifmt == 'B':
+            return self.eq_bytes(offset, other, other_offset, 1)
+        raise ValueError('unknown fmt %s' % chr(ifmt))
+
+    @cython.final
+    cdef bint eq_bytes(self, Py_ssize_t offset, BaseSegment other,
+                       Py_ssize_t other_offset, Py_ssize_t size) except -1:
+        self.check_bounds(size, offset)
+        other.check_bounds(size, other_offset)
+        return memcmp(self.cbuf+offset, other.cbuf+other_offset, size) == 0
+
+    @cython.final
+    cdef int cmp_primitive(self, Py_ssize_t offset, BaseSegment other,
+                           Py_ssize_t other_offset, char ifmt) except -2:
+        # three-way comparison of two integers: return -1, 0 or 1
+        cdef int64_t a, b
+        cdef uint64_t ua, ub
+        if ifmt == 'Q':
+            ua = self.read_uint64(offset)
+            ub = other.read_uint64(other_offset)
+            return (ua > ub) - (ua < ub)
+        elif ifmt == 'q':
+            a = self.read_int64(offset)
+            b = other.read_int64(other_offset)
+        elif ifmt == 'i':
+            a = self.read_int32(offset)
+            b = other.read_int32(other_offset)
+        elif ifmt == 'I':
+            a = self.read_uint32(offset)
+            b = other.read_uint32(other_offset)
+        elif ifmt == 'h':
+            a = self.read_int16(offset)
+            b = other.read_int16(other_offset)
+        elif ifmt == 'H':
+            a = self.read_uint16(offset)
+            b = other.read_uint16(other_offset)
+        elif ifmt == 'b':
+            a = self.read_int8(offset)
+            b = other.read_int8(other_offset)
+        elif ifmt == 'B':
+            a = self.read_uint8(offset)
+            b = other.read_uint8(other_offset)
+        else:
+            raise ValueError('unsupported fmt %s' % chr(ifmt))
+        return (a > b) - (a < b)
+
+    @cython.final
+    cdef int cmp_bytes(self, Py_ssize_t offset, BaseSegment other,
+                       Py_ssize_t other_offset, Py_ssize_t size) except -2:
+        cdef int res
+        self.check_bounds(size, offset)
+        other.check_bounds(size, other_offset)
+        res = memcmp(self.cbuf+offset, other.cbuf+other_offset, size)
+        return (res > 0) - (res < 0)
+
+    @cython.final
+    cdef object decode_utf8(self, Py_ssize_t offset, Py_ssize_t size):
+        # decode directly from the buffer, without making a copy first
+        self.check_bounds(size, offset)
+        return PyUnicode_DecodeUTF8(self.cbuf+offset, size, NULL)
+
+    @cython.final
+    cdef object decode_utf8_interned(self, Py_ssize_t offset, Py_ssize_t size):
+        global interned_count
+        cdef long h, i
+        cdef InternedText *entry
+        cdef bytes raw
+        self.check_bounds(size, offset)
+        h = _hash.strhash(self.buf, offset, size)
+        i = h & (INTERNED_TABLE_SIZE-1)
+        while interned_table[i].raw != NULL:
+            entry = &interned_table[i]
+            raw = <bytes>entry.raw
+            if (entry.h == h and _PyString_GET_SIZE(raw) == size and
+                memcmp(_PyString_AS_STRING(raw), self.cbuf+offset, size) == 0):
+                return <object>entry.text
+            i = (i + 1) & (INTERNED_TABLE_SIZE-1)
+        #
+        # not found: this is the only case in which we make a copy
+        text = PyUnicode_DecodeUTF8(self.cbuf+offset, size, NULL)
+        if interned_count < MAX_INTERNED_TEXT:
+            raw = _PyString_FromStringAndSize(<char*>self.cbuf+offset, size)
+            Py_INCREF(raw)
+            Py_INCREF(text)
+            interned_table[i].h = h
+            interned_table[i].raw = <PyObject*>raw
+            interned_table[i].text = <PyObject*>text
+            interned_count += 1
+        return text
+
     @cython.final
     cdef object dump_message(self, long p, Py_ssize_t start, Py_ssize_t end):
         cdef Py_ssize_t maxlen = _PyString_GET_SIZE(self.buf)
@@ -196,5 +322,27 @@ cdef class BaseSegmentForTests(object):
     def read_float(self, Py_ssize_t offset):
         return self.s.read_float(offset)
 
+    def eq_primitive(self, Py_ssize_t offset, BaseSegmentForTests other,
+                     Py_ssize_t other_offset, char ifmt):
+        return self.s.eq_primitive(offset, other.s, other_offset, ifmt)
+
+    def eq_bytes(self, Py_ssize_t offset, BaseSegmentForTests other,
+                 Py_ssize_t other_offset, Py_ssize_t size):
+        return self.s.eq_bytes(offset, other.s, other_offset, size)
+
+    def cmp_primitive(self, Py_ssize_t offset, BaseSegmentForTests other,
+                      Py_ssize_t other_offset, char ifmt):
+        return self.s.cmp_primitive(offset, other.s, other_offset, ifmt)
+
+    def cmp_bytes(self, Py_ssize_t offset, BaseSegmentForTests other,
+                  Py_ssize_t other_offset, Py_ssize_t size):
+        return self.s.cmp_bytes(offset, other.s, other_offset, size)
+
+    def decode_utf8(self, Py_ssize_t offset, Py_ssize_t size):
+        return self.s.decode_utf8(offset, size)
+
+    def decode_utf8_interned(self, Py_ssize_t offset, Py_ssize_t size):
+        return self.s.decode_utf8_interned(offset, size)
+
     def dump_message(self, long p, Py_ssize_t start, Py_ssize_t end):
         return self.s.dump_message(p, start, end)
@@ -30,7 +30,10 @@ cdef class SegmentBuilder(object):
     cpdef void write_float32(self, Py_ssize_t i, float value)
     cpdef void write_float64(self, Py_ssize_t i, double value)
     cpdef void write_bool(self, Py_ssize_t byteoffset, int bitoffset, bint value)
+    cpdef write_array(self, Py_ssize_t i, char ifmt, object items)
+    cpdef write_bits(self, Py_ssize_t i, object items)
     cpdef void write_slice(self, Py_ssize_t i, BaseSegment src, Py_ssize_t start, Py_ssize_t n)
+    cpdef write_strided(self, Py_ssize_t pos, Py_ssize_t stride, object src)
 
     cpdef Py_ssize_t allocate(self, Py_ssize_t length)
     cpdef Py_ssize_t alloc_struct(self, Py_ssize_t pos, long data_size, long ptrs_size)
@@ -38,9 +41,16 @@ cdef class SegmentBuilder(object):
                                 long body_length)
     cpdef Py_ssize_t alloc_text(self, Py_ssize_t pos, bytes s, long trailing_zero=*)
     cpdef Py_ssize_t alloc_data(self, Py_ssize_t pos, bytes s)
+    cpdef Py_ssize_t alloc_text_list(self, Py_ssize_t pos, object items,
+                                     long trailing_zero=*) except -1
     cpdef copy_from_pointer(self, Py_ssize_t dst_pos, BaseSegment src, long p,
                             Py_ssize_t src_pos)
-    cpdef copy_from_struct(self, Py_ssize_t dst_pos, type structcls, Struct value)
+    cpdef copy_from_struct(self, Py_ssize_t dst_pos, type structcls, object value)
+    cpdef alloc_struct_from_args(self, Py_ssize_t dst_pos, type structcls,
+                                 object args)
+    cpdef write_struct_args(self, Py_ssize_t pos, type structcls, object args)
     cpdef copy_inline_struct(self, Py_ssize_t dst_pos, BaseSegment src,
                              long p, Py_ssize_t src_pos)
     cpdef copy_from_list(self, Py_ssize_t pos, item_type, lst)
+    cpdef copy_from_columns(self, Py_ssize_t pos, item_type, columns)
+    cpdef copy_from_rows(self, Py_ssize_t pos, item_type, rows)
@@ -58,9 +58,45 @@ class SegmentBuilder(object):
         current |= (value << bitoffset)
         struct.pack_into('B', self.buf, byteoffset, current)
 
+    def write_array(self, i, ifmt, items):
+        """
+        Write all the ``items`` one after the other starting at position i,
+        using the given primitive format.
+        """
+        items = list(items)
+        fmt = '%d%s' % (len(items), mychr(ifmt))
+        struct.pack_into(fmt, self.buf, i, *items)
+
+    def write_bits(self, i, items):
+        """
+        Write ``items`` as a packed sequence of bits, starting at position i.
+        """
+        buf = self.buf
+        j = 0
+        for item in items:
+            if item:
+                buf[i + (j >> 3)] |= 1 << (j & 7)
+            j += 1
+
     def write_slice(self, i, src, start, n):
         self.buf[i:i+n] = src.buf[start:start+n]
 
+    def write_strided(self, pos, stride, src):
+        """
+        Copy the items of ``src`` (any object supporting the buffer protocol)
+        into the buffer, starting at ``pos`` and placing each item ``stride``
+        bytes apart from the previous one.
+        """
+        view = memoryview(src)
+        itemsize = view.itemsize
+        data = view.tobytes()
+        if stride == itemsize:
+            self.buf[pos:pos+len(data)] = data
+            return
+        for start in range(0, len(data), itemsize):
+            self.buf[pos:pos+itemsize] = data[start:start+itemsize]
+            pos += stride
+
     def allocate(self, length):
         # XXX: check whether there is a better method to zero-extend the array in PyPy
         result = len(self.buf)
@@ -107,15 +143,65 @@ class SegmentBuilder(object):
     def alloc_data(self, pos, s):
         return self.alloc_text(pos, s, trailing_zero=0)
 
+    def alloc_text_list(self, pos, items, trailing_zero=1):
+        """
+        Allocate a list of texts (or datas, if trailing_zero==0) and write the
+        resulting pointer at position pos. The bodies of all the items are
+        allocated at once, right after the list of pointers.
+        """
+        items = [ensure_bytes(s) if s is not None else None for s in items]
+        item_count = len(items)
+        total = 0
+        for s in items:
+            if s is not None:
+                total += ptr.round_up_to_word(len(s) + trailing_zero)
+        result = self.alloc_list(pos, ptr.LIST_SIZE_PTR, item_count, item_count*8)
+        body = self.allocate(total)
+        pos = result
+        for s in items:
+            if s is not None:
+                n = len(s)
+                nn = n + trailing_zero
+                p = ptr.new_list((body-(pos+8))//8, ptr.LIST_SIZE_8, nn)
+                self.write_int64(pos, p)
+                self.buf[body:body+n] = s
+                body += ptr.round_up_to_word(nn)
+            pos += 8
+        return result
+
     def copy_from_struct(self, dst_pos, structcls, value):
         if value is None:
             self.write_int64(dst_pos, 0)
             return
+        if isinstance(value, (tuple, dict)):
+            self.alloc_struct_from_args(dst_pos, structcls, value)
+            return
         if not isinstance(value, structcls):
             raise TypeError("Expected %s instance, got %s" %
                             (structcls.__class__.__name__, value))
         self.copy_from_pointer(dst_pos, value._seg, value._as_pointer(0), 0)
 
+    def alloc_struct_from_args(self, dst_pos, structcls, args):
+        """
+        Allocate a new struct of type ``structcls``, write the resulting
+        pointer at position dst_pos and fill its fields with ``args``, which
+        is either a tuple of positional arguments or a dict of keyword
+        arguments for the ctor of ``structcls``.
+        """
+        pos = self.alloc_struct(dst_pos, structcls.__static_data_size__,
+                                structcls.__static_ptrs_size__)
+        self.write_struct_args(pos, structcls, args)
+
+    def write_struct_args(self, pos, structcls, args):
+        """
+        Fill the struct of type ``structcls`` which has already been allocated
+        at position pos, without building an intermediate message
+        """
+        if isinstance(args, dict):
+            structcls._write_fields(self, pos, **args)
+        else:
+            structcls._write_fields(self, pos, *args)
+
     def copy_from_pointer(self, dst_pos, src, p, src_pos):
         return copy_pointer(src, p, src_pos, self, dst_pos)
 
@@ -132,5 +218,13 @@ class SegmentBuilder(object):
     def copy_from_list(self, pos, item_type, lst):
         return copy_from_list(self, pos, item_type, lst)
 
+    def copy_from_columns(self, pos, item_type, columns):
+        return copy_from_columns(self, pos, item_type, columns)
+
+    def copy_from_rows(self, pos, item_type, rows):
+        return copy_from_rows(self, pos, item_type, rows)
+
+
 from capnpy.segment._copy_pointer import copy_pointer, _copy_struct_inline
-from capnpy.segment._copy_list import copy_from_list
+from capnpy.segment._copy_list import (copy_from_list, copy_from_columns,
+                                       copy_from_rows)
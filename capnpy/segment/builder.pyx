@@ -5,7 +5,11 @@ from libc.string cimport memcpy, memset
 
 from capnpy.segment.base cimport BaseSegment
 from capnpy.struct_ cimport Struct
-from capnpy.list cimport List, ItemType, StructItemType
+from capnpy.list cimport (List, ItemType, StructItemType, PrimitiveItemType,
+                          TextItemType)
+
+from cpython.buffer cimport PyObject_GetBuffer, PyBuffer_Release, PyBUF_ND
+from capnpy.util import ensure_bytes
 
 cdef extern from "Python.h":
     int PyByteArray_Resize(object o, Py_ssize_t len)
@@ -113,12 +117,96 @@ cdef class SegmentBuilder(object):
         current |= (value << bitoffset)
         (<uint8_t*>(self.cbuf+byteoffset))[0] = current
 
+    cpdef write_array(self, Py_ssize_t i, char ifmt, object items):
+        """
+        Write all the ``items`` one after the other starting at position i,
+        using the given primitive format.
+        """
+        # the dispatch on ifmt is done once, outside the loops
+        if ifmt == 'q':
+            for item in items:
+                (<int64_t*>(self.cbuf+i))[0] = item
+                i += 8
+        elif ifmt == 'Q':
+            for item in items:
+                (<uint64_t*>(self.cbuf+i))[0] = item
+                i += 8
+        elif ifmt == 'd':
+            for item in items:
+                (<double*>(self.cbuf+i))[0] = item
+                i += 8
+        elif ifmt == 'f':
+            for item in items:
+                (<float*>(self.cbuf+i))[0] = item
+                i += 4
+        elif ifmt == 'i':
+            for item in items:
+                (<int32_t*>(self.cbuf+i))[0] = item
+                i += 4
+        elif ifmt == 'I':
+            for item in items:
+                (<uint32_t*>(self.cbuf+i))[0] = item
+                i += 4
+        elif ifmt == 'h':
+            for item in items:
+                (<int16_t*>(self.cbuf+i))[0] = item
+                i += 2
+        elif ifmt == 'H':
+            for item in items:
+                (<uint16_t*>(self.cbuf+i))[0] = item
+                i += 2
+        elif ifmt == 'b':
+            for item in items:
+                (<int8_t*>(self.cbuf+i))[0] = item
+                i += 1
+        elif ifmt == 'B':
+            for item in items:
+                (<uint8_t*>(self.cbuf+i))[0] = item
+                i += 1
+        else:
+            raise ValueError('unknown fmt %s' % chr(ifmt))
+
+    cpdef write_bits(self, Py_ssize_t i, object items):
+        """
+        Write ``items`` as a packed sequence of bits, starting at position i.
+        """
+        cdef Py_ssize_t j = 0
+        cdef uint8_t* p = <uint8_t*>(self.cbuf+i)
+        for item in items:
+            if item:
+                p[j >> 3] |= 1 << (j & 7)
+            j += 1
+
     cpdef void write_slice(self, Py_ssize_t i, BaseSegment src,
                            Py_ssize_t start, Py_ssize_t n):
         cdef void* pdst = self.cbuf + i
         cdef const void* psrc = src.cbuf + start
         memcpy(pdst, psrc, n)
 
+    cpdef write_strided(self, Py_ssize_t pos, Py_ssize_t stride, object src):
+        """
+        Copy the items of ``src`` (any object supporting the buffer protocol)
+        into the buffer, starting at ``pos`` and placing each item ``stride``
+        bytes apart from the previous one.
+        """
+        cdef Py_buffer view
+        cdef Py_ssize_t itemsize, n, i
+        cdef const char* psrc
+        PyObject_GetBuffer(src, &view, PyBUF_ND)
+        try:
+            itemsize = view.itemsize
+            n = view.len // itemsize
+            psrc = <const char*>view.buf
+            if stride == itemsize:
+                memcpy(self.cbuf+pos, psrc, view.len)
+                return
+            for i in range(n):
+                memcpy(self.cbuf+pos, psrc, itemsize)
+                psrc += itemsize
+                pos += stride
+        finally:
+            PyBuffer_Release(&view)
+
     cpdef Py_ssize_t allocate(self, Py_ssize_t length):
         """
         Allocate ``length`` bytes of memory inside the buffer. Return the start
@@ -171,14 +259,71 @@ cdef class SegmentBuilder(object):
     cpdef Py_ssize_t alloc_data(self, Py_ssize_t pos, bytes s):
         return self.alloc_text(pos, s, trailing_zero=0)
 
-    cpdef copy_from_struct(self, Py_ssize_t dst_pos, type structcls, Struct value):
+    cpdef Py_ssize_t alloc_text_list(self, Py_ssize_t pos, object items,
+                                     long trailing_zero=1) except -1:
+        """
+        Allocate a list of texts (or datas, if trailing_zero==0) and write the
+        resulting pointer at position pos. The bodies of all the items are
+        allocated at once, right after the list of pointers.
+        """
+        cdef bytes s
+        cdef Py_ssize_t n, nn
+        items = [ensure_bytes(x) if x is not None else None for x in items]
+        cdef Py_ssize_t item_count = len(items)
+        cdef Py_ssize_t total = 0
+        for s in items:
+            if s is not None:
+                total += round_to_word(_PyString_GET_SIZE(s) + trailing_zero)
+        cdef Py_ssize_t result = self.alloc_list(pos, ptr.LIST_SIZE_PTR,
+                                                 item_count, item_count*8)
+        cdef Py_ssize_t body = self.allocate(total)
+        pos = result
+        for s in items:
+            if s is not None:
+                n = _PyString_GET_SIZE(s)
+                nn = n + trailing_zero
+                self.write_int64(pos, ptr.new_list((body-(pos+8))/8,
+                                                   ptr.LIST_SIZE_8, nn))
+                memcpy(self.cbuf+body, _PyString_AS_STRING(s), n)
+                body += round_to_word(nn)
+            pos += 8
+        return result
+
+    cpdef copy_from_struct(self, Py_ssize_t dst_pos, type structcls, object value):
         if value is None:
             self.write_int64(dst_pos, 0)
             return
+        if isinstance(value, (tuple, dict)):
+            self.alloc_struct_from_args(dst_pos, structcls, value)
+            return
         if not isinstance(value, structcls):
             raise TypeError("Expected %s instance, got %s" %
                             (structcls.__class__.__name__, value))
-        self.copy_from_pointer(dst_pos, value._seg, value._as_pointer(0), 0)
+        self.copy_from_pointer(dst_pos, (<Struct>value)._seg,
+                               (<Struct>value)._as_pointer(0), 0)
+
+    cpdef alloc_struct_from_args(self, Py_ssize_t dst_pos, type structcls,
+                                 object args):
+        """
+        Allocate a new struct of type ``structcls``, write the resulting
+        pointer at position dst_pos and fill its fields with ``args``, which
+        is either a tuple of positional arguments or a dict of keyword
+        arguments for the ctor of ``structcls``.
+        """
+        cdef Py_ssize_t pos
+        pos = self.alloc_struct(dst_pos, structcls.__static_data_size__,
+                                structcls.__static_ptrs_size__)
+        self.write_struct_args(pos, structcls, args)
+
+    cpdef write_struct_args(self, Py_ssize_t pos, type structcls, object args):
+        """
+        Fill the struct of type ``structcls`` which has already been allocated
+        at position pos, without building an intermediate message
+        """
+        if isinstance(args, dict):
+            structcls._write_fields(self, pos, **args)
+        else:
+            structcls._write_fields(self, pos, *args)
 
     cpdef copy_from_pointer(self, Py_ssize_t dst_pos, BaseSegment src, long p,
                             Py_ssize_t src_pos):
@@ -198,6 +343,12 @@ cdef class SegmentBuilder(object):
     cpdef copy_from_list(self, Py_ssize_t pos, item_type, lst):
         return copy_from_list(self, pos, item_type, lst)
 
+    cpdef copy_from_columns(self, Py_ssize_t pos, item_type, columns):
+        return copy_from_columns(self, pos, item_type, columns)
+
+    cpdef copy_from_rows(self, Py_ssize_t pos, item_type, rows):
+        return copy_from_rows(self, pos, item_type, rows)
+
 # we need to play weird tricks to be able to use the copy_pointer algo both
 # for Cython and PyPy AND to have very good performance. See the big comment
 # at the beginning of _copy_pointer.py for an explanation
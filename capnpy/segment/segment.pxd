@@ -11,9 +11,26 @@ cdef class Segment(BaseSegment):
     @cython.locals(p=long, start=long, end=long)
     cpdef read_str(self, long p, long offset, default_, int additional_size)
 
+    @cython.locals(p=long, start=long, end=long)
+    cpdef read_str_view(self, long p, long offset, default_, int additional_size)
+
+    @cython.locals(p=long, start=long, size=long)
+    cpdef read_unicode(self, long p, long offset, default_, int additional_size)
+
+    @cython.locals(p=long, start=long, size=long)
+    cpdef read_unicode_interned(self, long p, long offset)
+
     @cython.locals(p=long, start=long, size=long)
     cpdef long hash_str(self, long p, long offset, long default_, int additional_size) except -1
 
+    @cython.locals(size=long, start=long, other_start=long)
+    cpdef bint eq_str(self, long p, long offset, Segment other, long other_p,
+                      long other_offset, int additional_size) except -1
+
+    @cython.locals(size=long, other_size=long, start=long, other_start=long, res=int)
+    cpdef int cmp_str(self, long p, long offset, Segment other, long other_p,
+                      long other_offset, int additional_size) except -2
+
 
 cdef class MultiSegment(Segment):
     cdef readonly object segment_offsets
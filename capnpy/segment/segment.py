@@ -49,6 +49,44 @@ class Segment(BaseSegment):
         end = start + ptr.list_item_count(p) + additional_size
         return self.buf[start:end]
 
+    def read_str_view(self, p, offset, default_, additional_size):
+        """
+        Same as read_str, but return a read-only memoryview over the buffer
+        instead of copying the string. The memoryview keeps the buffer alive.
+        """
+        if p == 0:
+            return default_
+        assert ptr.kind(p) == ptr.LIST
+        assert ptr.list_size_tag(p) == ptr.LIST_SIZE_8
+        start = ptr.deref(p, offset)
+        end = start + ptr.list_item_count(p) + additional_size
+        return memoryview(self.buf)[start:end]
+
+    def read_unicode(self, p, offset, default_, additional_size):
+        """
+        Same as read_str, but decode the string as UTF-8
+        """
+        if p == 0:
+            return default_
+        assert ptr.kind(p) == ptr.LIST
+        assert ptr.list_size_tag(p) == ptr.LIST_SIZE_8
+        start = ptr.deref(p, offset)
+        size = ptr.list_item_count(p) + additional_size
+        return self.decode_utf8(start, size)
+
+    def read_unicode_interned(self, p, offset):
+        """
+        Same as read_unicode, but share the decoded strings through a global
+        table: see BaseSegment.decode_utf8_interned
+        """
+        if p == 0:
+            return None
+        assert ptr.kind(p) == ptr.LIST
+        assert ptr.list_size_tag(p) == ptr.LIST_SIZE_8
+        start = ptr.deref(p, offset)
+        size = ptr.list_item_count(p) - 1
+        return self.decode_utf8_interned(start, size)
+
     def hash_str(self, p, offset, default_, additional_size):
         if p == 0:
             return default_
@@ -58,6 +96,50 @@ class Segment(BaseSegment):
         size = ptr.list_item_count(p) + additional_size
         return _hash.strhash(self.buf, start, size)
 
+    def eq_str(self, p, offset, other, other_p, other_offset, additional_size):
+        """
+        Compare the Text or Data pointed by ``p`` with the one pointed by
+        ``other_p`` inside the segment ``other``, without reading them into
+        new strings. Two NULL pointers compare equal, but a NULL pointer is
+        different than an empty string.
+        """
+        if p == 0 or other_p == 0:
+            return p == other_p
+        assert ptr.kind(p) == ptr.LIST
+        assert ptr.list_size_tag(p) == ptr.LIST_SIZE_8
+        assert ptr.kind(other_p) == ptr.LIST
+        assert ptr.list_size_tag(other_p) == ptr.LIST_SIZE_8
+        size = ptr.list_item_count(p)
+        if size != ptr.list_item_count(other_p):
+            return False
+        start = ptr.deref(p, offset)
+        other_start = ptr.deref(other_p, other_offset)
+        return self.eq_bytes(start, other, other_start, size + additional_size)
+
+    def cmp_str(self, p, offset, other, other_p, other_offset, additional_size):
+        """
+        Three-way comparison of the Text or Data pointed by ``p`` with the one
+        pointed by ``other_p`` inside the segment ``other``: return -1, 0 or
+        1. Like None and bytes, a NULL pointer cannot be ordered with respect
+        to a non-NULL one.
+        """
+        if p == 0 or other_p == 0:
+            if p == other_p:
+                return 0
+            raise TypeError("Cannot compare NULL with a Text/Data")
+        assert ptr.kind(p) == ptr.LIST
+        assert ptr.list_size_tag(p) == ptr.LIST_SIZE_8
+        assert ptr.kind(other_p) == ptr.LIST
+        assert ptr.list_size_tag(other_p) == ptr.LIST_SIZE_8
+        size = ptr.list_item_count(p) + additional_size
+        other_size = ptr.list_item_count(other_p) + additional_size
+        start = ptr.deref(p, offset)
+        other_start = ptr.deref(other_p, other_offset)
+        res = self.cmp_bytes(start, other, other_start, min(size, other_size))
+        if res == 0:
+            res = (size > other_size) - (size < other_size)
+        return res
+
     def _print(self, **kwds):
         p = BufferPrinter(self.buf)
         p.printbuf(start=0, end=None, **kwds)
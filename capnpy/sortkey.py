@@ -0,0 +1,57 @@
+"""
+Encode the values of the $Py.key fields as bytes, in such a way that the
+lexicographical order of the encoded strings is the same as the order of the
+original values. The generated sort_key() methods concatenate the encoding of
+each field: since every encoding is self-delimiting, the order of the
+concatenation is the same as the order of the key tuples.
+"""
+
+import struct
+
+_STRUCTS = dict((fmt, struct.Struct('>' + fmt)) for fmt in 'BHIQ')
+_UNSIGNED = {'b': 'B', 'h': 'H', 'i': 'I', 'q': 'Q'}
+_NULL = b'\x00'
+_NOT_NULL = b'\x01'
+
+def encode_int(value, fmt):
+    # signed integers are shifted so that the smallest value becomes 0, then
+    # everything is encoded as a big endian unsigned
+    ufmt = _UNSIGNED.get(fmt)
+    if ufmt is not None:
+        value += 1 << (struct.calcsize(fmt)*8 - 1)
+        fmt = ufmt
+    return _STRUCTS[fmt].pack(value)
+
+def encode_bool(value):
+    return b'\x01' if value else b'\x00'
+
+def encode_float(value, fmt):
+    # the IEEE 754 representation is already ordered if we interpret it as
+    # sign-magnitude: negative numbers have all the bits flipped, positive
+    # numbers only the sign bit. -0.0 is encoded as 0.0 because they compare
+    # equal, and NaNs go after +inf
+    ufmt = 'Q' if fmt == 'd' else 'I'
+    bits = struct.calcsize(fmt)*8
+    signbit = 1 << (bits - 1)
+    if value != value:
+        return _STRUCTS[ufmt].pack((1 << bits) - 1)
+    if value == 0.0:
+        value = 0.0
+    n = struct.unpack('>' + ufmt, struct.pack('>' + fmt, value))[0]
+    if n & signbit:
+        n = ~n & ((1 << bits) - 1)
+    else:
+        n |= signbit
+    return _STRUCTS[ufmt].pack(n)
+
+def encode_bytes(value):
+    # the zero bytes are escaped as \x00\xff, and the string is terminated by
+    # \x00\x00: this way, shorter strings sort before longer ones
+    if value is None:
+        return _NULL
+    return b''.join([_NOT_NULL, value.replace(b'\x00', b'\x00\xff'), b'\x00\x00'])
+
+def encode_struct(value):
+    if value is None:
+        return _NULL
+    return _NOT_NULL + value.sort_key()
@@ -19,11 +19,14 @@ cdef class Struct(Blob):
     cdef public long _data_size
     cdef public long _ptrs_size
 
+    @cython.locals(end=long)
     cpdef _init_from_buffer(self, object buf, long offset,
                             long data_size, long ptrs_size)
     cpdef _init_from_pointer(self, object buf, long offset, long p)
     cpdef _read_data(self, long offset, char ifmt)
     cpdef long _read_data_int16(self, long offset)
+    cpdef double _read_data_float64(self, long offset) except? -1
+    cpdef float _read_data_float32(self, long offset) except? -1
     cpdef long _read_fast_ptr(self, long offset)
     cpdef _read_far_ptr(self, long offset)
     cpdef long _as_pointer(self, long offset)
@@ -31,6 +34,9 @@ cdef class Struct(Blob):
     @cython.locals(p=long, obj=Struct)
     cpdef _read_struct(self, long offset, type structcls)
 
+    @cython.locals(p=long)
+    cpdef _read_struct_into(self, long offset, Struct obj)
+
     @cython.locals(p=long, offset=long)
     cpdef _read_str_text(self, long offset, bytes default_=*)
 
@@ -40,12 +46,34 @@ cdef class Struct(Blob):
     @cython.locals(p=long, offset=long, obj=List)
     cpdef _read_list(self, long offset, ItemType item_type, default_=*)
 
+    @cython.locals(p=long, offset=long)
+    cpdef _read_str_view(self, long offset, int additional_size=*)
+
+    @cython.locals(p=long, offset=long)
+    cpdef _read_str_unicode(self, long offset, default_=*)
+
+    @cython.locals(p=long, offset=long)
+    cpdef _read_str_interned(self, long offset)
+
     @cython.locals(p=long, offset=long)
     cpdef long _hash_str_text(self, long offset, long default_=*)
 
     @cython.locals(p=long, offset=long)
     cpdef long _hash_str_data(self, long offset, long default_=*, int additional_size=*)
 
+    cpdef bint _data_equals(self, Struct other, long offset, char ifmt) except -1
+
+    @cython.locals(a=long, b=long)
+    cpdef bint _bit_equals(self, Struct other, long offset, long bitmask) except -1
+
+    @cython.locals(p=long, p_offset=long, other_p=long, other_offset=long)
+    cpdef bint _str_equals(self, Struct other, long offset, int additional_size) except -1
+
+    cpdef int _data_cmp(self, Struct other, long offset, char ifmt) except -2
+
+    @cython.locals(p=long, p_offset=long, other_p=long, other_offset=long)
+    cpdef int _str_cmp(self, Struct other, long offset, int additional_size) except -2
+
     cpdef object _ensure_union(self, long expected_tag)
     cpdef long __which__(self) except -1
 
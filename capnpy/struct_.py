@@ -1,10 +1,11 @@
 import marshal
+import struct
 import warnings
 import capnpy
 from capnpy import ptr
 from capnpy.type import Types
 from capnpy.blob import Blob
-from capnpy.list import List
+from capnpy.list import List, StructItemType
 from capnpy.segment.segment import Segment, MultiSegment
 from capnpy.segment.endof import endof
 from capnpy.segment.builder import SegmentBuilder
@@ -22,6 +23,8 @@ def check_tag(curtag, newtag):
     return newtag
 
 
+_EMPTY_VIEW = memoryview(b'')
+
 def struct_from_buffer(cls, buf, offset, data_size, ptrs_size):
     """
     Same as cls.from_buffer, but since Cython does not support classmethod,
@@ -31,6 +34,12 @@ def struct_from_buffer(cls, buf, offset, data_size, ptrs_size):
     self._init_from_buffer(buf, offset, data_size, ptrs_size)
     return self
 
+def _read_root_list(builder, item_type):
+    # the list pointer is stored at offset 0: read it as if it were the
+    # only pointer of a struct with no data section
+    root = struct_from_buffer(Struct, builder.as_string(), 0, 0, 1)
+    return root._read_list(0, item_type)
+
 class Struct(Blob):
     """
     Abstract base class: a blob representing a struct.
@@ -46,6 +55,18 @@ class Struct(Blob):
     __static_data_size__ = None
     __static_ptrs_size__ = None
 
+    # __field_layout__ is a tuple of (name, kind, offset, arg, union_tag,
+    # default) describing where each field is stored. kind is one of:
+    #   - 'primitive': numbers and enums; arg is the fmt of the data slot
+    #   - 'bool': offset is in bytes and arg is the bit inside that byte
+    #   - 'text', 'data', 'ptr': offset is inside the ptrs section
+    #   - 'group': the layout is described by the group class
+    # union_tag is the discriminant value for union fields, else -1. default
+    # is the explicit default of primitive and bool fields, else None. The
+    # views used by List.as_records() and capnpy.predicate are derived from
+    # it: see _data_fields() and _predicate_fields()
+    __field_layout__ = ()
+
     def __init__(self, buf, offset, data_size, ptrs_size):
         self._init_from_buffer(buf, offset, data_size, ptrs_size)
 
@@ -55,8 +76,14 @@ class Struct(Blob):
         self._ptrs_offset = offset + data_size*8
         self._data_size = data_size
         self._ptrs_size = ptrs_size
-        assert self._data_offset + data_size*8 <= len(self._seg.buf)
-        assert self._ptrs_offset + ptrs_size*8 <= len(self._seg.buf)
+        # this is a real check and not an assert: the pyx getters read the
+        # data section directly from the buffer, without any further bound
+        # check, so a malformed offset must be rejected here
+        if offset < 0:
+            raise IndexError('Offset out of bounds: %d' % offset)
+        end = self._ptrs_offset + ptrs_size*8
+        if end > len(self._seg.buf):
+            raise IndexError('Offset out of bounds: %d' % end)
 
     def _init_from_pointer(self, buf, offset, p):
         assert ptr.kind(p) == ptr.STRUCT
@@ -87,6 +114,76 @@ class Struct(Blob):
     def load_all(cls, f):
         return capnpy.message.load_all(f, cls)
 
+    @classmethod
+    def list_from_columns(cls, **columns):
+        """
+        Build a List of ``cls`` out of the given columns, one for each field:
+        all the columns must have the same length, and the fields which are
+        not specified are left to their default value.
+
+        Only primitive and enum fields can be specified (see
+        ``_data_fields()``). Columns supporting the buffer protocol
+        (e.g. ``array.array`` or numpy arrays) are copied in bulk if their
+        items have the same binary layout as the field.
+        """
+        builder = SegmentBuilder()
+        pos = builder.allocate(8)
+        item_type = StructItemType(cls)
+        builder.copy_from_columns(pos, item_type, columns)
+        return _read_root_list(builder, item_type)
+
+    @classmethod
+    def list_from_rows(cls, rows):
+        """
+        Build a List of ``cls`` out of the given rows: each row is a tuple
+        containing the values of the fields listed in ``_data_fields()``, in
+        the same order.
+        """
+        builder = SegmentBuilder()
+        pos = builder.allocate(8)
+        item_type = StructItemType(cls)
+        builder.copy_from_rows(pos, item_type, rows)
+        return _read_root_list(builder, item_type)
+
+    @classmethod
+    def _data_fields(cls):
+        """
+        Return a tuple of (name, offset, fmt) describing the fields which are
+        stored verbatim at a fixed position of the data section. Union fields
+        overlap with each others, and fields with an explicit default are
+        stored XORed, so they are skipped.
+        """
+        return tuple([(name, offset, arg)
+                      for (name, kind, offset, arg, union_tag, default_)
+                      in cls.__field_layout__
+                      if (kind == 'primitive' and union_tag == -1 and
+                          default_ is None)])
+
+    @classmethod
+    def _predicate_fields(cls):
+        """
+        Return a tuple of (name, kind, offset, arg, default) describing the
+        fields which can be read directly from the buffer by
+        capnpy.predicate. Union fields need to check the tag, so they are
+        skipped.
+        """
+        res = []
+        for name, kind, offset, arg, union_tag, default_ in cls.__field_layout__:
+            if union_tag != -1:
+                continue
+            if kind == 'primitive':
+                if default_ is None:
+                    default_ = 0
+                elif arg in ('f', 'd'):
+                    # floats with a default are XORed bitwise
+                    continue
+                res.append((name, kind, offset, arg, default_))
+            elif kind == 'bool':
+                res.append((name, kind, offset, 1 << arg, bool(default_)))
+            elif kind == 'text' or kind == 'data':
+                res.append((name, kind, offset, None, None))
+        return tuple(res)
+
     def _raw_dumps(self):
         """
         Do a raw dump of the currenct capnpy object to the specified file.
@@ -180,6 +277,16 @@ class Struct(Blob):
             return 0
         return self._seg.read_int16(self._data_offset+offset)
 
+    def _read_data_float64(self, offset):
+        if offset >= self._data_size*8:
+            return 0.0
+        return self._seg.read_double(self._data_offset+offset)
+
+    def _read_data_float32(self, offset):
+        if offset >= self._data_size*8:
+            return 0.0
+        return self._seg.read_float(self._data_offset+offset)
+
     def _read_bit(self, offset, bitmask):
         val = self._read_data(offset, Types.uint8.ifmt)
         return bool(val & bitmask)
@@ -201,6 +308,23 @@ class Struct(Blob):
         obj._init_from_pointer(self._seg, offset, p)
         return obj
 
+    def _read_struct_into(self, offset, obj):
+        """
+        Like _read_struct, but instead of allocating a new object, rebind
+        ``obj`` to the dereferenced struct and return it. Return None if the
+        pointer is NULL.
+        """
+        p = self._read_fast_ptr(offset)
+        if ptr.kind(p) == ptr.FAR:
+            offset, p = self._read_far_ptr(offset)
+        else:
+            offset += self._ptrs_offset
+        if p == 0:
+            return None
+        assert ptr.kind(p) == ptr.STRUCT
+        obj._init_from_pointer(self._seg, offset, p)
+        return obj
+
     def _read_list(self, offset, item_type, default_=None):
         p = self._read_fast_ptr(offset)
         if ptr.kind(p) == ptr.FAR:
@@ -235,6 +359,31 @@ class Struct(Blob):
             offset += self._ptrs_offset
         return self._seg.read_str(p, offset, default_, additional_size)
 
+    def _read_str_view(self, offset, additional_size=0):
+        # NULL pointers are returned as empty views, like get_*() do
+        p = self._read_fast_ptr(offset)
+        if ptr.kind(p) == ptr.FAR:
+            offset, p = self._read_far_ptr(offset)
+        else:
+            offset += self._ptrs_offset
+        return self._seg.read_str_view(p, offset, _EMPTY_VIEW, additional_size)
+
+    def _read_str_unicode(self, offset, default_=None):
+        p = self._read_fast_ptr(offset)
+        if ptr.kind(p) == ptr.FAR:
+            offset, p = self._read_far_ptr(offset)
+        else:
+            offset += self._ptrs_offset
+        return self._seg.read_unicode(p, offset, default_, -1)
+
+    def _read_str_interned(self, offset):
+        p = self._read_fast_ptr(offset)
+        if ptr.kind(p) == ptr.FAR:
+            offset, p = self._read_far_ptr(offset)
+        else:
+            offset += self._ptrs_offset
+        return self._seg.read_unicode_interned(p, offset)
+
     def _hash_str_data(self, offset, default_=hash(None), additional_size=0):
         p = self._read_fast_ptr(offset)
         if ptr.kind(p) == ptr.FAR:
@@ -243,6 +392,58 @@ class Struct(Blob):
             offset += self._ptrs_offset
         return self._seg.hash_str(p, offset, default_, additional_size)
 
+    # the following methods compare a field of self with the same field of
+    # other, without reading the values into new Python objects. They are
+    # used by the specialized equality of the $Py.key structs.
+    def _data_equals(self, other, offset, ifmt):
+        if offset >= self._data_size*8 or offset >= other._data_size*8:
+            # at least one of the two is beyond _data_size, i.e. 0
+            return self._read_data(offset, ifmt) == other._read_data(offset, ifmt)
+        return self._seg.eq_primitive(self._data_offset+offset, other._seg,
+                                      other._data_offset+offset, ifmt)
+
+    def _bit_equals(self, other, offset, bitmask):
+        a = self._read_data(offset, ord('B'))
+        b = other._read_data(offset, ord('B'))
+        return (a ^ b) & bitmask == 0
+
+    def _data_cmp(self, other, offset, ifmt):
+        # three-way comparison of an integer field
+        if offset >= self._data_size*8 or offset >= other._data_size*8:
+            a = self._read_data(offset, ifmt)
+            b = other._read_data(offset, ifmt)
+            return (a > b) - (a < b)
+        return self._seg.cmp_primitive(self._data_offset+offset, other._seg,
+                                       other._data_offset+offset, ifmt)
+
+    def _str_cmp(self, other, offset, additional_size):
+        p = self._read_fast_ptr(offset)
+        if ptr.kind(p) == ptr.FAR:
+            p_offset, p = self._read_far_ptr(offset)
+        else:
+            p_offset = offset + self._ptrs_offset
+        other_p = other._read_fast_ptr(offset)
+        if ptr.kind(other_p) == ptr.FAR:
+            other_offset, other_p = other._read_far_ptr(offset)
+        else:
+            other_offset = offset + other._ptrs_offset
+        return self._seg.cmp_str(p, p_offset, other._seg, other_p, other_offset,
+                                 additional_size)
+
+    def _str_equals(self, other, offset, additional_size):
+        p = self._read_fast_ptr(offset)
+        if ptr.kind(p) == ptr.FAR:
+            p_offset, p = self._read_far_ptr(offset)
+        else:
+            p_offset = offset + self._ptrs_offset
+        other_p = other._read_fast_ptr(offset)
+        if ptr.kind(other_p) == ptr.FAR:
+            other_offset, other_p = other._read_far_ptr(offset)
+        else:
+            other_offset = offset + other._ptrs_offset
+        return self._seg.eq_str(p, p_offset, other._seg, other_p, other_offset,
+                                additional_size)
+
     def _ensure_union(self, expected_tag):
         if self.__which__() != expected_tag:
             tag = self.which() # use the non-raw tag to get a better error message
@@ -272,6 +473,26 @@ class Struct(Blob):
         res._init_from_buffer(buf, 8, self._data_size, self._ptrs_size)
         return res
 
+    def project(self, *paths):
+        """
+        Return a new message of the same type which contains only the fields
+        listed in ``paths``: the other pointers are NULL and the other data
+        fields are 0. Each path is a dotted name such as ``'b.c'``, to select
+        the field ``c`` of the struct or group ``b``; ``'items[*].x'`` selects
+        the field ``x`` of each struct in the list ``items``. Selecting a
+        pointer without a subpath copies the whole subtree.
+        """
+        tree = _parse_projection(paths)
+        builder = SegmentBuilder()
+        pos = builder.allocate(8)
+        pos = builder.alloc_struct(pos, self._data_size, self._ptrs_size)
+        _project_struct(builder, pos, self, tree)
+        buf = builder.as_string()
+        t = type(self)
+        res = t.__new__(t)
+        res._init_from_buffer(buf, 8, self._data_size, self._ptrs_size)
+        return res
+
     # ----------------------
     # hashing and equality
     # ----------------------
@@ -290,12 +511,133 @@ class Struct(Blob):
         # by doing this, we ensure that we compare equals to tuples
         return other == self._key()
 
+    def _cmp_order(self, other, op):
+        # same as for equality: we order exactly as the _key() tuples
+        key = self._key()
+        if isinstance(other, Struct):
+            other = other._key()
+        if op == 0:
+            return key < other
+        elif op == 1:
+            return key <= other
+        elif op == 4:
+            return key > other
+        else:
+            return key >= other
+
+    def sort_key(self):
+        """
+        Return a bytes string whose lexicographical order is the same as the
+        order of the ``$Py.key`` fields: see the documentation for the
+        details.
+        """
+        raise TypeError("sort_key() is supported only by structs with a "
+                        "$Py.key annotation")
+
     # this is already defined in blob.py: however, it seems if we do not
     # redeclare it here, Cython won't use it
     def __richcmp__(self, other, op):
         return self._richcmp(other, op)
 
 
+def _parse_projection(paths):
+    # turn the paths into a tree of dicts: a None leaf means that the whole
+    # field is selected, and the special key '[*]' selects the items of a
+    # list. E.g., ('a', 'items[*].x') becomes {'a': None, 'items': {'[*]':
+    # {'x': None}}}
+    tree = {}
+    for path in paths:
+        steps = []
+        for part in path.split('.'):
+            if part.endswith('[*]'):
+                steps.append(part[:-3])
+                steps.append('[*]')
+            else:
+                steps.append(part)
+        if steps[-1] == '[*]':
+            steps.pop()
+        node = tree
+        for step in steps[:-1]:
+            if step in node and node[step] is None:
+                # the whole field is already selected
+                node = None
+                break
+            node = node.setdefault(step, {})
+        if node is not None:
+            node[steps[-1]] = None
+    return tree
+
+def _project_struct(builder, pos, obj, tree):
+    # copy the fields of obj selected by tree into the struct at pos, which
+    # has the same size as obj
+    if obj.__tag_offset__ is not None:
+        # keep the union tag, so that which() still works
+        offset = obj.__tag_offset__
+        if offset < obj._data_size*8:
+            builder.write_slice(pos+offset, obj._seg, obj._data_offset+offset, 2)
+    layout = {}
+    for entry in obj.__field_layout__:
+        layout[entry[0]] = entry
+    for name, subtree in tree.items():
+        if name not in layout:
+            raise ValueError("Cannot project %s: unknown field '%s'" %
+                             (type(obj).__name__, name))
+        _, kind, offset, arg, union_tag, _ = layout[name]
+        if union_tag != -1 and obj.__which__() != union_tag:
+            continue
+        if kind == 'group':
+            group = getattr(obj, name)
+            if subtree is None:
+                subtree = dict.fromkeys([entry[0] for entry in group.__field_layout__])
+            _project_struct(builder, pos, group, subtree)
+            continue
+        if subtree is not None and kind != 'ptr':
+            raise ValueError("Cannot project %s: field '%s' has no subfields" %
+                             (type(obj).__name__, name))
+        if kind == 'primitive':
+            size = struct.calcsize('<' + arg)
+            if offset + size <= obj._data_size*8:
+                builder.write_slice(pos+offset, obj._seg, obj._data_offset+offset, size)
+        elif kind == 'bool':
+            if obj._read_bit(offset, 1 << arg):
+                builder.write_bool(pos+offset, arg, True)
+        elif offset < obj._ptrs_size*8:
+            dst_pos = pos + obj._data_size*8 + offset
+            if subtree is None:
+                src_pos = obj._ptrs_offset + offset
+                p = obj._seg.read_ptr(src_pos)
+                builder.copy_from_pointer(dst_pos, obj._seg, p, src_pos)
+            else:
+                _project_pointer(builder, dst_pos, getattr(obj, name), subtree)
+
+def _project_pointer(builder, pos, obj, tree):
+    if obj is None:
+        return
+    if '[*]' not in tree:
+        if not isinstance(obj, Struct):
+            raise ValueError("Cannot project %s: not a struct" % type(obj).__name__)
+        pos = builder.alloc_struct(pos, obj._data_size, obj._ptrs_size)
+        _project_struct(builder, pos, obj, tree)
+        return
+    if len(tree) != 1:
+        raise ValueError("Cannot mix [*] and field names in a projection")
+    if not isinstance(obj, List):
+        raise TypeError("Cannot project %s: [*] requires a list of structs" %
+                        type(obj).__name__)
+    items = obj.cursor() # raise TypeError if it's not a list of structs
+    data_size = ptr.struct_data_size(obj._tag)
+    ptrs_size = ptr.struct_ptrs_size(obj._tag)
+    item_count = len(obj)
+    total_words = (data_size+ptrs_size) * item_count
+    pos = builder.alloc_list(pos, ptr.LIST_SIZE_COMPOSITE, total_words,
+                             total_words*8 + 8) # +8 is for the tag
+    builder.write_int64(pos, ptr.new_struct(item_count, data_size, ptrs_size))
+    pos += 8
+    for item in items:
+        _project_struct(builder, pos, item, tree['[*]'])
+        pos += (data_size+ptrs_size) * 8
+
+
 # Attach the dump[s] methods to Struct. This is the only way I found to make
 # sure that Struct.dumps is implemented in C (on CPython). The obvious
 # alternative is to implement dumps directly in the class body and to declare
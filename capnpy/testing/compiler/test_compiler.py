@@ -258,3 +258,175 @@ class TestDynamicCompiler(object):
         comp = DynamicCompiler([])
         req = comp.parse_schema(filename=filename)
         assert req.requestedFiles[0].filename == str(filename).encode()
+
+    def test_cachedir(self, tmpdir, monkeypatch):
+        tmpdir.join('point.capnp').write("""
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0 :Int64;
+            y @1 :Int64;
+        }
+        """)
+        tmpdir.join('foo.capnp').write("""
+        @0xbf5147cbbecf40c2;
+        using P = import "/point.capnp";
+        struct Foo {
+            p @0 :P.Point;
+        }
+        """)
+        cachedir = tmpdir.join('cache')
+        filename = tmpdir.join('foo.capnp')
+        comp = DynamicCompiler([tmpdir], cachedir=cachedir)
+        mod = comp.load_schema(filename=filename)
+        P = comp.load_schema(filename=tmpdir.join('point.capnp'))
+        assert mod.Foo(p=P.Point(1, 2)).p.y == 2
+        # one entry for foo.capnp and one for point.capnp
+        def entries():
+            return [p for p in cachedir.listdir() if p.basename != 'requests']
+        assert len(entries()) == 2
+        #
+        # a new compiler finds the modules in the cache, without running
+        # capnp
+        def fail(*args):
+            raise AssertionError('capnp should not be called')
+        monkeypatch.setattr(DynamicCompiler, '_parse_schema_file', fail)
+        comp = DynamicCompiler([tmpdir], cachedir=cachedir)
+        mod = comp.load_schema(filename=filename)
+        P = comp.load_schema(filename=tmpdir.join('point.capnp'))
+        assert mod.Foo(p=P.Point(1, 2)).p.y == 2
+        monkeypatch.undo()
+        #
+        # modifying an imported schema invalidates the cache
+        tmpdir.join('point.capnp').write("""
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0 :Int64;
+            y @1 :Int64;
+            z @2 :Int64;
+        }
+        """)
+        comp = DynamicCompiler([tmpdir], cachedir=cachedir)
+        mod = comp.load_schema(filename=filename)
+        P = comp.load_schema(filename=tmpdir.join('point.capnp'))
+        assert mod.Foo(p=P.Point(1, 2, 3)).p.z == 3
+        assert len(entries()) == 4
+
+    def test_cache_key(self, tmpdir):
+        filename = tmpdir.join('foo.capnp')
+        filename.write('@0xbf5147cbbecf40c1;')
+        comp = DynamicCompiler([tmpdir], cachedir=tmpdir.join('cache'))
+        key = comp._cache_key(filename, True, False, False)
+        assert key == comp._cache_key(filename, True, False, False)
+        assert key != comp._cache_key(filename, False, False, False)
+        assert key != comp._cache_key(filename, True, False, True)
+        assert key != comp._cache_key(filename, True, False, False, True)
+        filename.write('@0xbf5147cbbecf40c1; # changed')
+        assert key != comp._cache_key(filename, True, False, False)
+
+    def test_cache_key_embed(self, tmpdir):
+        filename = tmpdir.join('foo.capnp')
+        filename.write('@0xbf5147cbbecf40c1; const x :Data = embed "x.bin";')
+        tmpdir.join('x.bin').write('hello')
+        comp = DynamicCompiler([tmpdir], cachedir=tmpdir.join('cache'))
+        assert comp._find_imports(filename) == [filename, tmpdir.join('x.bin')]
+        key = comp._cache_key(filename, True, False, False)
+        tmpdir.join('x.bin').write('world')
+        assert key != comp._cache_key(filename, True, False, False)
+
+    def test_cache_key_compiler_version(self, tmpdir, monkeypatch):
+        from capnpy.compiler import compiler
+        filename = tmpdir.join('foo.capnp')
+        filename.write('@0xbf5147cbbecf40c1;')
+        comp = DynamicCompiler([tmpdir], cachedir=tmpdir.join('cache'))
+        key = comp._cache_key(filename, True, False, False)
+        # the version includes a hash of the compiler, even in a development
+        # tree where __version__ is 'unknown'
+        version = compiler.compiler_version()
+        assert version.startswith(capnpy.__version__ + '-')
+        assert len(version) > len(capnpy.__version__) + 1
+        monkeypatch.setattr(compiler, '_compiler_version', 'something else')
+        assert key != comp._cache_key(filename, True, False, False)
+
+    def test_save_request(self, tmpdir, monkeypatch):
+        filename = tmpdir.join('foo.capnp')
+        filename.write("""
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0 :Int64;
+            y @1 :Int64;
+        }
+        """)
+        comp = DynamicCompiler([tmpdir])
+        reqfile = comp.save_request(filename)
+        assert reqfile == tmpdir.join('foo.capnp.req')
+        #
+        # the .req file is used instead of running capnp
+        def fail(*args):
+            raise AssertionError('capnp should not be called')
+        monkeypatch.setattr(DynamicCompiler, '_capnp_compile', fail)
+        comp = DynamicCompiler([tmpdir])
+        mod = comp.load_schema(filename=filename)
+        assert mod.Point(1, 2).y == 2
+        #
+        # the mtimes don't matter, e.g. after a pip install
+        filename.setmtime(reqfile.mtime() + 10)
+        comp = DynamicCompiler([tmpdir])
+        comp.parse_schema(filename=filename)
+        #
+        # but the content does
+        filename.write(filename.read() + '\n')
+        comp = DynamicCompiler([tmpdir])
+        with pytest.warns(UserWarning, match='out of date'):
+            py.test.raises(AssertionError, lambda: comp.parse_schema(filename=filename))
+
+    def test_save_request_imports(self, tmpdir, monkeypatch):
+        tmpdir.join('p.capnp').write("""
+        @0xbf5147cbbecf40c2;
+        struct Point {
+            x @0 :Int64;
+        }
+        """)
+        filename = tmpdir.join('foo.capnp')
+        filename.write("""
+        @0xbf5147cbbecf40c1;
+        using P = import "p.capnp";
+        struct Rect {
+            a @0 :P.Point;
+        }
+        """)
+        DynamicCompiler([tmpdir]).save_request(filename)
+        def fail(*args):
+            raise AssertionError('capnp should not be called')
+        monkeypatch.setattr(DynamicCompiler, '_capnp_compile', fail)
+        DynamicCompiler([tmpdir]).parse_schema(filename=filename)
+        #
+        tmpdir.join('p.capnp').write("""
+        @0xbf5147cbbecf40c2;
+        struct Point {
+            x @0 :Int32;
+        }
+        """)
+        comp = DynamicCompiler([tmpdir])
+        with pytest.warns(UserWarning):
+            py.test.raises(AssertionError, lambda: comp.parse_schema(filename=filename))
+
+    def test_cachedir_request(self, tmpdir, monkeypatch):
+        filename = tmpdir.join('foo.capnp')
+        filename.write("""
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0 :Int64;
+            y @1 :Int64;
+        }
+        """)
+        cachedir = tmpdir.join('cache')
+        comp = DynamicCompiler([tmpdir], cachedir=cachedir)
+        req = comp.parse_schema(filename=filename)
+        assert len(cachedir.join('requests').listdir()) == 1
+        #
+        def fail(*args):
+            raise AssertionError('capnp should not be called')
+        monkeypatch.setattr(DynamicCompiler, '_capnp_compile', fail)
+        comp = DynamicCompiler([tmpdir], cachedir=cachedir)
+        req2 = comp.parse_schema(filename=filename)
+        assert req2.dumps() == req.dumps()
@@ -1,3 +1,5 @@
+import struct
+import array
 import py
 import pytest
 from six import b
@@ -141,6 +143,53 @@ class TestConstructors(CompilerTest):
                                  '\x01\x00\x00\x00\x00\x00\x00\x00'  # p.x == 1
                                  '\x02\x00\x00\x00\x00\x00\x00\x00') # p.y == 2
 
+    def test_struct_from_tuple_or_dict(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0 :Int64;
+            y @1 :Int64;
+        }
+        struct Foo {
+            x @0 :Point;
+        }
+        """
+        mod = self.compile(schema)
+        expected = mod.Foo(mod.Point(1, 2))._seg.buf
+        assert mod.Foo((1, 2))._seg.buf == expected
+        assert mod.Foo({'y': 2, 'x': 1})._seg.buf == expected
+        assert mod.Foo(x=(1,)).x.y == 0
+        pytest.raises(TypeError, lambda: mod.Foo((1, 2, 3)))
+        pytest.raises(TypeError, lambda: mod.Foo({'z': 3}))
+        pytest.raises(TypeError, lambda: mod.Foo([1, 2]))
+
+    def test_nested_struct_from_tuple(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0 :Int64;
+            y @1 :Int64;
+        }
+        struct Rectangle {
+            a @0 :Point;
+            b @1 :Point;
+            name @2 :Text;
+        }
+        struct Drawing {
+            rect @0 :Rectangle;
+            color @1 :Int8;
+        }
+        """
+        mod = self.compile(schema)
+        d1 = mod.Drawing(rect=((1, 2), {'x': 3, 'y': 4}, b'foo'), color=5)
+        d2 = mod.Drawing(rect=mod.Rectangle(a=mod.Point(1, 2),
+                                            b=mod.Point(3, 4),
+                                            name=b'foo'),
+                         color=5)
+        assert d1._seg.buf == d2._seg.buf
+        assert d1.rect.b.y == 4
+        assert d1.rect.name == b'foo'
+
 
     def test_list(self):
         schema = """
@@ -165,6 +214,37 @@ class TestConstructors(CompilerTest):
         foo = mod.Foo([None]*4)
         assert foo._seg.buf == b('\x01\x00\x00\x00\x20\x00\x00\x00')  # ptrlist
 
+    def test_list_of_bool(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        struct Foo {
+            x @0 :List(Bool);
+        }
+        """
+        mod = self.compile(schema)
+        items = [True, True, False, True, False, True, False, False,
+                 False, True]
+        foo = mod.Foo(items)
+        assert foo._seg.buf == b('\x01\x00\x00\x00\x51\x00\x00\x00'   # ptrlist
+                                 '\x2b\x02\x00\x00\x00\x00\x00\x00')
+        assert list(foo.x) == items
+
+    def test_list_from_buffer(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        struct Foo {
+            x @0 :List(Int32);
+        }
+        """
+        mod = self.compile(schema)
+        foo = mod.Foo(array.array('i', [1, 2, 3]))
+        assert foo._seg.buf == b('\x01\x00\x00\x00\x1c\x00\x00\x00'   # ptrlist
+                                 '\x01\x00\x00\x00\x02\x00\x00\x00'
+                                 '\x03\x00\x00\x00\x00\x00\x00\x00')
+        # copying an existing List does not go through the items
+        foo2 = mod.Foo(foo.x)
+        assert foo2._seg.buf == foo._seg.buf
+
     def test_list_of_text(self):
         schema = """
         @0xbf5147cbbecf40c1;
@@ -221,6 +301,26 @@ class TestConstructors(CompilerTest):
         assert poly.points[1].x == 3
         assert poly.points[1].y == 4
 
+    def test_list_of_structs_from_tuples(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        struct Polygon {
+            struct Point {
+                x @0 :Int64;
+                y @1 :Int64;
+                label @2 :Text;
+            }
+            points @0 :List(Point);
+        }
+        """
+        mod = self.compile(schema)
+        Point = mod.Polygon.Point
+        poly1 = mod.Polygon([(1, 2, b'a'), {'x': 3, 'label': b'b'}])
+        poly2 = mod.Polygon([Point(1, 2, b'a'), Point(3, 0, b'b')])
+        assert poly1._seg.buf == poly2._seg.buf
+        assert poly1.points[1].label == b'b'
+        pytest.raises(TypeError, lambda: mod.Polygon([(1, 2, b'a', 4)]))
+
     def test_list_of_lists(self):
         schema = """
         @0xbf5147cbbecf40c1;
@@ -454,3 +554,36 @@ class TestDefaults(CompilerTest):
         assert f.a
         assert not f.b
         assert f.c
+
+    def test_flat_struct_layout(self):
+        # structs without pointers are packed in one shot: check that the
+        # holes in the data section are zeroed
+        schema = """
+        @0xbf5147cbbecf40c1;
+        enum Color {
+            red @0;
+            green @1;
+        }
+        struct Foo {
+            a @0 :Int8;
+            b @1 :Int64;
+            c @2 :Bool;
+            e @3 :Color = green;
+            f @4 :Bool;
+        }
+        """
+        mod = self.compile(schema)
+        foo = mod.Foo(a=-1, b=2, c=True, e=mod.Color.red, f=True)
+        assert foo._seg.buf == struct.pack('<bBh4xq', -1, 0b11, 1, 2)
+        assert foo.a == -1
+        assert foo.b == 2
+        assert foo.c is True
+        assert foo.e == mod.Color.red
+        assert foo.f is True
+        #
+        foo = mod.Foo()
+        assert foo._seg.buf == b'\x00' * 16
+        assert foo.e == mod.Color.green
+        #
+        pytest.raises(OverflowError if self.pyx else struct.error,
+                      lambda: mod.Foo(a=1000))
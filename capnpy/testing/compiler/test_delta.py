@@ -0,0 +1,118 @@
+import pytest
+from capnpy.testing.compiler.support import CompilerTest
+from capnpy.delta import diff, patch, Patch
+
+class TestDelta(CompilerTest):
+
+    schema = """
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0 :Int64;
+            y @1 :Int64;
+            name @2 :Text;
+        }
+        struct State {
+            a @0 :Int64;
+            b @1 :Float64;
+            p @2 :Point;
+            items @3 :List(Point);
+            blob @4 :Data;
+            nums @5 :List(Int64);
+        }
+    """
+
+    def get_state(self, mod, **kwds):
+        P = mod.Point
+        args = dict(a=1, b=2.0, p=P(1, 2, b'p'),
+                    items=[P(i, i, b'item') for i in range(10)],
+                    blob=b'x'*1000, nums=list(range(100)))
+        args.update(kwds)
+        return mod.State(**args)
+
+    def check(self, old, new):
+        delta = diff(old, new)
+        # the patch survives a roundtrip on the wire
+        delta = Patch.loads(delta.dumps())
+        res = patch(old, delta)
+        assert type(res) is type(new)
+        assert res.dumps() == new.dumps()
+        return delta
+
+    def test_same(self):
+        mod = self.compile(self.schema)
+        old = self.get_state(mod)
+        delta = self.check(old, self.get_state(mod))
+        assert list(delta.word_indexes) == []
+        assert list(delta.pointers) == []
+
+    def test_data_words(self):
+        mod = self.compile(self.schema)
+        old = self.get_state(mod)
+        new = self.get_state(mod, b=3.0)
+        delta = self.check(old, new)
+        assert list(delta.word_indexes) == [1]
+        assert list(delta.pointers) == []
+
+    def test_nested_struct(self):
+        mod = self.compile(self.schema)
+        old = self.get_state(mod)
+        new = self.get_state(mod, p=mod.Point(1, 5, b'p'))
+        delta = self.check(old, new)
+        assert len(delta.pointers) == 1
+        item = delta.pointers[0]
+        assert item.index == 0
+        assert item.is_patch()
+        assert list(item.patch.word_indexes) == [1]
+        assert len(delta.dumps()) < len(new.dumps()) // 10
+
+    def test_replace_subtree(self):
+        mod = self.compile(self.schema)
+        old = self.get_state(mod)
+        new = self.get_state(mod, items=[mod.Point(1, 2, b'new')],
+                             nums=list(range(100)))
+        delta = self.check(old, new)
+        assert [item.index for item in delta.pointers] == [1]
+        assert delta.pointers[0].is_subtree()
+
+    def test_null(self):
+        mod = self.compile(self.schema)
+        old = self.get_state(mod)
+        new = self.get_state(mod, p=None, blob=None)
+        delta = self.check(old, new)
+        assert [item.index for item in delta.pointers] == [0, 2]
+        assert delta.pointers[0].is_null()
+        #
+        # and back
+        self.check(new, old)
+
+    def test_type_mismatch(self):
+        mod = self.compile(self.schema)
+        old = self.get_state(mod)
+        pytest.raises(TypeError, lambda: diff(old, mod.Point(1, 2, b'p')))
+
+    def test_null_nested_struct(self):
+        schema = """
+            @0xbf5147cbbecf40c2;
+            struct C {
+                x @0 :Int64;
+            }
+            struct B {
+                c @0 :C;
+            }
+            struct A {
+                b @0 :B;
+            }
+        """
+        mod = self.compile(schema)
+        old = mod.A(b=None)
+        new = mod.A(b=mod.B(c=mod.C(x=5)))
+        delta = self.check(old, new)
+        assert [item.index for item in delta.pointers] == [0]
+        assert delta.pointers[0].is_subtree()
+        # struct -> null
+        delta = self.check(new, old)
+        assert delta.pointers[0].is_null()
+        # and at depth 2
+        old = mod.A(b=mod.B(c=None))
+        self.check(old, new)
+        self.check(new, old)
@@ -2,10 +2,12 @@ import py
 import pytest
 import sys
 import os
+import json
 import sysconfig
 
 from capnpy.testing.compiler.support import CompilerTest
 from capnpy.compiler.compiler import DistutilsCompiler
+from capnpy.compiler.distutils import capnpify
 
 @pytest.fixture
 def ROOT():
@@ -63,6 +65,150 @@ class TestDistutilsCompiler(CompilerTest):
         assert outfile == outfile3
         assert outfile3.mtime() > mtime
 
+    def write_schemas(self):
+        self.write("point.capnp", """
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0: Int64;
+            y @1: Int64;
+        }
+        """)
+        self.write("poly.capnp", """
+        @0xbf5147cbbecf40c2;
+        using P = import "/point.capnp";
+        struct Polygon {
+            points @0: List(P.Point);
+        }
+        """)
+
+    def test_dont_compile_if_newer_imports(self):
+        self.write_schemas()
+        compiler = DistutilsCompiler([self.tmpdir])
+        infile = self.tmpdir.join("poly.capnp")
+        outfile = compiler.compile(infile, pyx=self.pyx)
+        mtime = outfile.mtime()
+        infile.setmtime(mtime-1)
+        self.tmpdir.join("point.capnp").setmtime(mtime-1)
+        options = compiler.options_key(True, self.pyx, True, False)
+        assert compiler.is_up_to_date(infile, outfile, options)
+        self.tmpdir.join("point.capnp").setmtime(mtime+1)
+        assert not compiler.is_up_to_date(infile, outfile, options)
+
+    def test_manifest(self):
+        self.write_schemas()
+        manifest = self.tmpdir.join('build', 'manifest.json')
+        infile = self.tmpdir.join("poly.capnp")
+        compiler = DistutilsCompiler([self.tmpdir], manifest=manifest)
+        outfile = compiler.compile(infile, pyx=self.pyx)
+        compiler.save_manifest()
+        data = json.loads(manifest.read())
+        assert sorted(data[str(infile)]['inputs']) == [
+            str(self.tmpdir.join("point.capnp")), str(infile)]
+        #
+        # the mtime does not matter, only the content
+        options = compiler.options_key(True, self.pyx, True, False)
+        infile.setmtime(outfile.mtime()+10)
+        compiler = DistutilsCompiler([self.tmpdir], manifest=manifest)
+        assert compiler.is_up_to_date(infile, outfile, options)
+        options2 = compiler.options_key(True, self.pyx, True, True)
+        assert not compiler.is_up_to_date(infile, outfile, options2)
+        #
+        # changing an imported schema makes it stale
+        self.tmpdir.join("point.capnp").write("""
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0: Int64;
+            y @1: Int64;
+            z @2: Int64;
+        }
+        """)
+        compiler = DistutilsCompiler([self.tmpdir], manifest=manifest)
+        assert not compiler.is_up_to_date(infile, outfile, options)
+
+    def test_manifest_embed(self):
+        self.write("foo.capnp", """
+        @0xbf5147cbbecf40c1;
+        const greeting :Data = embed "greeting.bin";
+        """)
+        self.write("greeting.bin", "hello")
+        manifest = self.tmpdir.join('build', 'manifest.json')
+        infile = self.tmpdir.join("foo.capnp")
+        compiler = DistutilsCompiler([self.tmpdir], manifest=manifest)
+        outfile = compiler.compile(infile, pyx=self.pyx)
+        compiler.save_manifest()
+        data = json.loads(manifest.read())
+        assert sorted(data[str(infile)]['inputs']) == [
+            str(infile), str(self.tmpdir.join("greeting.bin"))]
+        #
+        # changing an embedded file makes it stale
+        options = compiler.options_key(True, self.pyx, True, False)
+        compiler = DistutilsCompiler([self.tmpdir], manifest=manifest)
+        assert compiler.is_up_to_date(infile, outfile, options)
+        self.write("greeting.bin", "world")
+        compiler = DistutilsCompiler([self.tmpdir], manifest=manifest)
+        assert not compiler.is_up_to_date(infile, outfile, options)
+
+    def test_manifest_compiler_version(self, monkeypatch):
+        from capnpy.compiler import compiler as compiler_mod
+        self.write_schemas()
+        manifest = self.tmpdir.join('build', 'manifest.json')
+        infile = self.tmpdir.join("poly.capnp")
+        compiler = DistutilsCompiler([self.tmpdir], manifest=manifest)
+        outfile = compiler.compile(infile, pyx=self.pyx)
+        compiler.save_manifest()
+        # a different code generator makes everything stale, even if the
+        # version of capnpy is the same
+        monkeypatch.setattr(compiler_mod, '_compiler_version', 'something else')
+        options = compiler.options_key(True, self.pyx, True, False)
+        compiler = DistutilsCompiler([self.tmpdir], manifest=manifest)
+        assert not compiler.is_up_to_date(infile, outfile, options)
+
+    def test_capnpify_parallel(self, monkeypatch):
+        files = []
+        for i in range(5):
+            self.write("point%d.capnp" % i, """
+            @0xbf5147cbbecf40c{i};
+            struct Point{i} {{
+                x @0: Int64;
+                y @1: Int64;
+            }}
+            """, i=i+1)
+            files.append("point%d.capnp" % i)
+        monkeypatch.chdir(self.tmpdir)
+        exts = capnpify(files, pyx=self.pyx, nthreads=4)
+        ext = '.pyx' if self.pyx else '.py'
+        for f in files:
+            assert self.tmpdir.join(f).new(ext=ext).check(file=True)
+        if self.pyx:
+            assert len(exts) == 5
+        else:
+            assert exts == []
+
+
+    def test_capnpify_incremental(self, monkeypatch):
+        self.write_schemas()
+        monkeypatch.chdir(self.tmpdir)
+        monkeypatch.setattr(sys, 'path', [str(self.tmpdir)] + sys.path)
+        files = ['point.capnp', 'poly.capnp']
+        capnpify(files, pyx=self.pyx, nthreads=1)
+        assert self.tmpdir.join('build', 'capnpy-manifest.json').check()
+        ext = '.pyx' if self.pyx else '.py'
+        outfiles = [self.tmpdir.join(f).new(ext=ext) for f in files]
+        for outf in outfiles:
+            outf.setmtime(1000)
+        #
+        capnpify(files, pyx=self.pyx, nthreads=1)
+        assert [outf.mtime() for outf in outfiles] == [1000, 1000]
+        #
+        # poly.capnp imports point.capnp, so both are compiled again
+        self.tmpdir.join('point.capnp').write("""
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0: Int64;
+        }
+        """)
+        capnpify(files, pyx=self.pyx, nthreads=1)
+        assert [outf.mtime() > 1000 for outf in outfiles] == [True, True]
 
 class TestSetup(CompilerTest):
 
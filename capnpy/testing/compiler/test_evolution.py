@@ -34,6 +34,53 @@ class TestEvolution(CompilerTest):
         assert obj._data_size == 3
         py.test.raises(AttributeError, "obj.z")
 
+    def test_add_data_field_all_types(self):
+        schema = """
+            @0xbf5147cbbecf40c1;
+            enum Color {
+                red @0;
+                green @1;
+                blue @2;
+            }
+
+            struct Old {
+                x @0 :Int64;
+            }
+
+            struct New {
+                x @0 :Int64;
+                a @1 :Float64;
+                b @2 :Float32;
+                c @3 :Bool;
+                d @4 :Bool = true;
+                e @5 :Color = blue;
+                f @6 :UInt64;
+                g @7 :Int8 = -3;
+            }
+        """
+        mod = self.compile(schema)
+        # the fields beyond _data_size must read as their default value
+        s = dumps(mod.Old(x=1))
+        obj = loads(s, mod.New)
+        assert obj.x == 1
+        assert obj.a == 0
+        assert obj.b == 0
+        assert obj.c is False
+        assert obj.d is True
+        assert obj.e == mod.Color.blue
+        assert obj.f == 0
+        assert obj.g == -3
+        #
+        obj = mod.New(x=1, a=2.5, b=3.5, c=True, d=False, e=mod.Color.green,
+                      f=2**64-1, g=-128)
+        assert obj.a == 2.5
+        assert obj.b == 3.5
+        assert obj.c is True
+        assert obj.d is False
+        assert obj.e == mod.Color.green
+        assert obj.f == 2**64-1
+        assert obj.g == -128
+
     def test_add_ptr_field(self):
         schema = """
             @0xbf5147cbbecf40c1;
@@ -67,3 +114,28 @@ class TestEvolution(CompilerTest):
         assert obj._data_size == 0
         assert obj._ptrs_size == 2
         py.test.raises(AttributeError, "obj.p2")
+
+    def test_malformed_struct_offset(self):
+        schema = """
+            @0xbf5147cbbecf40c1;
+            struct Point {
+                x @0 :Int64;
+            }
+
+            struct Outer {
+                p @0 :Point;
+            }
+        """
+        mod = self.compile(schema)
+        # the pointer to p has offset -2, i.e. it points before the start of
+        # the buffer
+        buf = b'\xf8\xff\xff\xff\x01\x00\x00\x00'
+        outer = mod.Outer.from_buffer(buf, 0, 0, 1)
+        exc = py.test.raises(IndexError, lambda: outer.p)
+        assert str(exc.value) == 'Offset out of bounds: -8'
+        # here the pointer has offset 1, so the data section of p is past
+        # the end of the buffer
+        buf = b'\x04\x00\x00\x00\x01\x00\x00\x00'
+        outer = mod.Outer.from_buffer(buf, 0, 0, 1)
+        exc = py.test.raises(IndexError, lambda: outer.p)
+        assert str(exc.value) == 'Offset out of bounds: 24'
@@ -1,4 +1,6 @@
+import array
 import py
+import pytest
 from six import b, PY3
 
 from capnpy.testing.compiler.support import CompilerTest
@@ -49,6 +51,28 @@ class TestField(CompilerTest):
         assert p.x == 0
         assert p.y is False
 
+    def test_primitive_getters(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        struct Foo {
+            x @0 :Int64 = 42;
+            y @1 :Bool = true;
+            z @2 :Float64;
+            union {
+                a @3 :UInt8;
+                b @4 :Int16;
+            }
+        }
+        """
+        mod = self.compile(schema)
+        p = mod.Foo(x=1, y=False, z=1.5, a=2)
+        assert p.get_x() == 1
+        assert p.get_y() is False
+        assert p.get_z() == 1.5
+        assert p.get_a() == 2
+        # the union check raises as the property does
+        py.test.raises(ValueError, p.get_b)
+
 
     def test_void(self):
         schema = """
@@ -97,6 +121,28 @@ class TestField(CompilerTest):
         f = mod.Foo.from_buffer(buf, 0, 1, 1)
         assert f.data == b'ABCDEFGH'
 
+    def test_view(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        struct Foo {
+            data @0 :Data;
+            text @1 :Text;
+            empty @2 :Data;
+        }
+        """
+        mod = self.compile(schema)
+        foo = mod.Foo(data=b'ABCDEFGH', text=b'hello', empty=None)
+        data = foo.get_data_view()
+        text = foo.get_text_view()
+        assert isinstance(data, memoryview)
+        assert data.readonly
+        assert data.tobytes() == b'ABCDEFGH'
+        assert text.tobytes() == b'hello'
+        assert foo.get_empty_view().tobytes() == b''
+        # the views keep the underlying buffer alive
+        del foo
+        assert data.tobytes() == b'ABCDEFGH'
+
 
     def test_struct(self):
         schema = """
@@ -452,6 +498,139 @@ class TestList(CompilerTest):
         assert poly.points[0].x == 10
         assert poly.points[0].y == 100
 
+    def test_list_of_structs_as_records(self):
+        np = pytest.importorskip('numpy')
+        schema = """
+        @0xbf5147cbbecf40c1;
+        struct Polygon {
+            struct Point {
+                x @0 :Int64;
+                y @1 :Int32;
+                z @2 :Int16 = 42;
+                name @3 :Text;
+            }
+            points @0 :List(Point);
+        }
+        """
+        mod = self.compile(schema)
+        points = [mod.Polygon.Point(x=i, y=i*10, z=i, name=b'p%d' % i)
+                  for i in range(5)]
+        poly = mod.Polygon(points=points)
+        records = poly.points.as_records()
+        assert len(records) == 5
+        # z is not included because it has an explicit default
+        assert records.dtype.names == ('x', 'y')
+        assert records.dtype.itemsize == 24
+        assert list(records['x']) == [0, 1, 2, 3, 4]
+        assert list(records['y']) == [0, 10, 20, 30, 40]
+        assert records['x'].mean() == 2
+        assert not records.flags.writeable
+        #
+        empty = mod.Polygon(points=None).get_points().as_records()
+        assert len(empty) == 0
+        assert empty.dtype.names == ('x', 'y')
+
+    def test_list_as_records_not_struct(self):
+        pytest.importorskip('numpy')
+        schema = """
+        @0xbf5147cbbecf40c1;
+        struct Foo {
+            items @0 :List(Int64);
+        }
+        """
+        mod = self.compile(schema)
+        foo = mod.Foo(items=[1, 2, 3])
+        pytest.raises(TypeError, foo.items.as_records)
+
+    def test_list_from_columns(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        struct Polygon {
+            struct Point {
+                x @0 :Int64;
+                y @1 :Int32;
+                z @2 :Float64;
+                name @3 :Text;
+            }
+            points @0 :List(Point);
+        }
+        """
+        mod = self.compile(schema)
+        Point = mod.Polygon.Point
+        points = Point.list_from_columns(x=[1, 2, 3], z=[0.5, 1.5, 2.5])
+        assert len(points) == 3
+        assert [p.x for p in points] == [1, 2, 3]
+        assert [p.y for p in points] == [0, 0, 0]
+        assert [p.z for p in points] == [0.5, 1.5, 2.5]
+        assert [p.name for p in points] == [None, None, None]
+        #
+        # the result can be passed to a ctor as any other list
+        poly = mod.Polygon(points=points)
+        assert [(p.x, p.z) for p in poly.points] == [(1, 0.5), (2, 1.5),
+                                                     (3, 2.5)]
+        #
+        # columns supporting the buffer protocol are copied in bulk
+        points = Point.list_from_columns(x=array.array('q', [4, 5]),
+                                         y=array.array('i', [40, 50]),
+                                         z=array.array('d', [4.5, 5.5]))
+        assert [(p.x, p.y, p.z) for p in points] == [(4, 40, 4.5), (5, 50, 5.5)]
+        #
+        # columns whose layout does not match are converted item by item
+        points = Point.list_from_columns(x=array.array('i', [6, 7]),
+                                         z=array.array('f', [6.5, 7.5]))
+        assert [(p.x, p.z) for p in points] == [(6, 6.5), (7, 7.5)]
+
+    def test_list_from_columns_numpy(self):
+        np = pytest.importorskip('numpy')
+        schema = """
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0 :Int64;
+            y @1 :Int32;
+        }
+        """
+        mod = self.compile(schema)
+        x = np.arange(10, dtype='int64')
+        y = np.arange(0, 100, 10, dtype='int32')
+        points = mod.Point.list_from_columns(x=x, y=y)
+        assert [(p.x, p.y) for p in points] == list(zip(range(10),
+                                                        range(0, 100, 10)))
+        # non-contiguous arrays are converted item by item
+        points = mod.Point.list_from_columns(x=x[::2])
+        assert [p.x for p in points] == [0, 2, 4, 6, 8]
+
+    def test_list_from_columns_errors(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0 :Int64;
+            y @1 :Int64;
+            name @2 :Text;
+        }
+        """
+        mod = self.compile(schema)
+        Point = mod.Point
+        pytest.raises(TypeError, Point.list_from_columns)
+        pytest.raises(TypeError, Point.list_from_columns, name=[b'a'])
+        pytest.raises(TypeError, Point.list_from_columns, foo=[1])
+        pytest.raises(ValueError, Point.list_from_columns, x=[1, 2], y=[1])
+
+    def test_list_from_rows(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0 :Int64;
+            y @1 :Float32;
+            name @2 :Text;
+        }
+        """
+        mod = self.compile(schema)
+        points = mod.Point.list_from_rows([(1, 1.5), (2, 2.5)])
+        assert [(p.x, p.y, p.name) for p in points] == [(1, 1.5, None),
+                                                        (2, 2.5, None)]
+        assert len(mod.Point.list_from_rows([])) == 0
+        pytest.raises(ValueError, mod.Point.list_from_rows, [(1, 1.5, 'x')])
+
     def test_list_of_enum(self):
         schema = """
         @0xbf5147cbbecf40c1;
@@ -91,6 +91,116 @@ class TestKey(CompilerTest):
         assert hash(p1) == hash(p2) == hash((1, 2, "p1"))
 
 
+    def test_ordering(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        using Py = import "/capnpy/annotate.capnp";
+        struct Person $Py.key("name, age, height, flag") {
+            name @0 :Text;
+            age @1 :Int64;
+            height @2 :Float64;
+            flag @3 :Bool;
+            extra @4 :Text;
+        }
+        """
+        mod = self.compile(schema)
+        Person = mod.Person
+        people = [Person(b'bob', 30, 1.8, True, b''),
+                  Person(b'alice', 40, 1.6, False, b''),
+                  Person(b'bob', -1, 1.7, False, b''),
+                  Person(b'bob', 30, 1.5, False, b''),
+                  Person(b'bob', 30, 1.5, True, b''),
+                  Person(b'al', 50, 1.9, True, b'')]
+        keys = [p._key() for p in people]
+        for a, ka in zip(people, keys):
+            for b, kb in zip(people, keys):
+                assert (a < b) == (ka < kb)
+                assert (a <= b) == (ka <= kb)
+                assert (a > b) == (ka > kb)
+                assert (a >= b) == (ka >= kb)
+                assert (a == b) == (ka == kb)
+        assert [p._key() for p in sorted(people)] == sorted(keys)
+        #
+        # comparisons with tuples
+        assert people[0] < (b'bob', 31, 0.0, False)
+        assert (b'bob', 31, 0.0, False) > people[0]
+        #
+        # the order of NULL and strings is undefined, as for None and bytes
+        py.test.raises(TypeError, lambda: Person(None) < Person(b'x'))
+
+    def test_ordering_default_value(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        using Py = import "/capnpy/annotate.capnp";
+        struct P $Py.key("x, n") {
+            x @0 :Float64;
+            n @1 :Int32 = 5;
+        }
+        """
+        mod = self.compile(schema)
+        P = mod.P
+        assert P(x=0.0, n=1) < P(x=0.0, n=6)
+        assert P(x=0.0, n=4) < P(x=0.0, n=5)
+        assert P(x=0.0, n=5) > P(x=0.0, n=-1)
+        assert not P(x=0.0, n=6) < P(x=0.0, n=1)
+
+    def test_ordering_no_key(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0 :Int64;
+        }
+        """
+        mod = self.compile(schema)
+        p = mod.Point(1)
+        py.test.raises(TypeError, lambda: p < p)
+
+    def test_sort_key(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        using Py = import "/capnpy/annotate.capnp";
+        enum Color { red @0; green @1; }
+        struct Point $Py.key("x, y") {
+            x @0 :Int32;
+            y @1 :Int32;
+        }
+        struct Foo $Py.key("*") {
+            name @0 :Text;
+            n @1 :Int64;
+            f @2 :Float32;
+            b @3 :Bool;
+            color @4 :Color;
+            data @5 :Data;
+            p @6 :Point;
+            v @7 :Void;
+        }
+        """
+        mod = self.compile(schema)
+        P = mod.Point
+        red, green = mod.Color.red, mod.Color.green
+        foos = [mod.Foo(b'a', 1, 0.5, True, red, b'', P(1, 2)),
+                mod.Foo(b'a', 1, 0.5, True, red, b'', P(1, -2)),
+                mod.Foo(b'a', 1, 0.5, True, green, b'', P(1, 2)),
+                mod.Foo(b'a', 1, -0.5, True, red, b'', P(1, 2)),
+                mod.Foo(b'a', -1, 0.5, False, red, b'x', P(1, 2)),
+                mod.Foo(b'a\x00', 0, 0.5, False, red, b'', P(0, 0)),
+                mod.Foo(b'ab', 0, 0.5, False, red, b'', P(0, 0)),
+                mod.Foo(b'', 0, 0.5, False, red, b'', P(0, 0))]
+        expected = sorted(foos, key=lambda foo: foo._key())
+        assert sorted(foos, key=lambda foo: foo.sort_key()) == expected
+        assert foos[0].sort_key() == mod.Foo.loads(foos[0].dumps()).sort_key()
+
+    def test_sort_key_unsupported(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        using Py = import "/capnpy/annotate.capnp";
+        struct Foo $Py.key("x") {
+            x @0 :List(Int64);
+        }
+        """
+        mod = self.compile(schema)
+        py.test.raises(TypeError, lambda: mod.Foo([1]).sort_key())
+
 
 class TestFashHash(CompilerTest):
 
@@ -115,7 +225,7 @@ class TestFashHash(CompilerTest):
         mod = self.compile(schema)
         self.only_fasthash(mod.Point)
         p1 = mod.Point(1, 2, b"p1")
-        exc = py.test.raises(ValueError, "hash(p1)")
+        exc = py.test.raises(ValueError, lambda: hash(p1))
         assert exc.value.args[0] == "slow hash not allowed"
 
     def test_fasthash_int_long(self):
@@ -146,3 +256,139 @@ class TestFashHash(CompilerTest):
         self.only_fasthash(mod.Person)
         p = mod.Person(b"mickey", b"mouse")
         assert hash(p) == hash(("mickey", "mouse"))
+
+    def test_fasthash_mixed(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        using Py = import "/capnpy/annotate.capnp";
+        enum Color { red @0; green @1; blue @2; }
+        struct Foo $Py.key("*") {
+            a @0 :Float64;
+            b @1 :Float32;
+            c @2 :Bool;
+            d @3 :Color;
+            e @4 :Data;
+            f @5 :Color = blue;
+        }
+        """
+        mod = self.compile(schema)
+        self.only_fasthash(mod.Foo)
+        green = mod.Color.green
+        for a in (0.0, 1.5, -2.25, 1e100, float('inf')):
+            foo = mod.Foo(a, 0.5, True, green, b'xyz', green)
+            assert hash(foo) == hash((a, 0.5, True, green, b'xyz', green))
+        foo = mod.Foo(0.0, 0.0, False, green, None, mod.Color.blue)
+        assert hash(foo) == hash((0.0, 0.0, False, green, None, mod.Color.blue))
+
+    def test_fasthash_nested(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        using Py = import "/capnpy/annotate.capnp";
+        struct Rectangle $Py.key("a, b") {
+            a @0 :Point;
+            b @1 :Point;
+        }
+        struct Point $Py.key("x, y") {
+            x @0 :Int64;
+            y @1 :Int64;
+        }
+        """
+        mod = self.compile(schema)
+        self.only_fasthash(mod.Rectangle)
+        self.only_fasthash(mod.Point)
+        r = mod.Rectangle(mod.Point(1, 2), mod.Point(3, 4))
+        assert hash(r) == hash(((1, 2), (3, 4)))
+        r = mod.Rectangle(mod.Point(1, 2), None)
+        assert hash(r) == hash(((1, 2), None))
+
+
+class TestFastEquals(CompilerTest):
+
+    SKIP = ('py',) # pyx only test
+
+    def no_key(self, cls):
+        @cls.__extend__
+        class Foo:
+            def _key(self):
+                raise ValueError('slow equality not allowed')
+
+    def test_fastequals(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        using Py = import "/capnpy/annotate.capnp";
+        enum Color { red @0; green @1; }
+        struct Foo $Py.key("*") {
+            a @0 :Int64;
+            b @1 :UInt8;
+            c @2 :Float64;
+            d @3 :Bool;
+            e @4 :Color;
+            f @5 :Text;
+            g @6 :Data;
+            h @7 :Void;
+        }
+        """
+        mod = self.compile(schema)
+        self.no_key(mod.Foo)
+        red, green = mod.Color.red, mod.Color.green
+        def foo(a=1, b=2, c=3.0, d=True, e=red, f=b'x', g=b'y'):
+            return mod.Foo(a, b, c, d, e, f, g)
+        #
+        assert foo() == foo()
+        assert not foo() != foo()
+        assert foo() != foo(a=2)
+        assert foo() != foo(b=3)
+        assert foo() != foo(c=3.5)
+        assert foo() != foo(d=False)
+        assert foo() != foo(e=green)
+        assert foo() != foo(f=b'xx')
+        assert foo() != foo(f=b'z')
+        assert foo() != foo(g=b'')
+        # NULL is not the same as the empty string
+        assert foo(f=None) == foo(f=None)
+        assert foo(f=None) != foo(f=b'')
+        # floats are compared by value
+        assert foo(c=0.0) == foo(c=-0.0)
+        assert foo(c=float('nan')) != foo(c=float('nan'))
+
+    def test_different_layout(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        using Py = import "/capnpy/annotate.capnp";
+        struct Point $Py.key("x, y") {
+            x @0 :Int64;
+            y @1 :Int64;
+        }
+        struct Point1 {
+            x @0 :Int64;
+        }
+        """
+        mod = self.compile(schema)
+        self.no_key(mod.Point)
+        # a "truncated" Point, as written by an older version of the schema
+        p1 = mod.Point1(1).compact()
+        p1 = mod.Point.loads(p1.dumps())
+        assert p1._data_size == 1
+        assert p1 == mod.Point(1, 0)
+        assert p1 != mod.Point(1, 2)
+
+    def test_nested(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        using Py = import "/capnpy/annotate.capnp";
+        struct Point $Py.key("x, y") {
+            x @0 :Int64;
+            y @1 :Int64;
+        }
+        struct Rectangle $Py.key("a, b") {
+            a @0 :Point;
+            b @1 :Point;
+        }
+        """
+        mod = self.compile(schema)
+        p1 = mod.Point(1, 2)
+        p2 = mod.Point(3, 4)
+        assert mod.Rectangle(p1, p2) == mod.Rectangle(p1, p2)
+        assert mod.Rectangle(p1, p2) != mod.Rectangle(p2, p1)
+        # comparisons with other types still go through the key
+        assert mod.Rectangle(p1, p2) == ((1, 2), (3, 4))
@@ -0,0 +1,50 @@
+import sys
+import pytest
+from capnpy.testing.compiler.support import CompilerTest
+
+class TestLazy(CompilerTest):
+
+    schema = """
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0 :Int64;
+            y @1 :Int64;
+        }
+        struct Rectangle {
+            a @0 :Point;
+            b @1 :Point;
+            color @2 :Color;
+        }
+        enum Color {
+            red @0;
+            green @1;
+        }
+        struct Unused {
+            x @0 :Int64;
+        }
+        const answer :Int64 = 42;
+    """
+
+    def test_lazy(self):
+        mod = self.compile(self.schema, lazy=True)
+        if not self.pyx and sys.version_info >= (3, 7):
+            assert 'Rectangle' not in mod.__dict__
+            assert 'Rectangle' in dir(mod)
+        r = mod.Rectangle(a=(1, 2), b=(3, 4), color=mod.Color.green)
+        assert r.a.x == 1
+        assert r.b.y == 4
+        assert r.color == mod.Color.green
+        assert mod.answer == 42
+        if not self.pyx and sys.version_info >= (3, 7):
+            # Rectangle has been defined together with its dependencies
+            assert 'Point' in mod.__dict__
+            assert 'Color' in mod.__dict__
+            assert 'Unused' not in mod.__dict__
+        assert mod.Unused(x=42).x == 42
+        pytest.raises(AttributeError, lambda: mod.Nonexistent)
+
+    def test_same_module(self):
+        mod = self.compile(self.schema, lazy=True)
+        p = mod.Point(1, 2)
+        r = mod.Rectangle(a=p, b=p)
+        assert type(r.a) is mod.Point
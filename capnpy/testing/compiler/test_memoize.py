@@ -0,0 +1,97 @@
+import pytest
+from capnpy.testing.compiler.support import CompilerTest
+
+class TestMemoize(CompilerTest):
+
+    schema = """
+        @0xbf5147cbbecf40c1;
+        using Py = import "/capnpy/annotate.capnp";
+        struct Point {
+            x @0 :Int64;
+            y @1 :Int64;
+        }
+        struct Foo $Py.memoize {
+            point @0 :Point;
+            items @1 :List(Int64);
+            empty @2 :Point;
+            group :group {
+                a @3 :Int64;
+                inner @4 :Point;
+            }
+        }
+        struct Bar {
+            point @0 :Point;
+        }
+    """
+
+    def test_memoize(self):
+        mod = self.compile(self.schema)
+        p = mod.Point(1, 2)
+        foo = mod.Foo(point=p, items=[1, 2, 3], empty=None,
+                      group=(42, p))
+        assert foo.point is foo.point
+        assert foo.point.x == 1
+        assert foo.items is foo.items
+        assert list(foo.items) == [1, 2, 3]
+        assert foo.group is foo.group
+        assert foo.group.a == 42
+        # groups inherit the setting from their parent
+        assert foo.group.inner is foo.group.inner
+        assert foo.group.inner.y == 2
+        # null pointers are not cached but still work
+        assert foo.empty is None
+        assert foo.empty is None
+        assert foo.get_empty().x == 0
+        #
+        # structs without the annotation are not affected
+        bar = mod.Bar(point=p)
+        assert bar.point is not bar.point
+        assert bar.point.x == 1
+
+    def test_memoize_union(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        using Py = import "/capnpy/annotate.capnp";
+        struct Point {
+            x @0 :Int64;
+            y @1 :Int64;
+        }
+        struct Shape $Py.memoize {
+            union {
+                point @0 :Point;
+                items @1 :List(Int64);
+            }
+        }
+        """
+        mod = self.compile(schema)
+        shape = mod.Shape.new_point(mod.Point(1, 2))
+        assert shape.point is shape.point
+        pytest.raises(ValueError, lambda: shape.items)
+
+    def test_memoize_cursor(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        using Py = import "/capnpy/annotate.capnp";
+        struct Point {
+            x @0 :Int64;
+            y @1 :Int64;
+        }
+        struct Foo $Py.memoize {
+            point @0 :Point;
+        }
+        struct Bar {
+            items @0 :List(Foo);
+        }
+        """
+        mod = self.compile(schema)
+        bar = mod.Bar([mod.Foo(mod.Point(1, 2)), mod.Foo(mod.Point(3, 4))])
+        # the memoized values are discarded when the cursor moves on
+        xs = [foo.point.x for foo in bar.items.cursor()]
+        assert xs == [1, 3]
+
+    def test_memoize_global(self):
+        mod = self.compile(self.schema, memoize=True)
+        p = mod.Point(1, 2)
+        bar = mod.Bar(point=p)
+        assert bar.point is bar.point
+        assert bar.point.x == 1
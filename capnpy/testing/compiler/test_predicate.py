@@ -0,0 +1,138 @@
+import pytest
+from io import BytesIO
+from capnpy.testing.compiler.support import CompilerTest
+from capnpy.message import dumps, load_all
+from capnpy.predicate import fields
+
+class TestPredicate(CompilerTest):
+
+    schema = """
+        @0xbf5147cbbecf40c1;
+        enum Color {
+            red @0;
+            green @1;
+        }
+        struct Foo {
+            status @0 :Int32 = 7;
+            name @1 :Text;
+            flag @2 :Bool = true;
+            color @3 :Color;
+            data @4 :Data;
+            union {
+                a @5 :Int64;
+                b @6 :Int64;
+            }
+        }
+    """
+
+    def get_stream(self, mod):
+        objs = []
+        for i in range(6):
+            name = b'x%d' % i if i % 2 else b'y'
+            objs.append(mod.Foo(status=i % 3, name=name, flag=i < 3,
+                                color=i % 2, data=None, a=i))
+        return BytesIO(b''.join([dumps(obj) for obj in objs]))
+
+    def where(self, mod, predicate, reuse=False):
+        f = self.get_stream(mod)
+        return [obj.a for obj in load_all(f, mod.Foo, reuse=reuse,
+                                          where=predicate)]
+
+    def test_predicate_fields(self):
+        mod = self.compile(self.schema)
+        assert mod.Foo.__field_layout__ == (
+            ('status', 'primitive', 0, 'i', -1, 7),
+            ('name', 'text', 0, None, -1, None),
+            ('flag', 'bool', 4, 0, -1, True),
+            ('color', 'primitive', 6, 'h', -1, None),
+            ('data', 'data', 8, None, -1, None),
+            ('a', 'primitive', 8, 'q', 0, None),
+            ('b', 'primitive', 8, 'q', 1, None))
+        assert mod.Foo._predicate_fields() == (
+            ('status', 'primitive', 0, 'i', 7),
+            ('name', 'text', 0, None, None),
+            ('flag', 'bool', 4, 1, True),
+            ('color', 'primitive', 6, 'h', 0),
+            ('data', 'data', 8, None, None))
+        assert mod.Foo._data_fields() == (('color', 6, 'h'),)
+        F = fields(mod.Foo)
+        assert F.status.name == 'status'
+        assert not hasattr(F, 'a')
+
+    def test_compare(self):
+        mod = self.compile(self.schema)
+        F = fields(mod.Foo)
+        assert self.where(mod, F.status == 2) == [2, 5]
+        assert self.where(mod, F.status != 2) == [0, 1, 3, 4]
+        assert self.where(mod, F.status >= 1) == [1, 2, 4, 5]
+        assert self.where(mod, F.flag == False) == [3, 4, 5]
+        assert self.where(mod, F.color == mod.Color.green) == [1, 3, 5]
+        assert self.where(mod, F.name == b'y') == [0, 2, 4]
+        assert self.where(mod, F.data == None) == [0, 1, 2, 3, 4, 5]
+
+    def test_startswith(self):
+        mod = self.compile(self.schema)
+        F = fields(mod.Foo)
+        assert self.where(mod, F.name.startswith(b'x')) == [1, 3, 5]
+        assert self.where(mod, F.data.startswith(b'')) == []
+        pytest.raises(TypeError, lambda: F.status.startswith(b'x'))
+
+    def test_combine(self):
+        mod = self.compile(self.schema)
+        F = fields(mod.Foo)
+        assert self.where(mod, (F.status == 0) & F.name.startswith(b'x')) == [3]
+        assert self.where(mod, (F.status == 0) | (F.color == 1)) == [0, 1, 3, 5]
+        assert self.where(mod, ~(F.status == 0)) == [1, 2, 4, 5]
+
+    def test_reuse(self):
+        mod = self.compile(self.schema)
+        F = fields(mod.Foo)
+        f = self.get_stream(mod)
+        objs = list(load_all(f, mod.Foo, where=F.status == 1))
+        assert [obj.a for obj in objs] == [1, 4]
+        assert objs[0] is not objs[1]
+        #
+        f = self.get_stream(mod)
+        res = [(obj, obj.a) for obj in load_all(f, mod.Foo, reuse=True,
+                                                where=F.status == 1)]
+        (obj1, a1), (obj2, a2) = res
+        assert obj1 is obj2
+        assert (a1, a2) == (1, 4)
+
+    def test_compare_on_buffer(self):
+        mod = self.compile(self.schema)
+        F = fields(mod.Foo)
+        # status has a default value, so it is XORed in the buffer
+        assert self.where(mod, F.status < 2) == [0, 1, 3, 4]
+        assert self.where(mod, F.status > 0) == [1, 2, 4, 5]
+        assert self.where(mod, F.name < b'x2') == [1]
+        assert self.where(mod, F.name >= b'x2') == [0, 2, 3, 4, 5]
+        assert self.where(mod, F.name != b'y') == [1, 3, 5]
+        assert self.where(mod, F.name == b'') == []
+        assert self.where(mod, F.name.startswith(b'x1')) == [1]
+        assert self.where(mod, F.name.startswith(b'x11')) == []
+        # values which cannot be stored in the field are compared as usual
+        assert self.where(mod, F.status == 2**40) == []
+        assert self.where(mod, F.status < 2**40) == [0, 1, 2, 3, 4, 5]
+        assert self.where(mod, F.status == 2.0) == [2, 5]
+        assert self.where(mod, F.name == u'y') == []
+
+    def test_match_at(self):
+        mod = self.compile(self.schema)
+        F = fields(mod.Foo)
+        foo = mod.Foo(status=2, name=b'hello', flag=False, color=1, a=0)
+        seg = foo._seg
+        args = (seg, foo._data_offset, foo._data_size, foo._ptrs_size)
+        assert (F.status == 2).match_at(*args)
+        assert (F.name == b'hello').match_at(*args)
+        assert F.name.startswith(b'he').match_at(*args)
+        assert not (F.flag == True).match_at(*args)
+        assert (F.status == 2).match(foo)
+        # a struct with no data and no pointers: all the fields have their
+        # default value
+        args = (seg, 0, 0, 0)
+        assert (F.status == 7).match_at(*args)
+        assert (F.status >= 7).match_at(*args)
+        assert (F.flag == True).match_at(*args)
+        assert (F.name == None).match_at(*args)
+        assert not F.name.startswith(b'').match_at(*args)
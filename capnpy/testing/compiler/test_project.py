@@ -0,0 +1,106 @@
+import pytest
+from capnpy.testing.compiler.support import CompilerTest
+
+class TestProject(CompilerTest):
+
+    schema = """
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0 :Int64;
+            y @1 :Int64;
+            name @2 :Text;
+        }
+        struct Foo {
+            a @0 :Int32;
+            b @1 :Point;
+            flag @2 :Bool;
+            other @3 :Bool;
+            items @4 :List(Point);
+            text @5 :Text;
+            g :group {
+                c @6 :Int64;
+                d @7 :Text;
+            }
+            union {
+                u1 @8 :Int64;
+                u2 @9 :Text;
+            }
+        }
+    """
+
+    def get_foo(self, mod):
+        P = mod.Point
+        items = [P(i, -i, b'item') for i in range(3)]
+        return mod.Foo(a=1, b=P(2, 3, b'b'), flag=True, other=True,
+                       items=items, text=b'hello', g=(5, b'd'), u2=b'u')
+
+    def test_field_layout(self):
+        mod = self.compile(self.schema)
+        assert mod.Foo.__field_layout__ == (
+            ('a', 'primitive', 0, 'i', -1, None),
+            ('b', 'ptr', 0, None, -1, None),
+            ('flag', 'bool', 4, 0, -1, None),
+            ('other', 'bool', 4, 1, -1, None),
+            ('items', 'ptr', 8, None, -1, None),
+            ('text', 'text', 16, None, -1, None),
+            ('g', 'group', 0, None, -1, None),
+            ('u1', 'primitive', 16, 'q', 0, None),
+            ('u2', 'text', 32, None, 1, None))
+
+    def test_project_flat(self):
+        mod = self.compile(self.schema)
+        foo = self.get_foo(mod)
+        res = foo.project('a', 'other', 'text')
+        assert type(res) is mod.Foo
+        assert res.a == 1
+        assert not res.flag
+        assert res.other
+        assert res.text == b'hello'
+        assert res.b is None
+        assert res.items is None
+        assert res.g.c == 0
+        assert res.g.d is None
+        # the union tag is preserved, but not the value
+        assert res.is_u2()
+        assert res.u2 is None
+        assert len(res.dumps()) < len(foo.dumps())
+
+    def test_project_whole_subtree(self):
+        mod = self.compile(self.schema)
+        foo = self.get_foo(mod)
+        res = foo.project('b', 'items')
+        assert res.b.x == 2
+        assert res.b.name == b'b'
+        assert [(p.x, p.y, p.name) for p in res.items] == [
+            (0, 0, b'item'), (1, -1, b'item'), (2, -2, b'item')]
+        assert res.a == 0
+        assert res.text is None
+
+    def test_project_nested(self):
+        mod = self.compile(self.schema)
+        foo = self.get_foo(mod)
+        res = foo.project('b.y', 'items[*].x', 'items[*].name')
+        assert (res.b.x, res.b.y, res.b.name) == (0, 3, None)
+        assert [(p.x, p.y, p.name) for p in res.items] == [
+            (0, 0, b'item'), (1, 0, b'item'), (2, 0, b'item')]
+        # selecting the whole field wins over its subfields
+        res = foo.project('b', 'b.y')
+        assert res.b.name == b'b'
+
+    def test_project_group_and_union(self):
+        mod = self.compile(self.schema)
+        foo = self.get_foo(mod)
+        res = foo.project('g.d', 'u1', 'u2')
+        assert res.g.c == 0
+        assert res.g.d == b'd'
+        assert res.u2 == b'u'
+        res = foo.project('g')
+        assert res.g.c == 5
+        assert res.g.d == b'd'
+
+    def test_project_errors(self):
+        mod = self.compile(self.schema)
+        foo = self.get_foo(mod)
+        pytest.raises(ValueError, lambda: foo.project('xxx'))
+        pytest.raises(ValueError, lambda: foo.project('a.b'))
+        pytest.raises(TypeError, lambda: foo.project('b[*].x'))
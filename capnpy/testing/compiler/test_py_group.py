@@ -63,3 +63,24 @@ class TestPyGroup(CompilerTest):
         assert foo.xyz == foo2.xyz == (foo.x, foo.y, foo.z) == (2, 3, b'abc')
         assert hash(foo.xyz) == hash(foo2.xyz) == hash((foo.x, foo.y, foo.z)) == hash((2, 3, b'abc'))
 
+
+    def test_same_name_in_different_structs(self):
+        schema = """
+        @0xbf5147cbbecf40c1;
+        using Py = import "/capnpy/annotate.capnp";
+        struct Foo {
+            x @0 :Int64;
+            y @1 :Int64;
+            g @2: Void $Py.group("x, y");
+        }
+        struct Bar {
+            a @0 :Text;
+            b @1 :Int64;
+            g @2: Void $Py.group("a, b");
+        }
+        """
+        mod = self.compile(schema)
+        foo = mod.Foo(1, 2)
+        assert (foo.g.x, foo.g.y) == (1, 2)
+        bar = mod.Bar(b'abc', 3)
+        assert (bar.g.a, bar.g.b) == (b'abc', 3)
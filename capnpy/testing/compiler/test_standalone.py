@@ -159,3 +159,51 @@ class TestStandalone(CompilerTest):
                         'capnpy Fake 1.0, but the current version of capnpy '
                         'is Fake 2.0. Please recompile.')
             assert str(exc.value) == expected
+
+    def test_cimport(self):
+        self.compile("example.capnp", """
+        @0xbf5147cbbecf40c1;
+        struct Point {
+            x @0: Int64;
+            y @1: Int64 = 10;
+            name @2: Text;
+            flag @3: Bool;
+        }
+        """)
+        pxd = self.tmpdir.join('example.pxd')
+        if not self.pyx:
+            assert not pxd.check()
+            return
+        src = pxd.read()
+        assert 'cdef class Point(_Struct):' in src
+        assert 'cpdef _int64_t get_x(self) except? 0x7fffffffffffffff' in src
+        assert 'cpdef bint get_flag(self) except? -1' in src
+        #
+        # a Cython module which cimports the generated one and calls the
+        # cpdef methods directly
+        from pyximport.pyxbuild import pyx_to_dll
+        self.write("user.pyx", """
+        from example cimport Point
+
+        def get_name(Point p):
+            if p.has_name():
+                return p.get_name()
+            return None
+
+        def get_sum(Point p):
+            cdef long res = p.get_x() + p.get_y()
+            if p.get_flag():
+                res = -res
+            return res
+        """)
+        root = py.path.local(capnpy.__file__).dirpath('..')
+        dll = pyx_to_dll(str(self.tmpdir.join('user.pyx')),
+                         pyxbuild_dir=str(self.tmpdir.join('build')),
+                         setup_args=dict(include_dirs=[str(root.join('capnpy'))]))
+        py.path.local(dll).copy(self.tmpdir, mode=True)
+        example = self.import_('example')
+        user = self.import_('user')
+        assert user.get_name(example.Point(1, 2, b'foo')) == b'foo'
+        assert user.get_name(example.Point(1, 2)) is None
+        assert user.get_sum(example.Point(1, 2)) == 3
+        assert user.get_sum(example.Point(x=1, flag=True)) == -11
@@ -0,0 +1,66 @@
+# -*- encoding: utf-8 -*-
+import pytest
+from capnpy.testing.compiler.support import CompilerTest
+from capnpy.blob import PYX
+from capnpy.segment import base
+
+class TestText(CompilerTest):
+
+    schema = """
+        @0xbf5147cbbecf40c1;
+        using Py = import "/capnpy/annotate.capnp";
+        struct Person {
+            name @0 :Text $Py.text("decode");
+            surname @1 :Text $Py.text("cache");
+            country @2 :Text $Py.text("intern");
+            email @3 :Text;
+        }
+    """
+
+    def test_decode(self):
+        mod = self.compile(self.schema)
+        p = mod.Person(name=u'Mickey'.encode('utf-8'),
+                       surname=u'Möuse'.encode('utf-8'))
+        assert p.name_str == u'Mickey'
+        assert p.surname_str == u'Möuse'
+        assert type(p.name_str) is type(u'')
+        assert p.name_str is not p.name_str
+        # "cache" decodes only once
+        assert p.surname_str is p.surname_str
+        assert not hasattr(p, 'email_str')
+
+    def test_null(self):
+        mod = self.compile(self.schema)
+        p = mod.Person(name=None, surname=None, country=None)
+        assert p.name_str is None
+        assert p.surname_str is None
+        assert p.country_str is None
+
+    def test_intern(self):
+        mod = self.compile(self.schema)
+        p1 = mod.Person(country=b'IT')
+        p2 = mod.Person(country=b'IT')
+        p3 = mod.Person(country=b'FR')
+        assert p1.country_str == u'IT'
+        assert p1.country_str is p2.country_str
+        assert p3.country_str == u'FR'
+
+    @pytest.mark.skipif(PYX, reason='the pyx table is a C-level array')
+    def test_intern_max(self, monkeypatch):
+        mod = self.compile(self.schema)
+        monkeypatch.setattr(base, '_interned_text', {})
+        monkeypatch.setattr(base, 'MAX_INTERNED_TEXT', 0)
+        p1 = mod.Person(country=b'IT')
+        assert p1.country_str == u'IT'
+        assert base._interned_text == {}
+
+    def test_invalid(self):
+        schema = """
+            @0xbf5147cbbecf40c1;
+            using Py = import "/capnpy/annotate.capnp";
+            struct Person {
+                name @0 :Text $Py.text("foo");
+            }
+        """
+        exc = pytest.raises(ValueError, lambda: self.compile(schema))
+        assert 'Error in $Py.text' in str(exc.value)
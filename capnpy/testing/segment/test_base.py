@@ -86,6 +86,67 @@ class TestBaseSegment(object):
             val2 = struct.unpack_from(fmt, buf, 0)[0]
             assert val == val2
 
+    def test_eq_primitive(self):
+        a = BaseSegment(struct.pack('qdd', 42, 0.0, float('nan')))
+        b = BaseSegment(struct.pack('qqdd', 0, 42, -0.0, float('nan')))
+        assert a.eq_primitive(0, b, 8, ord('q'))
+        assert not a.eq_primitive(0, b, 0, ord('q'))
+        assert a.eq_primitive(0, b, 8, ord('b'))
+        assert a.eq_primitive(8, b, 16, ord('d'))
+        assert not a.eq_primitive(16, b, 24, ord('d'))
+
+    def test_eq_bytes(self):
+        a = BaseSegment(b'hello world')
+        b = BaseSegment(b'say hello')
+        assert a.eq_bytes(0, b, 4, 5)
+        assert not a.eq_bytes(0, b, 3, 5)
+        pytest.raises(IndexError, lambda: a.eq_bytes(0, b, 5, 5))
+
+    def test_cmp_primitive(self):
+        a = BaseSegment(struct.pack('qq', -1, 5))
+        b = BaseSegment(struct.pack('qq', 5, -1))
+        assert a.cmp_primitive(0, b, 0, ord('q')) == -1
+        assert a.cmp_primitive(0, b, 8, ord('q')) == 0
+        assert a.cmp_primitive(8, b, 0, ord('q')) == 0
+        # as unsigned, -1 is the biggest number
+        assert a.cmp_primitive(0, b, 0, ord('Q')) == 1
+        assert a.cmp_primitive(0, b, 0, ord('B')) == 1
+        assert a.cmp_primitive(0, b, 0, ord('b')) == -1
+        pytest.raises(ValueError, lambda: a.cmp_primitive(0, b, 0, ord('d')))
+
+    def test_cmp_bytes(self):
+        a = BaseSegment(b'abcd')
+        b = BaseSegment(b'abce')
+        assert a.cmp_bytes(0, b, 0, 3) == 0
+        assert a.cmp_bytes(0, b, 0, 4) == -1
+        assert b.cmp_bytes(0, a, 0, 4) == 1
+        pytest.raises(IndexError, lambda: a.cmp_bytes(0, b, 1, 4))
+
+    def test_decode_utf8(self):
+        s = BaseSegment(b'garbage0h\xc3\xa9llo')
+        assert s.decode_utf8(8, 6) == u'h\xe9llo'
+        pytest.raises(UnicodeDecodeError, lambda: s.decode_utf8(8, 2))
+        pytest.raises(IndexError, lambda: s.decode_utf8(8, 7))
+
+    def test_decode_utf8_interned(self):
+        a = BaseSegment(b'garbage0h\xc3\xa9llo')
+        b = BaseSegment(b'h\xc3\xa9llo')
+        x = a.decode_utf8_interned(8, 6)
+        assert x == u'h\xe9llo'
+        assert b.decode_utf8_interned(0, 6) is x
+        assert b.decode_utf8_interned(0, 5) == u'h\xe9ll'
+        assert a.decode_utf8_interned(8, 0) == u''
+        pytest.raises(IndexError, lambda: a.decode_utf8_interned(8, 7))
+
+    def test_decode_utf8_interned_many(self):
+        # enough strings to have collisions in the table
+        buf = b''.join([b'%07d ' % i for i in range(2000)])
+        s = BaseSegment(buf)
+        first = [s.decode_utf8_interned(i*8, 7) for i in range(2000)]
+        again = [s.decode_utf8_interned(i*8, 7) for i in range(2000)]
+        assert first == [u'%07d' % i for i in range(2000)]
+        assert all(x is y for x, y in zip(first, again))
+
     def test_errors(self):
         buf = b'\xff' * 8
         s = BaseSegment(buf)
@@ -1,5 +1,6 @@
 from __future__ import print_function
 import pytest
+import array
 import struct
 from six import b
 
@@ -9,7 +10,8 @@ from capnpy.printer import print_buffer
 from capnpy.segment.segment import Segment
 from capnpy.segment.builder import SegmentBuilder
 from capnpy.struct_ import Struct
-from capnpy.list import PrimitiveItemType, StructItemType, TextItemType
+from capnpy.list import (PrimitiveItemType, StructItemType, TextItemType,
+                         BoolItemType)
 from capnpy.type import Types
 
 class TestSegmentBuilder(object):
@@ -247,6 +249,73 @@ class TestSegmentBuilder(object):
                          'G' 'H' 'I' 'J' '\x00\x00\x00\x00')  # GHIJ
         assert s == expected_buf
 
+    def test_copy_from_list_of_data_with_None(self):
+        buf = SegmentBuilder()
+        pos = buf.allocate(8)
+        item_type = TextItemType(Types.data)
+        buf.copy_from_list(pos, item_type, [b'AB', None, b'CDEFGHIJ'])
+        s = buf.as_string()
+        expected_buf = b('\x01\x00\x00\x00\x1e\x00\x00\x00'   # ptrlist
+                         '\x09\x00\x00\x00\x12\x00\x00\x00'   # ptr item 1
+                         '\x00\x00\x00\x00\x00\x00\x00\x00'   # NULL
+                         '\x05\x00\x00\x00\x42\x00\x00\x00'   # ptr item 3
+                         'A' 'B' '\x00\x00\x00\x00\x00\x00'   # AB
+                         'CDEFGHIJ')                          # CDEFGHIJ
+        assert s == expected_buf
+
+    def test_copy_from_list_of_unicode_text(self):
+        buf = SegmentBuilder()
+        pos = buf.allocate(8)
+        item_type = TextItemType(Types.text)
+        buf.copy_from_list(pos, item_type, [u'A', b'BC', None])
+        s = buf.as_string()
+        expected_buf = b('\x01\x00\x00\x00\x1e\x00\x00\x00'   # ptrlist
+                         '\x09\x00\x00\x00\x12\x00\x00\x00'   # ptr item 1
+                         '\x09\x00\x00\x00\x1a\x00\x00\x00'   # ptr item 2
+                         '\x00\x00\x00\x00\x00\x00\x00\x00'   # NULL
+                         'A' '\x00\x00\x00\x00\x00\x00\x00'   # A
+                         'B' 'C' '\x00\x00\x00\x00\x00\x00')  # BC
+        assert s == expected_buf
+
+    def test_copy_from_list_of_text_invalid_item(self):
+        buf = SegmentBuilder()
+        pos = buf.allocate(8)
+        item_type = TextItemType(Types.text)
+        with pytest.raises(TypeError):
+            buf.copy_from_list(pos, item_type, [b'A', 42])
+
+    def test_copy_from_list_of_bool(self):
+        buf = SegmentBuilder()
+        pos = buf.allocate(8)
+        item_type = BoolItemType()
+        items = [True, True, False, True, False, True, False, False,
+                 False, True]
+        buf.copy_from_list(pos, item_type, items)
+        s = buf.as_string()
+        assert s == b('\x01\x00\x00\x00\x51\x00\x00\x00'    # ptrlist
+                      '\x2b\x02\x00\x00\x00\x00\x00\x00')
+
+    def test_copy_from_list_buffer(self):
+        expected = b('\x01\x00\x00\x00\x1b\x00\x00\x00'   # ptrlist
+                     '\x01\x00\x02\x00\x03\x00\x00\x00')  # 1, 2, 3
+        item_type = PrimitiveItemType(Types.int16)
+        for items in (array.array('h', [1, 2, 3]),       # memcpy
+                      array.array('b', [1, 2, 3]),       # item by item
+                      memoryview(array.array('h', [1, 2, 3]))):
+            buf = SegmentBuilder()
+            pos = buf.allocate(8)
+            buf.copy_from_list(pos, item_type, items)
+            assert buf.as_string() == expected
+
+    def test_write_array(self):
+        buf = SegmentBuilder()
+        pos = buf.allocate(16)
+        buf.write_array(pos, ord('h'), [1, 2, 3])
+        buf.write_array(pos+8, ord('f'), [1.5])
+        s = buf.as_string()
+        assert s == b('\x01\x00\x02\x00\x03\x00\x00\x00'
+                      '\x00\x00\xc0\x3f\x00\x00\x00\x00')
+
 
     def test_copy_from_list_of_structs_with_pointers(self):
         class Person(Struct):
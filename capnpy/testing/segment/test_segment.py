@@ -36,6 +36,28 @@ def test_read_str():
     s = bb.read_str(p, 0, "", additional_size=0)
     assert s == b"hello capnproto\0"
 
+def test_read_str_view():
+    buf = b('garbage0'
+            'hello capnproto\0') # string
+    p = ptr.new_list(0, ptr.LIST_SIZE_8, 16)
+    bb = Segment(buf)
+    s = bb.read_str_view(p, 0, None, additional_size=-1)
+    assert isinstance(s, memoryview)
+    assert s.readonly
+    assert s.tobytes() == b"hello capnproto"
+    s = bb.read_str_view(p, 0, None, additional_size=0)
+    assert s.tobytes() == b"hello capnproto\0"
+    assert bb.read_str_view(0, 0, None, additional_size=0) is None
+
+def test_read_unicode():
+    buf = b('garbage0'
+            'h\xc3\xa9llo\0\0\0') # string
+    p = ptr.new_list(0, ptr.LIST_SIZE_8, 7)
+    bb = Segment(buf)
+    s = bb.read_unicode(p, 0, None, additional_size=-1)
+    assert s == u'h\xe9llo'
+    assert bb.read_unicode(0, 0, None, additional_size=-1) is None
+
 def test_hash_str():
     buf = b('garbage0'
             'hello capnproto\0') # string
@@ -46,6 +68,35 @@ def test_hash_str():
     h = bb.hash_str(p, 0, 0, additional_size=0)
     assert h == hash(b"hello capnproto\0")
 
+def test_eq_str():
+    buf = b('garbage0'
+            'hello\0\0\0'
+            'hello\0\0\0'
+            'world\0\0\0')
+    bb = Segment(buf)
+    p1 = ptr.new_list(0, ptr.LIST_SIZE_8, 6)
+    assert bb.eq_str(p1, 0, bb, p1, 8, additional_size=-1)   # hello == hello
+    assert not bb.eq_str(p1, 0, bb, p1, 16, additional_size=-1) # hello == world
+    p2 = ptr.new_list(0, ptr.LIST_SIZE_8, 4)
+    assert not bb.eq_str(p1, 0, bb, p2, 8, additional_size=-1) # hello == hel
+    # NULL pointers
+    assert bb.eq_str(0, 0, bb, 0, 8, additional_size=-1)
+    assert not bb.eq_str(p1, 0, bb, 0, 8, additional_size=-1)
+
+def test_cmp_str():
+    buf = b('garbage0'
+            'hello\0\0\0'
+            'hellp\0\0\0')
+    bb = Segment(buf)
+    p1 = ptr.new_list(0, ptr.LIST_SIZE_8, 6)
+    assert bb.cmp_str(p1, 0, bb, p1, 8, additional_size=-1) == -1
+    assert bb.cmp_str(p1, 8, bb, p1, 0, additional_size=-1) == 1
+    p2 = ptr.new_list(0, ptr.LIST_SIZE_8, 4)
+    assert bb.cmp_str(p1, 0, bb, p2, 0, additional_size=-1) == 1  # hello vs hel
+    assert bb.cmp_str(p2, 0, bb, p1, 8, additional_size=-1) == -1 # hel vs hellp
+    assert bb.cmp_str(0, 0, bb, 0, 8, additional_size=-1) == 0
+    py.test.raises(TypeError, lambda: bb.cmp_str(p1, 0, bb, 0, 8, -1))
+
 def test_hash_str_exception():
     buf = b''
     p = ptr.new_struct(0, 1, 1) # this is the wrong type of pointer
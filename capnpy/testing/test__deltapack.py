@@ -0,0 +1,42 @@
+import pytest
+from capnpy._deltapack import pack_delta, unpack_delta
+
+def roundtrip(data, prev=None):
+    packed = pack_delta(data, prev)
+    assert unpack_delta(packed, len(data), prev) == data
+    return packed
+
+def test_tags():
+    data = (b'\x01\x00\x00\x00\x00\x00\x00\x02'
+            b'\x00\x00\x00\x00\x00\x00\x00\x00')
+    assert roundtrip(data) == b'\x81\x01\x02' b'\x00\x00'
+
+def test_zero_run():
+    assert roundtrip(b'\x00' * 8 * 10) == b'\x00\x09'
+    packed = roundtrip(b'\x00' * 8 * 300)
+    assert packed == b'\x00\xff' b'\x00\x2b'
+
+def test_verbatim_run():
+    word = b'\x01\x02\x03\x04\x05\x06\x07\x08'
+    almost_full = b'\x01\x00\x03\x04\x05\x06\x07\x08'
+    sparse = b'\x01\x00\x00\x00\x00\x00\x00\x08'
+    data = word + word + almost_full + sparse
+    packed = roundtrip(data)
+    assert packed == (b'\xff' + word + b'\x02' + word + almost_full +
+                      b'\x81\x01\x08')
+
+def test_xor():
+    prev = b'\x01\x02\x03\x04\x05\x06\x07\x08' * 100
+    data = bytearray(prev)
+    data[10] = 42
+    data = bytes(data)
+    packed = roundtrip(data, prev)
+    assert packed == b'\x00\x00' b'\x04\x29' b'\x00\x61'
+
+def test_errors():
+    pytest.raises(ValueError, lambda: pack_delta(b'\x00' * 7, None))
+    pytest.raises(ValueError, lambda: pack_delta(b'\x00' * 8, b'\x00' * 16))
+    pytest.raises(ValueError, lambda: unpack_delta(b'\x00\x09', 8, None))
+    pytest.raises(ValueError, lambda: unpack_delta(b'\x00\x09', 160, None))
+    pytest.raises(ValueError, lambda: unpack_delta(b'\x81\x01', 8, None))
+    pytest.raises(ValueError, lambda: unpack_delta(b'\xff\x01\x02', 8, None))
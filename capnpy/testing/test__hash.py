@@ -1,4 +1,5 @@
 import sys
+import math
 from pypytools import IS_PYPY
 from six import PY3
 
@@ -53,3 +54,9 @@ def test_tuplehash():
     assert h((42,)) == hash((42,))
     assert h((42, 43)) == hash((42, 43))
     assert h((42, 43, 44)) == hash((42, 43, 44))
+
+def test_floathash():
+    h = _hash.floathash
+    for x in (0.0, -0.0, 1.0, -1.0, 0.5, 1.5, -2.75, math.pi, 1e300, -1e-300,
+              float(sys.maxsize), 2.0**61, 2.0**64, float('inf'), float('-inf')):
+        assert h(x) == hash(x)
@@ -1,5 +1,7 @@
 import pytest
-from capnpy.buffered import BufferedStream, BufferedSocket, StringBuffer
+from io import BytesIO
+from capnpy.buffered import (BufferedStream, BufferedSocket, StringBuffer,
+                             DeltaWriter, DeltaReader)
 
 class FakeSocket(object):
 
@@ -164,3 +166,51 @@ class TestStringBuffer(object):
         assert f.readline() == b'dddd'
         assert f.readline() == b''
         assert f.read(2) == b''
+
+
+class TestDelta(object):
+
+    def test_roundtrip(self):
+        f = BytesIO()
+        writer = DeltaWriter(f)
+        frames = [b'\x01' * 64, b'\x01' * 63 + b'\x02', b'\x03' * 16, b'']
+        for frame in frames:
+            writer.write(frame)
+        assert writer.bytes_in == 64 + 64 + 16
+        assert writer.bytes_out == len(f.getvalue())
+        #
+        reader = DeltaReader(BytesIO(f.getvalue()))
+        assert reader.read() == b''.join(frames)
+
+    def test_similar_frames_are_small(self):
+        f = BytesIO()
+        writer = DeltaWriter(f)
+        writer.write(b'\x01' * 800)
+        size = len(f.getvalue())
+        writer.write(b'\x01' * 799 + b'\x02')
+        assert len(f.getvalue()) - size < 16
+
+    def test_load_all(self):
+        from capnpy.message import dump, load_all
+        from capnpy.struct_ import Struct
+        from capnpy.type import Types
+        from capnpy.testing.test_message import _get_many_messages
+        messages = list(load_all(_get_many_messages(), Struct))
+        f = BytesIO()
+        writer = DeltaWriter(f)
+        for msg in messages * 3:
+            dump(msg, writer)
+        reader = DeltaReader(BytesIO(f.getvalue()))
+        points = [(p._read_data(0, Types.int64.ifmt),
+                   p._read_data(8, Types.int64.ifmt))
+                  for p in load_all(reader, Struct)]
+        assert points == [(1, 2), (3, 4)] * 3
+
+    def test_truncated(self):
+        f = BytesIO()
+        DeltaWriter(f).write(b'\x01' * 64)
+        buf = f.getvalue()
+        reader = DeltaReader(BytesIO(buf[:4]))
+        pytest.raises(ValueError, lambda: reader.read(8))
+        reader = DeltaReader(BytesIO(buf[:-1]))
+        pytest.raises(ValueError, lambda: reader.read(8))
@@ -1,5 +1,5 @@
 import py
-from six import b
+from six import b, PY3
 
 from capnpy.printer import print_buffer
 from capnpy.type import Types
@@ -84,6 +84,41 @@ def test_list_of_structs():
     #
     py.test.raises(TypeError, "lst == lst")
 
+def test_list_cursor():
+    class Point(Struct):
+        __static_data_size__ = 2
+        __static_ptrs_size__ = 0
+
+    buf = b('\x01\x00\x00\x00\x37\x00\x00\x00'    # ptrlist
+           '\x0c\x00\x00\x00\x02\x00\x00\x00'    # list tag
+           '\x0a\x00\x00\x00\x00\x00\x00\x00'    # 10
+           '\x64\x00\x00\x00\x00\x00\x00\x00'    # 100
+           '\x14\x00\x00\x00\x00\x00\x00\x00'    # 20
+           '\xc8\x00\x00\x00\x00\x00\x00\x00'    # 200
+           '\x1e\x00\x00\x00\x00\x00\x00\x00'    # 30
+           '\x2c\x01\x00\x00\x00\x00\x00\x00')   # 300
+    blob = Struct.from_buffer(buf, 0, data_size=0, ptrs_size=1)
+    lst = blob._read_list(0, StructItemType(Point))
+    points = []
+    objs = set()
+    for p in lst.cursor():
+        assert isinstance(p, Point)
+        assert p._data_size == 2
+        assert p._ptrs_size == 0
+        points.append((p._read_data(0, Types.int64.ifmt),
+                       p._read_data(8, Types.int64.ifmt)))
+        objs.add(id(p))
+    assert points == [(10, 100), (20, 200), (30, 300)]
+    assert len(objs) == 1
+    #
+    # the Python 2 protocol is supported as well
+    cursor = lst.cursor()
+    assert cursor.next()._read_data(0, Types.int64.ifmt) == 10
+    assert next(cursor)._read_data(0, Types.int64.ifmt) == 20
+    #
+    lst = blob._read_list(0, PrimitiveItemType(Types.int64))
+    py.test.raises(TypeError, lambda: lst.cursor())
+
 
 def test_string():
     buf = (b'\x01\x00\x00\x00\x82\x00\x00\x00'   # ptrlist
@@ -157,6 +192,57 @@ def test_list_of_strings_composite():
     lst = blob._read_list(0, TextItemType(Types.text))
     assert list(lst) == [b'A', b'BC', b'DEF', b'GHIJ']
 
+def test_list_of_strings_get_view():
+    buf = b('\x01\x00\x00\x00\x26\x00\x00\x00'   # ptrlist
+           '\x0d\x00\x00\x00\x12\x00\x00\x00'   # ptr item 1
+           '\x0d\x00\x00\x00\x1a\x00\x00\x00'   # ptr item 2
+           '\x00\x00\x00\x00\x00\x00\x00\x00'   # NULL
+           '\x09\x00\x00\x00\x22\x00\x00\x00'   # ptr item 4
+           'A' '\x00\x00\x00\x00\x00\x00\x00'   # A
+           'B' 'C' '\x00\x00\x00\x00\x00\x00'   # BC
+           'D' 'E' 'F' '\x00\x00\x00\x00\x00')  # DEF
+    blob = Struct.from_buffer(buf, 0, data_size=0, ptrs_size=1)
+    lst = blob._read_list(0, TextItemType(Types.text))
+    view = lst.get_view(1)
+    assert isinstance(view, memoryview)
+    assert view.readonly
+    assert view.tobytes() == b'BC'
+    assert lst.get_view(2) is None
+    assert lst.get_view(-1).tobytes() == b'DEF'
+    py.test.raises(IndexError, lambda: lst.get_view(4))
+    #
+    lst = blob._read_list(0, TextItemType(Types.data))
+    assert lst.get_view(0).tobytes() == b'A\x00'
+
+def test_get_view_unsupported():
+    buf = b('\x01\x00\x00\x00\x25\x00\x00\x00'   # ptrlist
+           '\x01\x00\x00\x00\x00\x00\x00\x00')  # 1
+    blob = Struct.from_buffer(buf, 0, data_size=0, ptrs_size=1)
+    lst = blob._read_list(0, PrimitiveItemType(Types.int64))
+    py.test.raises(TypeError, lambda: lst.get_view(0))
+    lst = blob._read_list(0, TextItemType(Types.data))
+    py.test.raises(TypeError, lambda: lst.as_view())
+
+def test_as_view():
+    buf = b('garbage0'
+           '\x01\x00\x00\x00\x25\x00\x00\x00'   # ptrlist
+           '\x01\x00\x00\x00\x00\x00\x00\x00'   # 1
+           '\x02\x00\x00\x00\x00\x00\x00\x00'   # 2
+           '\xfd\xff\xff\xff\xff\xff\xff\xff'   # -3
+           '\x04\x00\x00\x00\x00\x00\x00\x00')  # 4
+    blob = Struct.from_buffer(buf, 8, data_size=0, ptrs_size=1)
+    lst = blob._read_list(0, PrimitiveItemType(Types.int64))
+    if not PY3:
+        py.test.raises(NotImplementedError, lst.as_view)
+        return
+    view = lst.as_view()
+    assert view.format == 'q'
+    assert view.readonly
+    assert view.tolist() == [1, 2, -3, 4]
+    # the view keeps the buffer alive
+    del blob, lst
+    assert view[2] == -3
+
 def test_list_comparisons():
     buf1 = b('\x01\x00\x00\x00\x00\x00\x00\x00'   # 1
             '\x02\x00\x00\x00\x00\x00\x00\x00'   # 2
@@ -15,3 +15,17 @@ def test_compile(tmpdir):
     main(argv)
     assert tmpdir.join('example.py').exists()
 
+
+def test_request(tmpdir):
+    schema = textwrap.dedent("""
+    @0xbf5147cbbecf40c1;
+    struct Point {
+        x @0 :Int64;
+        y @1 :Int64;
+    }
+    """)
+    example_capnp = tmpdir.join('example.capnp')
+    example_capnp.write(schema)
+    argv = ['request', str(example_capnp)]
+    main(argv)
+    assert tmpdir.join('example.capnp.req').exists()
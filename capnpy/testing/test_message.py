@@ -49,6 +49,18 @@ def test_load_all():
     assert p2._read_data(0, Types.int64.ifmt) == 3
     assert p2._read_data(8, Types.int64.ifmt) == 4
 
+def test_load_all_reuse():
+    f = _get_many_messages()
+    points = []
+    for p in load_all(f, Struct, reuse=True):
+        points.append((p, p._read_data(0, Types.int64.ifmt),
+                       p._read_data(8, Types.int64.ifmt)))
+    assert len(points) == 2
+    (p1, x1, y1), (p2, x2, y2) = points
+    assert p1 is p2
+    assert (x1, y1) == (1, 2)
+    assert (x2, y2) == (3, 4)
+
 
 def test_loads():
     buf = b('\x00\x00\x00\x00\x03\x00\x00\x00'   # message header: 1 segment, size 3 words
@@ -0,0 +1,42 @@
+import itertools
+from capnpy import sortkey
+
+def check_order(values, encode):
+    values = sorted(values)
+    keys = [encode(v) for v in values]
+    for (a, ka), (b, kb) in itertools.combinations(zip(values, keys), 2):
+        assert (a < b) == (ka < kb)
+        assert (a == b) == (ka == kb)
+
+def test_encode_int():
+    check_order([-2**63, -1, 0, 1, 2, 255, 256, 2**63-1],
+                lambda v: sortkey.encode_int(v, 'q'))
+    check_order([0, 1, 255, 256, 2**64-1],
+                lambda v: sortkey.encode_int(v, 'Q'))
+    check_order([-128, -1, 0, 1, 127],
+                lambda v: sortkey.encode_int(v, 'b'))
+    assert len(sortkey.encode_int(42, 'h')) == 2
+
+def test_encode_float():
+    values = [float('-inf'), -1e300, -2.5, -1.0, -1e-300, 0.0, 1e-300,
+              1.0, 1.5, 1e300, float('inf')]
+    check_order(values, lambda v: sortkey.encode_float(v, 'd'))
+    check_order([-1.5, -1.0, 0.0, 1.0, 1.5],
+                lambda v: sortkey.encode_float(v, 'f'))
+    assert sortkey.encode_float(-0.0, 'd') == sortkey.encode_float(0.0, 'd')
+    nan = sortkey.encode_float(float('nan'), 'd')
+    assert nan > sortkey.encode_float(float('inf'), 'd')
+
+def test_encode_bytes():
+    check_order([b'', b'\x00', b'\x00\x00', b'\x00\x01', b'a', b'a\x00',
+                 b'a\x00b', b'a\x01', b'ab', b'b', b'\xff'],
+                sortkey.encode_bytes)
+    assert sortkey.encode_bytes(None) < sortkey.encode_bytes(b'')
+
+def test_concatenation():
+    # the encodings are self-delimiting, so concatenating them preserves the
+    # order of tuples
+    def encode(t):
+        return sortkey.encode_bytes(t[0]) + sortkey.encode_int(t[1], 'q')
+    check_order([(b'a', 3), (b'a', 4), (b'a\x00', -1), (b'ab', 0), (b'b', -5)],
+                encode)
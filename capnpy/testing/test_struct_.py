@@ -191,6 +191,27 @@ def test_comparisons_succeed():
     py.test.raises(TypeError, "s1 > s2")
     py.test.raises(TypeError, "s1 >= s2")
 
+def test_comparisons_key():
+    class MyStruct(Struct):
+        def _key(self):
+            return (self._seg.buf,)
+    #
+    s1 = MyStruct.from_buffer(b'a', 0, data_size=0, ptrs_size=0)
+    s2 = MyStruct.from_buffer(b'b', 0, data_size=0, ptrs_size=0)
+    assert s1 < s2
+    assert s1 <= s2
+    assert s2 > s1
+    assert s2 >= s1
+    assert s1 <= s1
+    assert not s1 < s1
+    assert s1 < (b'b',)
+    assert (b'b',) > s1
+    assert sorted([s2, s1]) == [s1, s2]
+
+def test_sort_key_fail():
+    s = Struct.from_buffer(b'', 0, data_size=0, ptrs_size=0)
+    py.test.raises(TypeError, lambda: s.sort_key())
+
 def test_check_null_buffer():
     py.test.raises(AssertionError, "Struct(None, 0, 0, 0)")
 
@@ -1,10 +1,11 @@
 import py
+import pytest
 import textwrap
 import inspect
 from six import binary_type, text_type
 
 from capnpy.util import extend, extend_module_maybe,\
-                        ensure_unicode, ensure_bytes
+                        ensure_unicode, ensure_bytes, LazyDefinitions
 
 def test_extend():
     class Foo(object):
@@ -20,6 +21,26 @@ def test_extend():
     assert Foo.a == 42
     assert Foo().foo() == 123
 
+def test_lazy_definitions():
+    myglobals = {'__name__': 'foo'}
+    lazy = LazyDefinitions(myglobals, [
+        (('A', 'A_answer'), (1,), 'class A(object):\n    b = lambda: B\nA_answer = 42\n'),
+        (('B',), (0,), 'class B(object):\n    a = lambda: A\n'),
+        (('C',), (), 'class C(object): pass\n'),
+    ])
+    assert 'A' in lazy.dir()
+    if 'A' in myglobals:
+        py.test.skip('module-level __getattr__ not supported')
+    A = lazy.getattr('A')
+    assert lazy.getattr('A') is A
+    # B is a dependency of A, so it has been defined as well
+    assert myglobals['A_answer'] == 42
+    assert A.b() is myglobals['B']
+    assert 'C' not in myglobals
+    pytest.raises(AttributeError, lambda: lazy.getattr('D'))
+    lazy.define_all()
+    assert 'C' in myglobals
+
 
 @py.test.mark.usefixtures('init')
 class TestExtendModuleMaybe(object):
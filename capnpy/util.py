@@ -1,6 +1,7 @@
 import sys
 import py
 import six
+import threading
 
 import capnpy
 try:
@@ -53,7 +54,7 @@ def find_module(path, modname, extension='.py'):
             return f
     return None
 
-def extend_module_maybe(globals, filename=None, modname=None):
+def extend_module_maybe(globals, filename=None, modname=None, lazy=None):
     if filename is not None:
         # /path/to/foo.py --> /path/to/foo_extended.py
         filename = py.path.local(filename)
@@ -69,10 +70,70 @@ def extend_module_maybe(globals, filename=None, modname=None):
     else:
         raise ValueError('You must pass either filename or modname')
     #
+    if lazy is not None:
+        # the extension module can reference any class of the module
+        lazy.define_all()
     src = extmod.read()
     code = compile(src, str(extmod), 'exec')
     exec(code, globals)
 
+class LazyDefinitions(object):
+    """
+    The definitions of a module compiled in lazy mode. Each entry is a tuple
+    ``(names, deps, src)``: ``src`` defines the global ``names``, and uses
+    the entries whose indexes are listed in ``deps``.
+
+    The generated module uses getattr() as its module-level __getattr__: the
+    first time one of the names is looked up, its entry is compiled and
+    executed in the globals of the module, after its dependencies. The
+    dependencies cannot be loaded on demand, because the generated code looks
+    them up as globals, which does not go through __getattr__.
+    """
+
+    def __init__(self, globals, entries):
+        self.globals = globals
+        self.entries = entries
+        self.defined = [False] * len(entries)
+        self.index = {} # name -> entry
+        for i, (names, deps, src) in enumerate(entries):
+            for name in names:
+                self.index[name] = i
+        self.lock = threading.RLock()
+        if sys.version_info < (3, 7):
+            # module-level __getattr__ is not supported (see PEP 562)
+            self.define_all()
+
+    def getattr(self, name):
+        try:
+            i = self.index[name]
+        except KeyError:
+            raise AttributeError("module '%s' has no attribute '%s'" %
+                                 (self.globals['__name__'], name))
+        with self.lock:
+            self._define(i)
+        return self.globals[name]
+
+    def dir(self):
+        return sorted(set(self.globals) | set(self.index))
+
+    def define_all(self):
+        with self.lock:
+            for i in range(len(self.entries)):
+                self._define(i)
+
+    def _define(self, i):
+        if self.defined[i]:
+            return
+        # mark it before defining the dependencies, to stop at cycles: this
+        # is fine because the classes use each other only inside methods
+        self.defined[i] = True
+        names, deps, src = self.entries[i]
+        for dep in deps:
+            self._define(dep)
+        filename = '<%s: %s>' % (self.globals['__name__'], names[0])
+        exec(compile(src, filename, 'exec'), self.globals)
+
+
 def check_version(modname, version):
     if version != capnpy.__version__:
         # explicitly remove modname from sys.modules: apparently, CPython does
@@ -126,11 +126,13 @@ def get_cython_extensions():
              "capnpy/list.py",
              "capnpy/type.py",
              "capnpy/message.py",
+             "capnpy/predicate.py",
              "capnpy/buffered.py",
              "capnpy/filelike.py",
              "capnpy/ptr.pyx",
              "capnpy/packing.pyx",
              "capnpy/_hash.pyx",
+             "capnpy/_deltapack.pyx",
              "capnpy/_util.pyx"
             ]
 